@@ -0,0 +1,40 @@
+"""Resting limit, stop and stop-limit orders."""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002_orders'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'orders',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('symbol', sa.String(), nullable=False),
+        sa.Column('market', sa.Enum('US', 'IN', name='marketenum', create_type=False), nullable=False),
+        sa.Column('side', sa.Enum('BUY', 'SELL', name='orderside'), nullable=False),
+        sa.Column('order_type', sa.Enum('LIMIT', 'STOP', 'STOP_LIMIT', name='ordertype'), nullable=False),
+        sa.Column('quantity', sa.Numeric(20, 8), nullable=False),
+        sa.Column('limit_price', sa.Numeric(20, 8), nullable=True),
+        sa.Column('stop_price', sa.Numeric(20, 8), nullable=True),
+        sa.Column('status', sa.Enum('OPEN', 'FILLED', 'CANCELLED', 'REJECTED', name='orderstatus'), nullable=False),
+        sa.Column('triggered_at', sa.DateTime(), nullable=True),
+        sa.Column('fill_price', sa.Numeric(20, 8), nullable=True),
+        sa.Column('filled_at', sa.DateTime(), nullable=True),
+        sa.Column('reject_reason', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index('ix_orders_user_id', 'orders', ['user_id'])
+    op.create_index('ix_orders_status', 'orders', ['status'])
+
+def downgrade():
+    op.drop_index('ix_orders_status', table_name='orders')
+    op.drop_index('ix_orders_user_id', table_name='orders')
+    op.drop_table('orders')
+    sa.Enum(name='orderstatus').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='ordertype').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='orderside').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,32 @@
+"""Position version column and one position row per user/symbol/market."""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0003_position_concurrency'
+down_revision = '0002_orders'
+branch_labels = None
+depends_on = None
+
+# Rows of the same user/symbol/market as the outer positions row
+_SAME_KEY = "FROM positions d WHERE d.user_id = positions.user_id AND d.symbol = positions.symbol AND d.market = positions.market"
+
+
+def upgrade():
+    op.add_column('positions', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+    # Racing first buys could leave duplicate rows; fold each group into its
+    # lowest id (summed shares, size-weighted avg_price) so the index builds
+    op.execute(
+        "UPDATE positions SET "
+        f"shares = (SELECT SUM(d.shares) {_SAME_KEY}), "
+        "avg_price = COALESCE("
+        f"(SELECT SUM(ABS(d.shares) * d.avg_price) / NULLIF(SUM(ABS(d.shares)), 0) {_SAME_KEY}), avg_price) "
+        "WHERE id IN (SELECT MIN(id) FROM positions GROUP BY user_id, symbol, market HAVING COUNT(*) > 1)"
+    )
+    op.execute("DELETE FROM positions WHERE id NOT IN (SELECT MIN(id) FROM positions GROUP BY user_id, symbol, market)")
+    op.create_index('uq_positions_user_symbol_market', 'positions', ['user_id', 'symbol', 'market'], unique=True)
+
+def downgrade():
+    op.drop_index('uq_positions_user_symbol_market', table_name='positions')
+    with op.batch_alter_table('positions') as batch:
+        batch.drop_column('version')
@@ -0,0 +1,34 @@
+"""Daily interest accrual ledger, one row per short position per day."""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0004_interest_accruals'
+down_revision = '0003_position_concurrency'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'interest_accruals',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('accrual_date', sa.Date(), nullable=False),
+        sa.Column('run_id', sa.String(32), nullable=False),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('symbol', sa.String(), nullable=False),
+        sa.Column('market', sa.Enum('US', 'IN', name='marketenum', create_type=False), nullable=False),
+        sa.Column('shares', sa.Numeric(20, 8), nullable=False),
+        sa.Column('price', sa.Numeric(20, 8), nullable=False),
+        sa.Column('borrow_rate_annual', sa.Float(), nullable=False),
+        sa.Column('interest', sa.Numeric(20, 4), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index('ix_interest_accruals_run_id', 'interest_accruals', ['run_id'])
+    op.create_index('ix_interest_accruals_user_id', 'interest_accruals', ['user_id'])
+    op.create_index('uq_interest_accruals_date_position', 'interest_accruals', ['accrual_date', 'user_id', 'symbol', 'market'], unique=True)
+
+def downgrade():
+    op.drop_index('uq_interest_accruals_date_position', table_name='interest_accruals')
+    op.drop_index('ix_interest_accruals_user_id', table_name='interest_accruals')
+    op.drop_index('ix_interest_accruals_run_id', table_name='interest_accruals')
+    op.drop_table('interest_accruals')
@@ -0,0 +1,18 @@
+"""Composite indexes for per-user transaction history and position analysis."""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_hot_path_indexes'
+down_revision = '0004_interest_accruals'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # positions (user_id, symbol, market) is already unique since 0003_position_concurrency
+    op.create_index('ix_transactions_user_timestamp', 'transactions', ['user_id', sa.text('"timestamp" DESC'), sa.text('id DESC')])
+    op.create_index('ix_transactions_user_symbol_market_timestamp', 'transactions', ['user_id', 'symbol', 'market', 'timestamp'])
+
+def downgrade():
+    op.drop_index('ix_transactions_user_symbol_market_timestamp', table_name='transactions')
+    op.drop_index('ix_transactions_user_timestamp', table_name='transactions')
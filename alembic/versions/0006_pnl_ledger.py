@@ -0,0 +1,72 @@
+"""Position lots, realized P&L per closing fill and per-user P&L totals."""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006_pnl_ledger'
+down_revision = '0005_hot_path_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    market = sa.Enum('US', 'IN', name='marketenum', create_type=False)
+    op.create_table(
+        'position_lots',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('symbol', sa.String(), nullable=False),
+        sa.Column('market', market, nullable=False),
+        sa.Column('side', sa.Enum('LONG', 'SHORT', name='lotside'), nullable=False),
+        sa.Column('quantity', sa.Numeric(20, 8), nullable=False),
+        sa.Column('open_quantity', sa.Numeric(20, 8), nullable=False),
+        sa.Column('price', sa.Numeric(20, 8), nullable=False),
+        sa.Column('opened_at', sa.DateTime(), server_default=sa.func.now()),
+        sa.Column('closed_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_position_lots_open', 'position_lots', ['user_id', 'symbol', 'market', 'closed_at'])
+    op.create_table(
+        'realized_pnl',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('symbol', sa.String(), nullable=False),
+        sa.Column('market', market, nullable=False),
+        sa.Column('side', sa.Enum('LONG', 'SHORT', name='lotside', create_type=False), nullable=False),
+        sa.Column('method', sa.Enum('FIFO', 'AVERAGE', name='pnlmethod'), nullable=False),
+        sa.Column('quantity', sa.Numeric(20, 8), nullable=False),
+        sa.Column('open_value', sa.Numeric(20, 8), nullable=False),
+        sa.Column('close_value', sa.Numeric(20, 8), nullable=False),
+        sa.Column('fees', sa.Numeric(20, 8), nullable=False, server_default='0'),
+        sa.Column('pnl', sa.Numeric(20, 8), nullable=False),
+        sa.Column('realized_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+    op.create_index('ix_realized_pnl_user_realized_at', 'realized_pnl', ['user_id', 'realized_at'])
+    op.create_table(
+        'pnl_totals',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+        sa.Column('realized_pnl', sa.Numeric(20, 8), nullable=False, server_default='0'),
+        sa.Column('fees', sa.Numeric(20, 8), nullable=False, server_default='0'),
+        sa.Column('fills', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('closes', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('winning', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('losing', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now()),
+    )
+    # Open one lot per existing position at its average price, so the first
+    # fill against a position from before the ledger closes it properly
+    side = "CASE WHEN shares > 0 THEN 'LONG' ELSE 'SHORT' END"
+    if op.get_bind().dialect.name == 'postgresql':
+        side = f"CAST({side} AS lotside)"
+    op.execute(
+        "INSERT INTO position_lots (user_id, symbol, market, side, quantity, open_quantity, price, opened_at) "
+        f"SELECT user_id, symbol, market, {side}, ABS(shares), ABS(shares), avg_price, created_at "
+        "FROM positions WHERE shares != 0"
+    )
+
+def downgrade():
+    op.drop_table('pnl_totals')
+    op.drop_index('ix_realized_pnl_user_realized_at', table_name='realized_pnl')
+    op.drop_table('realized_pnl')
+    op.drop_index('ix_position_lots_open', table_name='position_lots')
+    op.drop_table('position_lots')
+    sa.Enum(name='pnlmethod').drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name='lotside').drop(op.get_bind(), checkfirst=True)
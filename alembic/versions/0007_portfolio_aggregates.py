@@ -0,0 +1,49 @@
+"""Per-user portfolio aggregates: pnl_totals grows position cost basis and counts."""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007_portfolio_aggregates'
+down_revision = '0006_pnl_ledger'
+branch_labels = None
+depends_on = None
+
+POSITION_COLUMNS = ('long_cost', 'short_cost', 'long_positions', 'short_positions')
+
+
+def upgrade():
+    op.rename_table('pnl_totals', 'portfolio_aggregates')
+    op.add_column('portfolio_aggregates', sa.Column('long_cost', sa.Numeric(20, 8), nullable=False, server_default='0'))
+    op.add_column('portfolio_aggregates', sa.Column('short_cost', sa.Numeric(20, 8), nullable=False, server_default='0'))
+    op.add_column('portfolio_aggregates', sa.Column('long_positions', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('portfolio_aggregates', sa.Column('short_positions', sa.Integer(), nullable=False, server_default='0'))
+    # Backfill from the existing positions so every user starts with a correct row
+    op.execute(
+        "INSERT INTO portfolio_aggregates (user_id) "
+        "SELECT id FROM users WHERE id NOT IN (SELECT user_id FROM portfolio_aggregates)"
+    )
+    op.execute(
+        "UPDATE portfolio_aggregates SET "
+        "long_cost = (SELECT COALESCE(SUM(p.shares * p.avg_price), 0) FROM positions p "
+        "WHERE p.user_id = portfolio_aggregates.user_id AND p.shares > 0), "
+        "short_cost = (SELECT COALESCE(SUM(-p.shares * p.avg_price), 0) FROM positions p "
+        "WHERE p.user_id = portfolio_aggregates.user_id AND p.shares < 0), "
+        "long_positions = (SELECT COUNT(*) FROM positions p "
+        "WHERE p.user_id = portfolio_aggregates.user_id AND p.shares > 0), "
+        "short_positions = (SELECT COUNT(*) FROM positions p "
+        "WHERE p.user_id = portfolio_aggregates.user_id AND p.shares < 0)"
+    )
+    # Fills and fees cover every transaction, including those from before the ledger
+    op.execute(
+        "UPDATE portfolio_aggregates SET fills = t.fills, fees = t.fees "
+        "FROM (SELECT user_id, COUNT(*) AS fills, COALESCE(SUM(fees), 0) AS fees "
+        "FROM transactions GROUP BY user_id) AS t "
+        "WHERE t.user_id = portfolio_aggregates.user_id"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('portfolio_aggregates') as batch:
+        for name in POSITION_COLUMNS:
+            batch.drop_column(name)
+    op.rename_table('portfolio_aggregates', 'pnl_totals')
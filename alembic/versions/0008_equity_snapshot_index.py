@@ -0,0 +1,15 @@
+"""Index equity snapshots by user and time for equity curve range queries."""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008_equity_snapshot_index'
+down_revision = '0007_portfolio_aggregates'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_equity_snapshots_user_created_at', 'equity_snapshots', ['user_id', 'created_at'])
+
+def downgrade():
+    op.drop_index('ix_equity_snapshots_user_created_at', table_name='equity_snapshots')
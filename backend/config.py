@@ -29,12 +29,68 @@ class Settings(BaseSettings):
     ALPACA_API_KEY: str = ""
     ALPACA_API_SECRET: str = ""
     ALPACA_BASE_URL: str = "https://paper-api.alpaca.markets"
+    ALPACA_MAX_WORKERS: int = 4
+    ALPACA_TIMEOUT_SECONDS: float = 3.0
+    ALPACA_POSITIONS_CACHE_TTL_SECONDS: int = 10
 
     SHORTABLE_MIN_RATE: float = Field(0.02, ge=0)
     SHORTABLE_MAX_RATE: float = Field(0.18, ge=0)
     SHORTABLE_SELECTION_COUNT: int = 100
+    # In-memory shortable index (see services/shortable_index.py)
+    SHORTABLE_INDEX_RELOAD_SECONDS: float = 300.0
+
+    # Retries of a trade that lost a race with a concurrent writer (see services/execution.py)
+    TRADE_CONFLICT_RETRIES: int = 5
+    TRADE_BATCH_MAX_ORDERS: int = 1000
+    # Realized P&L lot matching, FIFO or AVERAGE (see services/ledger.py)
+    PNL_METHOD: str = "FIFO"
+
+    # Resolved caller cache (see security/identity.py)
+    IDENTITY_CACHE_TTL_SECONDS: float = 5.0
+    IDENTITY_CACHE_MAX_ENTRIES: int = 10000
 
     QUOTE_CACHE_TTL_SECONDS: int = 5
+    QUOTE_CACHE_MAX_ENTRIES: int = 5000
+    QUOTE_BATCH_CONCURRENCY: int = 10
+    QUOTE_BATCH_TIMEOUT_SECONDS: float = 5.0
+
+    # Background price board (see services/price_board.py)
+    PRICE_BOARD_ENABLED: bool = True
+    PRICE_BOARD_REFRESH_SECONDS: float = 5.0
+    PRICE_BOARD_MAX_AGE_SECONDS: float = 15.0
+    PRICE_BOARD_IDLE_SECONDS: float = 300.0
+    PRICE_BOARD_HOLDINGS_RELOAD_SECONDS: float = 60.0
+    PRICE_BOARD_MAX_SYMBOLS: int = 2000
+
+    # Periodic equity snapshots (see services/equity_snapshots.py)
+    EQUITY_SNAPSHOT_ENABLED: bool = True
+    EQUITY_SNAPSHOT_INTERVAL_SECONDS: float = 300.0
+    EQUITY_SNAPSHOT_BATCH_USERS: int = 5000
+    EQUITY_CURVE_MAX_POINTS: int = 2000
+
+    # WebSocket fan-out (see services/ws_hub.py)
+    WS_TICKER_INTERVAL_SECONDS: float = 1.0
+    WS_SEND_QUEUE_SIZE: int = 8
+    WS_SLOW_CONSUMER_POLICY: str = "drop_oldest"  # or "disconnect"
+    WS_SLOW_CONSUMER_MAX_DROPS: int = 30
+    WS_MAX_SYMBOLS_PER_CONNECTION: int = 500
+
+    # Demo price simulator (see services/simulator.py)
+    SIM_SEED: Optional[int] = None
+    SIM_SYNTHETIC_SYMBOLS: int = 0
+
+    # Synthetic order books (see services/orderbook.py)
+    ORDERBOOK_DEPTH: int = 50  # levels kept per side, and the most a client may request
+    ORDERBOOK_DEFAULT_DEPTH: int = 10
+    ORDERBOOK_INTERVAL_SECONDS: float = 0.5
+
+    # Shared outbound HTTP client (connection pool + keep-alive)
+    FINNHUB_BASE_URL: str = "https://finnhub.io/api/v1"
+    HTTP_TIMEOUT_SECONDS: float = 10.0
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP2_ENABLED: bool = True
 
     CORS_ORIGINS: Optional[str] = None
 
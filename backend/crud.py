@@ -3,15 +3,21 @@
 Functions are async and expect an AsyncSession from database.get_db.
 """
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func
+from sqlalchemy import BigInteger, Integer, cast, select, update, delete, func, insert, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm.attributes import set_committed_value
 from . import models
-from .models import User, Position, Transaction, ShortableStock
+from .models import User, Position, Transaction, ShortableStock, Order, OrderStatus, PositionLot, PortfolioAggregate, EquitySnapshot
 from .schemas import Market
 from decimal import Decimal
-from typing import List, Optional, Tuple
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 from datetime import datetime, timedelta
 
 
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
 async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
     q = await db.execute(select(User).where(User.username == username))
     return q.scalars().first()
@@ -35,10 +41,28 @@ async def get_user(db: AsyncSession, user_id: str) -> Optional[User]:
     return q.scalars().first()
 
 
-async def upsert_position(db: AsyncSession, user: User, symbol: str, market: Market, qty: Decimal, price: Decimal, borrow_rate: Optional[float] = None) -> Position:
-    # Fetch existing position
-    q = await db.execute(select(Position).where(Position.user_id == user.id, Position.symbol == symbol, Position.market == market))
-    pos = q.scalars().first()
+async def adjust_cash(db: AsyncSession, user: User, delta: Decimal, require: Optional[Decimal] = None) -> Optional[Decimal]:
+    """Atomically add ``delta`` to the user's cash in SQL, not from the loaded value.
+
+    With ``require`` the update only applies while the balance is at least
+    that much. Returns the new balance, or None if the condition failed.
+    The loaded ``user`` is kept in sync without marking it dirty, so the
+    caller must ``identity.mark_changed`` the user for cached copies to drop.
+    """
+    stmt = update(User).where(User.id == user.id)
+    if require is not None:
+        stmt = stmt.where(User.cash_balance >= require)
+    stmt = stmt.values(cash_balance=User.cash_balance + delta).returning(User.cash_balance)
+    res = await db.execute(stmt.execution_options(synchronize_session=False))
+    row = res.first()
+    if row is None:
+        return None
+    set_committed_value(user, "cash_balance", row[0])
+    return row[0]
+
+
+def apply_position_change(db: AsyncSession, user: User, pos: Optional[Position], symbol: str, market: Market, qty: Decimal, price: Decimal, borrow_rate: Optional[float] = None) -> Position:
+    """Apply a signed share change to an already loaded position (or open one) without flushing."""
     if pos:
         # Update avg_price and shares when increasing a long position (qty positive)
         existing_shares = Decimal(pos.shares)
@@ -56,31 +80,174 @@ async def upsert_position(db: AsyncSession, user: User, symbol: str, market: Mar
         if borrow_rate is not None:
             pos.borrow_rate_annual = borrow_rate
         pos.updated_at = datetime.utcnow()
-        db.add(pos)
-        await db.commit()
-        await db.refresh(pos)
-        return pos
     else:
         pos = Position(user_id=user.id, symbol=symbol, market=market, shares=qty, avg_price=price, borrow_rate_annual=borrow_rate)
-        db.add(pos)
+    db.add(pos)
+    return pos
+
+
+async def upsert_position(db: AsyncSession, user: User, symbol: str, market: Market, qty: Decimal, price: Decimal, borrow_rate: Optional[float] = None, commit: bool = True) -> Position:
+    # Fetch existing position
+    q = await db.execute(select(Position).where(Position.user_id == user.id, Position.symbol == symbol, Position.market == market))
+    pos = apply_position_change(db, user, q.scalars().first(), symbol, market, qty, price, borrow_rate)
+    if commit:
         await db.commit()
         await db.refresh(pos)
-        return pos
+    return pos
 
 
-async def create_transaction(db: AsyncSession, user: User, symbol: str, market: Market, tx_type: str, quantity: Decimal, price: Decimal, fees: Decimal, total: Decimal) -> Transaction:
+async def create_transaction(db: AsyncSession, user: User, symbol: str, market: Market, tx_type: str, quantity: Decimal, price: Decimal, fees: Decimal, total: Decimal, commit: bool = True) -> Transaction:
     tx = Transaction(user_id=user.id, symbol=symbol, market=market, type=tx_type, quantity=quantity, price=price, fees=fees, total_amount=total)
     db.add(tx)
-    await db.commit()
-    await db.refresh(tx)
+    if commit:
+        await db.commit()
+        await db.refresh(tx)
     return tx
 
 
+async def bulk_create_transactions(db: AsyncSession, rows: List[dict]) -> None:
+    """Insert many ledger rows in one executemany; the caller commits."""
+    if rows:
+        await db.execute(insert(Transaction), rows)
+
+
+async def get_open_lots(db: AsyncSession, user_id: int, pairs: List[Tuple[str, Market]]) -> Dict[Tuple[str, Market], List[PositionLot]]:
+    """Open lots per (symbol, market), oldest first, in one query."""
+    out: Dict[Tuple[str, Market], List[PositionLot]] = {}
+    if not pairs:
+        return out
+    q = (
+        select(PositionLot)
+        .where(
+            PositionLot.user_id == user_id,
+            tuple_(PositionLot.symbol, PositionLot.market).in_(pairs),
+            PositionLot.closed_at.is_(None),
+        )
+        .order_by(PositionLot.id)
+    )
+    res = await db.execute(q)
+    for lot in res.scalars().all():
+        out.setdefault((lot.symbol, Market(lot.market)), []).append(lot)
+    return out
+
+
+async def _aggregate_row_exists(db: AsyncSession, user_id: int) -> bool:
+    # Locks the row where the dialect supports it, for the UPDATE that follows
+    res = await db.execute(
+        select(PortfolioAggregate.user_id).where(PortfolioAggregate.user_id == user_id).with_for_update()
+    )
+    return res.first() is not None
+
+
+async def add_portfolio_aggregate(db: AsyncSession, user_id: int, deltas: Dict[str, object]) -> None:
+    """Increment the user's aggregate counters in SQL, creating the row on first use; the caller commits."""
+    make_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if make_insert is None:
+        # No upsert on this dialect: lock the row, then UPDATE or INSERT it
+        if await _aggregate_row_exists(db, user_id):
+            await db.execute(
+                update(PortfolioAggregate).where(PortfolioAggregate.user_id == user_id)
+                .values(updated_at=func.now(), **{name: getattr(PortfolioAggregate, name) + value for name, value in deltas.items()})
+            )
+        else:
+            await db.execute(insert(PortfolioAggregate).values(user_id=user_id, **deltas))
+        return
+    stmt = make_insert(PortfolioAggregate).values(user_id=user_id, **deltas)
+    set_ = {name: getattr(PortfolioAggregate, name) + getattr(stmt.excluded, name) for name in deltas}
+    set_["updated_at"] = func.now()
+    await db.execute(stmt.on_conflict_do_update(index_elements=[PortfolioAggregate.user_id], set_=set_))
+
+
+async def set_portfolio_aggregates(db: AsyncSession, rows: List[dict]) -> None:
+    """Overwrite aggregate rows (user_id plus the columns to set) in one executemany; the caller commits."""
+    if not rows:
+        return
+    make_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if make_insert is None:
+        for row in rows:
+            values = {name: value for name, value in row.items() if name != "user_id"}
+            if await _aggregate_row_exists(db, row["user_id"]):
+                await db.execute(
+                    update(PortfolioAggregate).where(PortfolioAggregate.user_id == row["user_id"])
+                    .values(updated_at=func.now(), **values)
+                )
+            else:
+                await db.execute(insert(PortfolioAggregate).values(**row))
+        return
+    stmt = make_insert(PortfolioAggregate)
+    columns = [name for name in rows[0] if name != "user_id"]
+    set_ = {name: getattr(stmt.excluded, name) for name in columns}
+    set_["updated_at"] = func.now()
+    await db.execute(stmt.on_conflict_do_update(index_elements=[PortfolioAggregate.user_id], set_=set_), rows)
+
+
+async def get_portfolio_aggregate(db: AsyncSession, user: User) -> Optional[PortfolioAggregate]:
+    # populate_existing: the row is incremented in SQL, never through this identity map
+    return await db.get(PortfolioAggregate, user.id, populate_existing=True)
+
+
 async def list_transactions(db: AsyncSession, user: User, limit: int = 50, offset: int = 0) -> List[Transaction]:
     q = await db.execute(select(Transaction).where(Transaction.user_id == user.id).order_by(Transaction.timestamp.desc()).limit(limit).offset(offset))
     return q.scalars().all()
 
 
+def _transactions_query(
+    user: User,
+    symbol: Optional[str] = None,
+    type: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    q = select(Transaction).where(Transaction.user_id == user.id)
+    if symbol:
+        q = q.where(Transaction.symbol == symbol)
+    if type:
+        q = q.where(Transaction.type == type)
+    if start:
+        q = q.where(Transaction.timestamp >= start)
+    if end:
+        q = q.where(Transaction.timestamp < end)
+    # Newest first; id breaks timestamp ties so the order is total
+    return q.order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+
+
+async def list_transactions_after(
+    db: AsyncSession,
+    user: User,
+    after_id: Optional[int] = None,
+    limit: int = 50,
+    **filters,
+) -> List[Transaction]:
+    """One page of history, newest first, starting after the transaction ``after_id``.
+
+    Keyset pagination on (timestamp, id): the boundary is the stored key of
+    ``after_id``, so every page is an index range read however deep it is.
+    Raises ValueError if ``after_id`` is not one of the user's transactions.
+    """
+    q = _transactions_query(user, **filters)
+    if after_id is not None:
+        res = await db.execute(
+            select(Transaction.timestamp).where(Transaction.id == after_id, Transaction.user_id == user.id)
+        )
+        boundary = res.scalar_one_or_none()
+        if boundary is None:
+            raise ValueError("invalid cursor")
+        q = q.where(tuple_(Transaction.timestamp, Transaction.id) < tuple_(boundary, after_id))
+    res = await db.execute(q.limit(limit))
+    return res.scalars().all()
+
+
+async def stream_transactions(db: AsyncSession, user: User, batch_size: int = 1000, **filters) -> AsyncIterator[Transaction]:
+    """Yield the whole filtered history, newest first, fetching ``batch_size`` rows at a time.
+
+    Uses a server-side cursor where the driver has one, so memory stays flat
+    regardless of how many rows match.
+    """
+    result = await db.stream(_transactions_query(user, **filters).execution_options(yield_per=batch_size))
+    async for tx in result.scalars():
+        yield tx
+
+
 async def upsert_shortable(db: AsyncSession, symbol: str, market: Market, borrow_rate: float, available: bool = True) -> ShortableStock:
     q = await db.execute(select(ShortableStock).where(ShortableStock.symbol == symbol))
     s = q.scalars().first()
@@ -89,15 +256,65 @@ async def upsert_shortable(db: AsyncSession, symbol: str, market: Market, borrow
         s.available = available
         s.last_updated = datetime.utcnow()
         db.add(s)
-        await db.commit()
-        await db.refresh(s)
-        return s
     else:
         s = ShortableStock(symbol=symbol, market=market, borrow_rate_annual=borrow_rate, available=available)
         db.add(s)
-        await db.commit()
-        await db.refresh(s)
-        return s
+    await db.commit()
+    await db.refresh(s)
+    return s
+
+
+async def bulk_upsert_shortable(db: AsyncSession, rows: Iterable[dict]) -> int:
+    """Insert or update many shortable entries with INSERT ... ON CONFLICT DO UPDATE and commit.
+
+    ``rows`` are dicts with symbol, market, borrow_rate_annual and optionally
+    available; a symbol given twice keeps its last row. Returns the number of
+    symbols written.
+    """
+    by_symbol: Dict[str, dict] = {}
+    for r in rows:
+        by_symbol[r["symbol"]] = {
+            "symbol": r["symbol"],
+            "market": Market(r["market"]),
+            "borrow_rate_annual": r["borrow_rate_annual"],
+            "available": r.get("available", True),
+        }
+    values = list(by_symbol.values())
+    if not values:
+        return 0
+    make_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if make_insert is None:
+        # No upsert on this dialect: fall back to one SELECT and write per symbol
+        for v in values:
+            await upsert_shortable(db, v["symbol"], v["market"], v["borrow_rate_annual"], v["available"])
+        return len(values)
+    stmt = make_insert(ShortableStock)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ShortableStock.symbol],
+        set_={
+            "market": stmt.excluded.market,
+            "borrow_rate_annual": stmt.excluded.borrow_rate_annual,
+            "available": stmt.excluded.available,
+            "last_updated": func.now(),
+        },
+    )
+    # One statement executed over every row (executemany), compiled once
+    await db.execute(stmt, values)
+    await db.commit()
+    return len(values)
+
+
+async def get_shortable(db: AsyncSession, symbol: str, market: Optional[Market] = None) -> Optional[ShortableStock]:
+    q = select(ShortableStock).where(ShortableStock.symbol == symbol)
+    if market:
+        q = q.where(ShortableStock.market == market)
+    res = await db.execute(q)
+    return res.scalars().first()
+
+
+async def get_shortable_many(db: AsyncSession, symbols: Iterable[str]) -> Dict[str, ShortableStock]:
+    res = await db.execute(select(ShortableStock).where(ShortableStock.symbol.in_(list(symbols))))
+    return {s.symbol: s for s in res.scalars().all()}
 
 
 async def list_shortable(db: AsyncSession, market: Optional[Market] = None) -> List[ShortableStock]:
@@ -108,11 +325,100 @@ async def list_shortable(db: AsyncSession, market: Optional[Market] = None) -> L
     return res.scalars().all()
 
 
-async def get_position(db: AsyncSession, user: User, symbol: str, market: Market) -> Optional[Position]:
-    q = await db.execute(select(Position).where(Position.user_id == user.id, Position.symbol == symbol, Position.market == market))
-    return q.scalars().first()
+async def get_position(db: AsyncSession, user: User, symbol: str, market: Market, for_update: bool = False) -> Optional[Position]:
+    q = select(Position).where(Position.user_id == user.id, Position.symbol == symbol, Position.market == market)
+    if for_update:
+        q = q.with_for_update()
+    res = await db.execute(q)
+    return res.scalars().first()
+
+
+async def get_positions_for(db: AsyncSession, user: User, pairs: Iterable[Tuple[str, Market]], for_update: bool = False) -> Dict[Tuple[str, Market], Position]:
+    """Load the user's positions for many (symbol, market) pairs in one query."""
+    pairs = [(s, Market(m)) for s, m in pairs]
+    if not pairs:
+        return {}
+    q = select(Position).where(Position.user_id == user.id, tuple_(Position.symbol, Position.market).in_(pairs))
+    if for_update:
+        q = q.with_for_update()
+    res = await db.execute(q)
+    return {(p.symbol, Market(p.market)): p for p in res.scalars().all()}
 
 
 async def list_positions(db: AsyncSession, user: User) -> List[Position]:
     q = await db.execute(select(Position).where(Position.user_id == user.id))
     return q.scalars().all()
+
+
+async def create_order(db: AsyncSession, user: User, symbol: str, market: Market, side: str, order_type: str, quantity: Decimal, limit_price: Optional[Decimal] = None, stop_price: Optional[Decimal] = None) -> Order:
+    order = Order(user_id=user.id, symbol=symbol, market=market, side=side, order_type=order_type, quantity=quantity, limit_price=limit_price, stop_price=stop_price, status=OrderStatus.OPEN)
+    db.add(order)
+    await db.commit()
+    await db.refresh(order)
+    return order
+
+
+async def get_order(db: AsyncSession, user: User, order_id: int) -> Optional[Order]:
+    q = await db.execute(select(Order).where(Order.id == order_id, Order.user_id == user.id))
+    return q.scalars().first()
+
+
+async def cancel_open_order(db: AsyncSession, order_id: int) -> bool:
+    """Mark an order CANCELLED if it is still OPEN; False if it was not. Caller commits."""
+    res = await db.execute(
+        update(Order).where(Order.id == order_id, Order.status == OrderStatus.OPEN).values(status=OrderStatus.CANCELLED)
+    )
+    return res.rowcount == 1
+
+
+async def list_orders(db: AsyncSession, user: User, status: Optional[OrderStatus] = None, limit: int = 100, offset: int = 0) -> List[Order]:
+    q = select(Order).where(Order.user_id == user.id)
+    if status:
+        q = q.where(Order.status == status)
+    res = await db.execute(q.order_by(Order.id.desc()).limit(limit).offset(offset))
+    return res.scalars().all()
+
+
+async def list_open_orders(db: AsyncSession) -> List[Order]:
+    q = await db.execute(select(Order).where(Order.status == OrderStatus.OPEN))
+    return q.scalars().all()
+
+
+def _epoch_seconds(db: AsyncSession, column):
+    """Whole seconds since the Unix epoch for a DateTime column, per dialect."""
+    if db.get_bind().dialect.name == "sqlite":
+        return cast(func.strftime("%s", column), Integer)
+    return cast(func.extract("epoch", column), BigInteger)
+
+
+async def equity_curve(db: AsyncSession, user: User, start: datetime, end: datetime, points: int) -> Tuple[int, List[tuple]]:
+    """Downsample the user's snapshots in [start, end) to at most ``points`` buckets, in SQL.
+
+    Each bucket yields the last snapshot in it plus the bucket's lowest and
+    highest equity: (created_at, total_equity, maintenance_required, low,
+    high). Returns (bucket width in seconds, rows oldest first).
+    """
+    span = max(int((end - start).total_seconds()), 1)
+    width = max(-(-span // max(points, 1)), 1)
+    start_epoch = int((start - datetime(1970, 1, 1)).total_seconds())
+    # Integer floor division on both dialects; offsets are never negative
+    bucket = ((_epoch_seconds(db, EquitySnapshot.created_at) - start_epoch) // width).label("bucket")
+    grouped = (
+        select(
+            bucket,
+            func.max(EquitySnapshot.id).label("last_id"),
+            func.min(EquitySnapshot.total_equity).label("low"),
+            func.max(EquitySnapshot.total_equity).label("high"),
+        )
+        .where(EquitySnapshot.user_id == user.id, EquitySnapshot.created_at >= start, EquitySnapshot.created_at < end)
+        .group_by(bucket)
+        .subquery()
+    )
+    q = (
+        select(EquitySnapshot.created_at, EquitySnapshot.total_equity, EquitySnapshot.maintenance_required, grouped.c.low, grouped.c.high)
+        # Snapshots are written in time order, so the highest id is the bucket's last
+        .join(grouped, EquitySnapshot.id == grouped.c.last_id)
+        .order_by(EquitySnapshot.created_at)
+    )
+    res = await db.execute(q)
+    return width, res.all()
@@ -25,15 +25,45 @@ How to run (example):
 This module wires routers, CORS, structured logging, and health checks.
 """
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .routes import auth, portfolio, trade, admin, analytics, market, websocket
+from .services import finnhub, alpaca
+from .services.price_board import board as price_board
+from .services.order_engine import engine as order_engine
+from .services.shortable_index import index as shortable_index
+from .services.equity_snapshots import writer as equity_snapshots
 from .config import settings
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
 logger = logging.getLogger("tradesphere")
 
-app = FastAPI(title="TradeSphere API - Bloomberg-Style Terminal")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Process-lifetime resources: pooled upstream HTTP client, Alpaca SDK pool,
+    # background price board refresher, resting order engine, shortable index,
+    # periodic equity snapshots
+    await finnhub.start_client()
+    alpaca.start()
+    await shortable_index.start()
+    await order_engine.start()
+    if settings.PRICE_BOARD_ENABLED:
+        price_board.start()
+    if settings.EQUITY_SNAPSHOT_ENABLED:
+        equity_snapshots.start()
+    try:
+        yield
+    finally:
+        await equity_snapshots.stop()
+        await price_board.stop()
+        await order_engine.stop()
+        await finnhub.close_client()
+        alpaca.shutdown()
+
+
+app = FastAPI(title="TradeSphere API - Bloomberg-Style Terminal", lifespan=lifespan)
 
 if settings.CORS_ORIGINS:
     origins = [o.strip() for o in settings.CORS_ORIGINS.split(",") if o.strip()]
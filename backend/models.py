@@ -13,8 +13,10 @@ from sqlalchemy import (
     Enum,
     ForeignKey,
     DateTime,
+    Date,
     func,
     Numeric,
+    Index,
 )
 import enum
 from datetime import datetime
@@ -41,6 +43,34 @@ class TransactionType(str, enum.Enum):
     COVER = "COVER"
 
 
+class OrderSide(str, enum.Enum):
+    BUY = "BUY"
+    SELL = "SELL"
+
+
+class OrderType(str, enum.Enum):
+    LIMIT = "LIMIT"
+    STOP = "STOP"
+    STOP_LIMIT = "STOP_LIMIT"
+
+
+class OrderStatus(str, enum.Enum):
+    OPEN = "OPEN"
+    FILLED = "FILLED"
+    CANCELLED = "CANCELLED"
+    REJECTED = "REJECTED"
+
+
+class LotSide(str, enum.Enum):
+    LONG = "LONG"
+    SHORT = "SHORT"
+
+
+class PnlMethod(str, enum.Enum):
+    FIFO = "FIFO"
+    AVERAGE = "AVERAGE"
+
+
 
 class User(Base):
     __tablename__ = "users"
@@ -66,16 +96,21 @@ class Position(Base):
     shares = Column(Numeric(20, 8), nullable=False)
     avg_price = Column(Numeric(20, 8), nullable=False)
     borrow_rate_annual = Column(Float, nullable=True)
+    # Optimistic concurrency: every ORM update checks and bumps the version
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     user = relationship("User", back_populates="positions")
 
+    __table_args__ = (Index("uq_positions_user_symbol_market", "user_id", "symbol", "market", unique=True),)
+    __mapper_args__ = {"version_id_col": version}
+
 
 class Transaction(Base):
     __tablename__ = "transactions"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     symbol = Column(String, nullable=False)
     market = Column(Enum(MarketEnum), nullable=False)
     type = Column(Enum(TransactionType), nullable=False)
@@ -87,6 +122,34 @@ class Transaction(Base):
 
     user = relationship("User", back_populates="transactions")
 
+    # Newest-first history per user, and per user and symbol (position analysis);
+    # both also serve plain user_id lookups
+    __table_args__ = (
+        Index("ix_transactions_user_timestamp", user_id, timestamp.desc(), id.desc()),
+        Index("ix_transactions_user_symbol_market_timestamp", user_id, symbol, market, timestamp),
+    )
+
+
+class Order(Base):
+    __tablename__ = "orders"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    symbol = Column(String, nullable=False)
+    market = Column(Enum(MarketEnum), nullable=False)
+    side = Column(Enum(OrderSide), nullable=False)
+    order_type = Column(Enum(OrderType), nullable=False)
+    quantity = Column(Numeric(20, 8), nullable=False)
+    limit_price = Column(Numeric(20, 8), nullable=True)
+    stop_price = Column(Numeric(20, 8), nullable=True)
+    status = Column(Enum(OrderStatus), nullable=False, default=OrderStatus.OPEN, index=True)
+    # Set when a stop-limit order's stop fires and it starts resting as a limit
+    triggered_at = Column(DateTime, nullable=True)
+    fill_price = Column(Numeric(20, 8), nullable=True)
+    filled_at = Column(DateTime, nullable=True)
+    reject_reason = Column(String, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
 
 class ShortableStock(Base):
     __tablename__ = "shortable_stocks"
@@ -97,10 +160,94 @@ class ShortableStock(Base):
     last_updated = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
 
+class InterestAccrual(Base):
+    """One day's borrow interest charged on one short position."""
+    __tablename__ = "interest_accruals"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    accrual_date = Column(Date, nullable=False)
+    # Rows written by the same accrual run; the run debits cash from their sum
+    run_id = Column(String(32), index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    symbol = Column(String, nullable=False)
+    market = Column(Enum(MarketEnum), nullable=False)
+    shares = Column(Numeric(20, 8), nullable=False)
+    price = Column(Numeric(20, 8), nullable=False)
+    borrow_rate_annual = Column(Float, nullable=False)
+    interest = Column(Numeric(20, 4), nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+    # A position is charged at most once per day, however many times the job runs
+    __table_args__ = (
+        Index("uq_interest_accruals_date_position", "accrual_date", "user_id", "symbol", "market", unique=True),
+    )
+
+
+class PositionLot(Base):
+    """Shares opened by one fill (FIFO) or the merged average-cost lot (AVERAGE)."""
+    __tablename__ = "position_lots"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    symbol = Column(String, nullable=False)
+    market = Column(Enum(MarketEnum), nullable=False)
+    side = Column(Enum(LotSide), nullable=False)
+    quantity = Column(Numeric(20, 8), nullable=False)
+    open_quantity = Column(Numeric(20, 8), nullable=False)
+    # Cost per share, opening fees included
+    price = Column(Numeric(20, 8), nullable=False)
+    opened_at = Column(DateTime, server_default=func.now())
+    closed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_position_lots_open", "user_id", "symbol", "market", "closed_at"),)
+
+
+class RealizedPnl(Base):
+    """Gain or loss realized by one closing fill."""
+    __tablename__ = "realized_pnl"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    symbol = Column(String, nullable=False)
+    market = Column(Enum(MarketEnum), nullable=False)
+    # Side of the lots that were closed
+    side = Column(Enum(LotSide), nullable=False)
+    method = Column(Enum(PnlMethod), nullable=False)
+    quantity = Column(Numeric(20, 8), nullable=False)
+    open_value = Column(Numeric(20, 8), nullable=False)
+    close_value = Column(Numeric(20, 8), nullable=False)
+    fees = Column(Numeric(20, 8), nullable=False, default=0)
+    pnl = Column(Numeric(20, 8), nullable=False)
+    realized_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (Index("ix_realized_pnl_user_realized_at", "user_id", "realized_at"),)
+
+
+class PortfolioAggregate(Base):
+    """Per-user book totals kept current on every fill (see services/aggregates.py).
+
+    Cost basis is shares * avg_price summed over long and short positions;
+    realized figures come from the P&L ledger.
+    """
+    __tablename__ = "portfolio_aggregates"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    long_cost = Column(Numeric(20, 8), nullable=False, default=0)
+    short_cost = Column(Numeric(20, 8), nullable=False, default=0)
+    long_positions = Column(Integer, nullable=False, default=0)
+    short_positions = Column(Integer, nullable=False, default=0)
+    realized_pnl = Column(Numeric(20, 8), nullable=False, default=0)
+    fees = Column(Numeric(20, 8), nullable=False, default=0)
+    fills = Column(Integer, nullable=False, default=0)
+    closes = Column(Integer, nullable=False, default=0)
+    winning = Column(Integer, nullable=False, default=0)
+    losing = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
 class EquitySnapshot(Base):
     __tablename__ = "equity_snapshots"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     total_equity = Column(Numeric(20, 4), nullable=False)
     maintenance_required = Column(Numeric(20, 4), nullable=False)
     created_at = Column(DateTime, server_default=func.now())
+
+    # Equity curve reads are per user over a time range
+    __table_args__ = (Index("ix_equity_snapshots_user_created_at", "user_id", "created_at"),)
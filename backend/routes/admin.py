@@ -1,36 +1,21 @@
-"""Admin and demo-only utilities: refresh shortable, list users, change tier, simulate daily interest."""
+"""Admin and demo-only utilities: refresh shortable, list users, change tier, simulate daily interest, reconcile aggregates."""
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
+from ..security.auth import get_current_user
 from .. import crud, models
-from ..services import finnhub, stockgro
-from ..utils.shortable import generate_shortable_symbols, daily_interest_for_short
+from ..services import aggregates, finnhub, stockgro, interest
+from ..services.shortable_index import ShortableEntry, index as shortable_index
+from ..utils.shortable import generate_shortable_symbols
 
 from ..config import settings
-from decimal import Decimal
+from datetime import date
+from typing import Optional
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
-# Mock user function to bypass authentication
-async def get_mock_user(db: AsyncSession = Depends(get_db)):
-    """Get or create a default demo user."""
-    user = await crud.get_user_by_email(db, "demo@tradesphere.com")
-    if not user:
-        # Create default demo user
-        user = models.User(
-            email="demo@tradesphere.com",
-            password_hash="demo",
-            cash_balance=100000.0,
-            tier="INTERMEDIATE"
-        )
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
-    return user
-
-
-async def refresh_shortable(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_mock_user)):
+async def refresh_shortable(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     # Use Finnhub and StockGro to get symbol universe
     us_symbols = []
     try:
@@ -48,25 +33,24 @@ async def refresh_shortable(db: AsyncSession = Depends(get_db), current_user: mo
 
     us_selected = generate_shortable_symbols(us_symbols, settings.SHORTABLE_SELECTION_COUNT // 2)
     in_selected = generate_shortable_symbols(in_symbols, settings.SHORTABLE_SELECTION_COUNT // 2)
-    summary = {"us": 0, "in": 0}
-    for it in us_selected:
-        await crud.upsert_shortable(db, it["symbol"], models.MarketEnum.US, it["borrow_rate_annual"])
-        summary["us"] += 1
-    for it in in_selected:
-        await crud.upsert_shortable(db, it["symbol"], models.MarketEnum.IN, it["borrow_rate_annual"])
-        summary["in"] += 1
+    rows = [{**it, "market": models.MarketEnum.US} for it in us_selected]
+    rows += [{**it, "market": models.MarketEnum.IN} for it in in_selected]
+    # One INSERT ... ON CONFLICT for the whole selection instead of a SELECT and COMMIT per symbol
+    await crud.bulk_upsert_shortable(db, rows)
+    shortable_index.put(ShortableEntry(r["symbol"], r["market"], r["borrow_rate_annual"], r.get("available", True)) for r in rows)
+    summary = {"us": len(us_selected), "in": len(in_selected)}
     return {"status": "ok", "summary": summary}
 
 
 @router.get("/users")
-async def list_users(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_mock_user)):
+async def list_users(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     q = await db.execute(models.select(models.User))
     users = q.scalars().all()
     return users
 
 
 @router.put("/user-tier")
-async def change_tier(user_id: str, tier: str, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_mock_user)):
+async def change_tier(user_id: str, tier: str, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     user = await crud.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="user not found")
@@ -81,24 +65,12 @@ async def change_tier(user_id: str, tier: str, db: AsyncSession = Depends(get_db
 
 
 @router.post("/simulate-daily-interest")
-async def simulate_daily_interest(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_mock_user)):
-    # Apply one day's interest to all short positions
-    q = await db.execute(models.select(models.Position).where(models.Position.shares < 0))
-    positions = q.scalars().all()
-    summary = []
-    for p in positions:
-        # need current price
-        if p.market == models.MarketEnum.US:
-            qd = await finnhub.get_quote(p.symbol)
-            price = Decimal(qd.get("c", 0))
-        else:
-            price = Decimal(0)
-        notional = -Decimal(p.shares) * price
-        interest = daily_interest_for_short(notional, p.borrow_rate_annual or 0.0)
-        # debit owner's cash
-        user = await crud.get_user(db, p.user_id)
-        user.cash_balance = Decimal(user.cash_balance) - interest
-        db.add(user)
-        summary.append({"user_id": p.user_id, "symbol": p.symbol, "interest": float(interest)})
-    await db.commit()
-    return {"applied": len(summary), "details": summary}
+async def simulate_daily_interest(accrual_date: Optional[date] = None, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    # Apply one day's interest to all short positions; re-running for the same date charges nothing twice
+    return await interest.accrue_daily_interest(db, accrual_date)
+
+
+@router.post("/reconcile-aggregates")
+async def reconcile_aggregates(fix: bool = False, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    # Recompute every user's portfolio aggregate row from positions and the ledger; fix=true overwrites drifted rows
+    return await aggregates.reconcile(db, fix=fix)
@@ -1,92 +1,63 @@
-"""Analytics endpoints: portfolio metrics, performance analysis, risk metrics."""
-from fastapi import APIRouter, Depends, HTTPException
+"""Analytics endpoints: portfolio metrics, performance analysis, equity curve, risk metrics."""
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from decimal import Decimal
-from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
 
 from ..database import get_db
+from ..security.auth import get_current_user
 from .. import crud, models
-from ..services import finnhub, stockgro
+from ..services import aggregates, quotes
 from ..schemas import Market
+from ..config import settings
 
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
 
-# Mock user function to bypass authentication
-async def get_mock_user(db: AsyncSession = Depends(get_db)):
-    """Get or create a default demo user."""
-    user = await crud.get_user_by_email(db, "demo@tradesphere.com")
-    if not user:
-        user = models.User(
-            email="demo@tradesphere.com",
-            password_hash="demo",
-            cash_balance=100000.0,
-            tier="INTERMEDIATE"
-        )
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
-    return user
-
-
 @router.get("/performance")
 async def get_performance_metrics(
     db: AsyncSession = Depends(get_db),
-    current_user: models.User = Depends(get_mock_user)
+    current_user: models.User = Depends(get_current_user)
 ):
-    """Get portfolio performance metrics."""
-    
-    # Get all transactions
-    result = await db.execute(
-        select(models.Transaction)
-        .where(models.Transaction.user_id == current_user.id)
-        .order_by(models.Transaction.timestamp.desc())
-    )
-    transactions = result.scalars().all()
+    """Get portfolio performance metrics.
+
+    Realized figures, fees, trade counts and cost basis come from the
+    user's portfolio aggregate row (services/aggregates.py); only open
+    positions are priced here.
+    """
+    agg = await aggregates.get(db, current_user)
+    total_trades = agg.fills
+    # Trades are closing fills by realized result; open positions are counted
+    # apart by their unrealized result
+    winning_trades = agg.winning
+    losing_trades = agg.losing
+    winning_positions = 0
+    losing_positions = 0
+    total_pnl = Decimal(agg.realized_pnl)
+    total_fees = Decimal(agg.fees)
     
-    # Calculate metrics
-    total_trades = len(transactions)
-    winning_trades = 0
-    losing_trades = 0
-    total_pnl = Decimal(0)
-    total_fees = Decimal(0)
-    
-    for txn in transactions:
-        if txn.type in [models.TransactionType.SELL, models.TransactionType.COVER]:
-            # This is a closing trade - calculate P&L
-            # Simplified: just add to total
-            total_pnl += Decimal(txn.total_amount)
-        total_fees += Decimal(txn.fees)
-    
-    # Get current positions for unrealized P&L
-    positions = await crud.get_positions(db, current_user)
-    unrealized_pnl = Decimal(0)
+    # Mark the open book; unrealized P&L is its value over the cost basis
+    positions = [p for p in await crud.list_positions(db, current_user) if p.shares != 0]
+    prices, _ = await quotes.fetch_prices((p.symbol, p.market) for p in positions)
+    market_value = Decimal(0)
     
     for pos in positions:
-        if pos.market == Market.US:
-            quote = await finnhub.get_quote(pos.symbol)
-            current_price = Decimal(quote.get("c", 0))
-        else:
-            try:
-                quote = await stockgro.get_realtime_quote(pos.symbol)
-                current_price = Decimal(quote.get("last_price", 0))
-            except:
-                current_price = Decimal(pos.avg_price)
+        current_price = prices.get((pos.symbol, Market(pos.market)), Decimal(pos.avg_price))
+        market_value += current_price * Decimal(pos.shares)
         
         pnl = (current_price - Decimal(pos.avg_price)) * Decimal(pos.shares)
-        unrealized_pnl += pnl
-        
         if pnl > 0:
-            winning_trades += 1
+            winning_positions += 1
         elif pnl < 0:
-            losing_trades += 1
+            losing_positions += 1
+    unrealized_pnl = market_value - (Decimal(agg.long_cost) - Decimal(agg.short_cost))
     
     win_rate = (winning_trades / max(winning_trades + losing_trades, 1)) * 100
     
-    # Calculate equity curve (simplified)
+    # Return against the starting balance; the curve itself is /analytics/equity-curve
     initial_balance = Decimal(100000.0)
     current_equity = Decimal(current_user.cash_balance) + unrealized_pnl
     total_return = ((current_equity - initial_balance) / initial_balance) * 100
@@ -96,6 +67,8 @@ async def get_performance_metrics(
         "winning_trades": winning_trades,
         "losing_trades": losing_trades,
         "win_rate": float(win_rate),
+        "winning_positions": winning_positions,
+        "losing_positions": losing_positions,
         "realized_pnl": float(total_pnl),
         "unrealized_pnl": float(unrealized_pnl),
         "total_pnl": float(total_pnl + unrealized_pnl),
@@ -106,32 +79,68 @@ async def get_performance_metrics(
     }
 
 
+@router.get("/equity-curve")
+async def get_equity_curve(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    points: int = Query(500, ge=1, le=settings.EQUITY_CURVE_MAX_POINTS),
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Equity over time from the periodic snapshots, downsampled to at most ``points`` buckets.
+
+    The range is [start, end), by default the last 30 days. Each point is
+    the last snapshot in its bucket, with the bucket's low and high equity.
+    """
+    # Snapshots are stored as naive UTC
+    start, end = (t.astimezone(timezone.utc).replace(tzinfo=None) if t and t.tzinfo else t for t in (start, end))
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    width, rows = await crud.equity_curve(db, current_user, start, end, points)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "bucket_seconds": width,
+        "points": [
+            {
+                "timestamp": created_at.isoformat(),
+                "equity": float(equity),
+                "maintenance_required": float(maintenance),
+                "low": float(low),
+                "high": float(high),
+            }
+            for created_at, equity, maintenance, low, high in rows
+        ],
+    }
+
+
 @router.get("/risk")
 async def get_risk_metrics(
     db: AsyncSession = Depends(get_db),
-    current_user: models.User = Depends(get_mock_user)
+    current_user: models.User = Depends(get_current_user)
 ):
-    """Get portfolio risk metrics."""
-    
-    positions = await crud.get_positions(db, current_user)
+    """Get portfolio risk metrics.
+
+    Position counts and cost basis come from the portfolio aggregate row;
+    exposure and equity need live marks of the open positions.
+    """
+    agg = await aggregates.get(db, current_user)
+    positions = [p for p in await crud.list_positions(db, current_user) if p.shares != 0]
     
     # Calculate portfolio metrics
     total_exposure = Decimal(0)
+    net_value = Decimal(0)
     position_risks = []
+    prices, _ = await quotes.fetch_prices((p.symbol, p.market) for p in positions)
     
     for pos in positions:
-        if pos.market == Market.US:
-            quote = await finnhub.get_quote(pos.symbol)
-            current_price = Decimal(quote.get("c", 0))
-        else:
-            try:
-                quote = await stockgro.get_realtime_quote(pos.symbol)
-                current_price = Decimal(quote.get("last_price", 0))
-            except:
-                current_price = Decimal(pos.avg_price)
+        current_price = prices.get((pos.symbol, Market(pos.market)), Decimal(pos.avg_price))
         
         position_value = abs(Decimal(pos.shares) * current_price)
         total_exposure += position_value
+        net_value += Decimal(pos.shares) * current_price
         
         # Calculate position risk
         pnl_percent = ((current_price - Decimal(pos.avg_price)) / Decimal(pos.avg_price)) * 100 if pos.avg_price != 0 else 0
@@ -147,17 +156,15 @@ async def get_risk_metrics(
         })
     
     # Portfolio-level risk metrics
-    equity = Decimal(current_user.cash_balance) + sum(
-        (Decimal(p["position_value"]) if Decimal(p["shares"]) > 0 else -Decimal(p["position_value"]))
-        for p in position_risks
-    )
+    equity = Decimal(current_user.cash_balance) + net_value
+    position_count = agg.long_positions + agg.short_positions
     
     # Risk ratios
     cash_ratio = (Decimal(current_user.cash_balance) / equity * 100) if equity > 0 else 0
     exposure_ratio = (total_exposure / equity * 100) if equity > 0 else 0
     
     # Diversification score (simple: more positions = better diversification)
-    diversification_score = min(len(positions) * 10, 100)
+    diversification_score = min(position_count * 10, 100)
     
     return {
         "total_exposure": float(total_exposure),
@@ -165,7 +172,11 @@ async def get_risk_metrics(
         "cash_ratio": float(cash_ratio),
         "exposure_ratio": float(exposure_ratio),
         "diversification_score": diversification_score,
-        "position_count": len(positions),
+        "position_count": position_count,
+        "long_positions": agg.long_positions,
+        "short_positions": agg.short_positions,
+        "long_cost_basis": float(agg.long_cost),
+        "short_cost_basis": float(agg.short_cost),
         "position_risks": position_risks,
         "risk_status": "healthy" if exposure_ratio < 80 and cash_ratio > 20 else "warning" if exposure_ratio < 95 else "critical"
     }
@@ -176,7 +187,7 @@ async def get_position_analysis(
     symbol: str,
     market: Market,
     db: AsyncSession = Depends(get_db),
-    current_user: models.User = Depends(get_mock_user)
+    current_user: models.User = Depends(get_current_user)
 ):
     """Get detailed analysis for a specific position."""
     
@@ -186,14 +197,14 @@ async def get_position_analysis(
     
     # Get current price
     if market == Market.US:
-        quote = await finnhub.get_quote(symbol)
+        quote = await quotes.fetch_quote(symbol, market)
         current_price = Decimal(quote.get("c", 0))
         high = Decimal(quote.get("h", 0))
         low = Decimal(quote.get("l", 0))
         prev_close = Decimal(quote.get("pc", 0))
     else:
         try:
-            quote = await stockgro.get_realtime_quote(symbol)
+            quote = await quotes.fetch_quote(symbol, market)
             current_price = Decimal(quote.get("last_price", 0))
             high = Decimal(quote.get("high", current_price))
             low = Decimal(quote.get("low", current_price))
@@ -4,6 +4,8 @@ from typing import List, Optional
 from decimal import Decimal
 
 from ..services import finnhub, stockgro
+from ..services import quotes as quotes_service
+from ..services.price_board import board as price_board
 from ..schemas import Market
 
 
@@ -15,7 +17,7 @@ async def get_quote(symbol: str, market: Market = Query(Market.US)):
     """Get real-time quote for a symbol."""
     try:
         if market == Market.US:
-            quote = await finnhub.get_quote(symbol)
+            quote = await quotes_service.fetch_quote(symbol, market)
             return {
                 "symbol": symbol,
                 "market": "US",
@@ -29,7 +31,7 @@ async def get_quote(symbol: str, market: Market = Query(Market.US)):
                 "timestamp": quote.get("t", 0)
             }
         else:  # India
-            quote = await stockgro.get_realtime_quote(symbol)
+            quote = await quotes_service.fetch_quote(symbol, market)
             return {
                 "symbol": symbol,
                 "market": "IN",
@@ -48,40 +50,44 @@ async def get_quote(symbol: str, market: Market = Query(Market.US)):
 
 @router.get("/quotes")
 async def get_multiple_quotes(symbols: str = Query(..., description="Comma-separated symbols"), market: Market = Query(Market.US)):
-    """Get real-time quotes for multiple symbols."""
-    symbol_list = [s.strip() for s in symbols.split(",")]
+    """Get real-time quotes for multiple symbols.
+
+    Symbols are de-duplicated and fetched concurrently (QUOTE_BATCH_CONCURRENCY),
+    each bounded by QUOTE_BATCH_TIMEOUT_SECONDS. Failed symbols are still listed
+    with an ``error`` and collected under ``failed``.
+    """
+    symbol_list = quotes_service.dedupe_symbols(symbols.split(","))
+    results, errors = await quotes_service.fetch_quotes(symbol_list, market)
     quotes = []
-    
+
     for symbol in symbol_list:
-        try:
-            if market == Market.US:
-                quote = await finnhub.get_quote(symbol)
-                quotes.append({
-                    "symbol": symbol,
-                    "price": quote.get("c", 0),
-                    "change_percent": quote.get("dp", 0),
-                    "high": quote.get("h", 0),
-                    "low": quote.get("l", 0),
-                })
-            else:
-                quote = await stockgro.get_realtime_quote(symbol)
-                quotes.append({
-                    "symbol": symbol,
-                    "price": quote.get("last_price", 0),
-                    "change_percent": quote.get("change_percent", 0),
-                    "high": quote.get("high", 0),
-                    "low": quote.get("low", 0),
-                })
-        except Exception as e:
-            # Skip failed quotes
+        if symbol in errors:
             quotes.append({
                 "symbol": symbol,
                 "price": 0,
                 "change_percent": 0,
-                "error": str(e)
+                "error": errors[symbol]
             })
-    
-    return {"quotes": quotes}
+            continue
+        quote = results[symbol]
+        if market == Market.US:
+            quotes.append({
+                "symbol": symbol,
+                "price": quote.get("c", 0),
+                "change_percent": quote.get("dp", 0),
+                "high": quote.get("h", 0),
+                "low": quote.get("l", 0),
+            })
+        else:
+            quotes.append({
+                "symbol": symbol,
+                "price": quote.get("last_price", 0),
+                "change_percent": quote.get("change_percent", 0),
+                "high": quote.get("high", 0),
+                "low": quote.get("low", 0),
+            })
+
+    return {"quotes": quotes, "failed": [s for s in symbol_list if s in errors]}
 
 
 @router.get("/search")
@@ -137,16 +143,15 @@ async def get_market_ticker():
     
     # US Markets
     us_symbols = ["SPY", "QQQ", "DIA", "AAPL", "TSLA", "NVDA"]
+    us_quotes, _ = await quotes_service.fetch_quotes(us_symbols, Market.US)
     for symbol in us_symbols:
-        try:
-            quote = await finnhub.get_quote(symbol)
+        if symbol in us_quotes:
+            quote = us_quotes[symbol]
             ticker_data.append({
                 "symbol": symbol,
                 "price": quote.get("c", 0),
                 "change": quote.get("dp", 0)
             })
-        except:
-            pass
     
     # Indian Markets - simplified fallback
     ticker_data.extend([
@@ -157,6 +162,12 @@ async def get_market_ticker():
     return {"items": ticker_data}
 
 
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Get quote cache hit/miss/eviction counters."""
+    return {"finnhub": finnhub.get_metrics(), "stockgro": stockgro.get_metrics(), "price_board": price_board.stats()}
+
+
 @router.get("/status")
 async def get_market_status():
     """Get market open/close status."""
@@ -1,48 +1,45 @@
 """Portfolio endpoints for positions, transactions, equity calculations."""
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from .. import database
 from ..database import get_db
+from ..security.auth import get_current_user
 from .. import crud, models
-from ..schemas import PortfolioSummary, PositionOut, Market
-from ..services.finnhub import get_quote
-from ..services.alpaca import get_portfolio as get_alpaca_portfolio
+from ..schemas import PortfolioSummary, PositionOut, Market, TradeSide, TransactionOut, TransactionPage
+from ..services import aggregates, quotes
+from ..services import alpaca
+from ..utils.pagination import decode_cursor, encode_cursor
+from datetime import datetime
 from decimal import Decimal
-from typing import List
+from typing import AsyncIterator, List, Literal, Optional
+import csv
+import io
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/portfolio", tags=["portfolio"])
 
 
-# Mock user function to bypass authentication
-async def get_mock_user(db: AsyncSession = Depends(get_db)):
-    """Get or create a default demo user."""
-    user = await crud.get_user_by_email(db, "demo@tradesphere.com")
-    if not user:
-        # Create default demo user
-        user = models.User(
-            email="demo@tradesphere.com",
-            password_hash="demo",
-            cash_balance=100000.0,
-            tier="BEGINNER"
-        )
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
-    return user
-
-
 async def _compute_live_values(db: AsyncSession, user) -> PortfolioSummary:
+    agg = await aggregates.get(db, user)
     positions = await crud.list_positions(db, user)
     pos_out = []
     total_long = Decimal(0)
     total_short = Decimal(0)
     
-    # Get local database positions
+    # Price every distinct (symbol, market) in one concurrent pass
+    prices, errors = await quotes.fetch_prices((p.symbol, p.market) for p in positions)
     for p in positions:
-        cp_data = await get_quote(p.symbol)
-        current_price = Decimal(cp_data.get("c", 0))
+        key = (p.symbol, Market(p.market))
+        if key in prices:
+            current_price = prices[key]
+        else:
+            # Mark at cost when the quote is unavailable
+            logger.warning(f"No quote for {p.symbol} ({errors.get(key)}), marking at avg price")
+            current_price = Decimal(p.avg_price)
         shares = Decimal(p.shares)
         current_value = shares * current_price
         unrealized = (current_price - Decimal(p.avg_price)) * shares
@@ -63,7 +60,7 @@ async def _compute_live_values(db: AsyncSession, user) -> PortfolioSummary:
     
     # Get Alpaca paper trading positions
     try:
-        alpaca_positions = get_alpaca_portfolio()
+        alpaca_positions = await alpaca.get_portfolio_async() if alpaca.is_configured() else []
         for alpaca_pos in alpaca_positions:
             # Add Alpaca positions to the list
             symbol = alpaca_pos.symbol
@@ -103,16 +100,96 @@ async def _compute_live_values(db: AsyncSession, user) -> PortfolioSummary:
         maintenance_required=float(maintenance_required),
         margin_headroom=float(headroom),
         in_margin_call=in_margin_call,
+        long_cost_basis=float(agg.long_cost),
+        short_cost_basis=float(agg.short_cost),
+        position_count=agg.long_positions + agg.short_positions,
+        realized_pnl=float(agg.realized_pnl),
         positions=pos_out
     )
 
 
 @router.get("", response_model=PortfolioSummary)
-async def get_portfolio(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_mock_user)):
+async def get_portfolio(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     return await _compute_live_values(db, current_user)
 
 
 @router.get("/positions", response_model=List[PositionOut])
-async def get_positions(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_mock_user)):
+async def get_positions(db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     positions = await crud.list_positions(db, current_user)
     return [PositionOut.from_orm(p) for p in positions]
+
+
+EXPORT_COLUMNS = ("id", "timestamp", "symbol", "market", "type", "quantity", "price", "fees", "total_amount")
+# Rows per chunk written to the response while exporting
+EXPORT_CHUNK_ROWS = 500
+
+
+def _export_row(tx: models.Transaction) -> dict:
+    return {
+        "id": tx.id,
+        "timestamp": tx.timestamp.isoformat() if tx.timestamp else None,
+        "symbol": tx.symbol,
+        "market": Market(tx.market).value,
+        "type": models.TransactionType(tx.type).value,
+        "quantity": float(tx.quantity),
+        "price": float(tx.price),
+        "fees": float(tx.fees or 0),
+        "total_amount": float(tx.total_amount),
+    }
+
+
+async def _export(user: models.User, fmt: str, filters: dict) -> AsyncIterator[str]:
+    # The request's session may be closed before the body is streamed, so use our own
+    async with database.AsyncSessionLocal() as db:
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS) if fmt == "csv" else None
+        if writer is not None:
+            writer.writeheader()
+        rows = 0
+        async for tx in crud.stream_transactions(db, user, batch_size=EXPORT_CHUNK_ROWS, **filters):
+            if writer is not None:
+                writer.writerow(_export_row(tx))
+            else:
+                buf.write(json.dumps(_export_row(tx)) + "\n")
+            rows += 1
+            if rows % EXPORT_CHUNK_ROWS == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
+
+
+@router.get("/transactions", response_model=TransactionPage)
+async def get_transactions(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    symbol: Optional[str] = None,
+    type: Optional[TradeSide] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    format: Literal["json", "ndjson", "csv"] = "json",
+    db: AsyncSession = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """Transaction history, newest first, filtered by symbol, type and [start, end).
+
+    ``json`` returns one page and a ``next_cursor`` to fetch the next one.
+    ``ndjson`` and ``csv`` stream the whole filtered history as a download.
+    """
+    filters = {"symbol": symbol, "type": type.value if type else None, "start": start, "end": end}
+    if format != "json":
+        media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+        return StreamingResponse(
+            _export(current_user, format, filters),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="transactions.{format}"'},
+        )
+    try:
+        after_id = decode_cursor(cursor) if cursor else None
+        # One extra row tells whether another page exists
+        txs = await crud.list_transactions_after(db, current_user, after_id, limit + 1, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    next_cursor = encode_cursor(txs[limit - 1].id) if len(txs) > limit else None
+    return TransactionPage(items=[TransactionOut.from_orm(t) for t in txs[:limit]], next_cursor=next_cursor)
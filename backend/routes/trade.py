@@ -1,194 +1,138 @@
-"""Trade endpoints: buy, sell, short, cover, shortable list."""
+"""Trade endpoints: buy, sell, short, cover, shortable list, resting orders."""
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from decimal import Decimal
-from typing import Optional
+from typing import List, Optional, Tuple
 from ..database import get_db
+from ..security.auth import get_current_user
 from .. import crud, models
-from ..services import finnhub
-from ..schemas import Market
-from ..utils.shortable import initial_short_margin_required, maintenance_required, daily_interest_for_short
-from ..services import stockgro
+from ..services import execution, quotes
+from ..services.order_engine import engine as order_engine
+from ..schemas import Market, OrderCreate, OrderOut, OrderStatus, OrderType, OrderSide, BatchTradeRequest, BatchTradeResponse, BatchOrderResult
+from ..config import settings
 from datetime import datetime
 
 
 router = APIRouter(prefix="/trade", tags=["trade"])
 
 
-# Mock user function to bypass authentication
-async def get_mock_user(db: AsyncSession = Depends(get_db)):
-    """Get or create a default demo user."""
-    user = await crud.get_user_by_email(db, "demo@tradesphere.com")
-    if not user:
-        # Create default demo user
-        user = models.User(
-            email="demo@tradesphere.com",
-            password_hash="demo",
-            cash_balance=100000.0,
-            tier="INTERMEDIATE"  # Give intermediate tier for shorting
-        )
-        db.add(user)
-        await db.commit()
-        await db.refresh(user)
-    return user
+async def _get_price(symbol: str, market: Market) -> Decimal:
+    """Last traded price, served from the price board when fresh."""
+    if market not in (Market.US, Market.IN):
+        raise HTTPException(status_code=400, detail="Invalid market")
+    try:
+        q = await quotes.fetch_quote(symbol, market)
+    except Exception as e:
+        if market == Market.IN:
+            raise HTTPException(status_code=502, detail=f"StockGro error: {e}")
+        raise
+    return quotes.last_price(q, market)
+
 
+async def _execute(db: AsyncSession, user: models.User, symbol: str, market: Market, side: models.TransactionType, qty: float, price: Decimal) -> Tuple[models.Transaction, models.Position]:
+    """Run one fill through the single-transaction execution service."""
+    try:
+        return await execution.execute_trade(db, user, symbol, market, side, Decimal(str(qty)), price)
+    except execution.TradeRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 
-from backend.services.alpaca import place_order, get_portfolio
+from ..services import alpaca
 from fastapi.responses import JSONResponse
 
 @router.post("/buy")
-async def buy(symbol: str, market: Market, qty: float, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_mock_user)):
+async def buy(symbol: str, market: Market, qty: float, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     if qty <= 0:
         raise HTTPException(status_code=400, detail="quantity must be > 0")
     # Get price
-    if market == Market.US:
-        q = await finnhub.get_quote(symbol)
-        price = Decimal(q.get("c", 0))
-    elif market == Market.IN:
-        try:
-            q = await stockgro.get_realtime_quote(symbol)
-            price = Decimal(q.get("last_price", 0))
-        except Exception as e:
-            raise HTTPException(status_code=502, detail=f"StockGro error: {e}")
-    else:
-        raise HTTPException(status_code=400, detail="Invalid market")
-
-    total = price * Decimal(qty)
-    fees = Decimal(0)
-    if Decimal(current_user.cash_balance) < total + fees:
-        raise HTTPException(status_code=400, detail="insufficient cash")
-    # debit cash
-    current_user.cash_balance = Decimal(current_user.cash_balance) - (total + fees)
-    db.add(current_user)
-    await db.commit()
-    # upsert position
-    pos = await crud.upsert_position(db, current_user, symbol, market, Decimal(qty), price)
-    await crud.create_transaction(db, current_user, symbol, market, models.TransactionType.BUY.value, Decimal(qty), price, fees, total)
+    price = await _get_price(symbol, market)
+    await _execute(db, current_user, symbol, market, models.TransactionType.BUY, qty, price)
     return {"status": "ok", "symbol": symbol, "qty": qty, "price": float(price)}
 
 @router.post("/alpaca/order")
-def alpaca_place_order(symbol: str, qty: int, side: str):
+async def alpaca_place_order(symbol: str, qty: int, side: str):
     """Place a paper trade order using Alpaca API."""
     try:
-        order = place_order(symbol, qty, side)
+        order = await alpaca.place_order_async(symbol, qty, side)
         return JSONResponse(content={"order": order.model_dump()}, status_code=200)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=400)
 
 @router.get("/alpaca/portfolio")
-def alpaca_get_portfolio():
+async def alpaca_get_portfolio():
     """Get Alpaca paper trading portfolio positions."""
     try:
-        positions = get_portfolio()
+        positions = await alpaca.get_portfolio_async()
         return JSONResponse(content={"positions": [p.model_dump() for p in positions]}, status_code=200)
+    except asyncio.TimeoutError:
+        return JSONResponse(content={"error": "Alpaca did not respond in time"}, status_code=504)
     except Exception as e:
         return JSONResponse(content={"error": str(e)}, status_code=400)
 
 @router.post("/sell")
-async def sell(symbol: str, market: Market, qty: float, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_mock_user)):
+async def sell(symbol: str, market: Market, qty: float, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     if qty <= 0:
         raise HTTPException(status_code=400, detail="quantity must be > 0")
-    if market == Market.US:
-        q = await finnhub.get_quote(symbol)
-        price = Decimal(q.get("c", 0))
-    elif market == Market.IN:
-        try:
-            q = await stockgro.get_realtime_quote(symbol)
-            price = Decimal(q.get("last_price", 0))
-        except Exception as e:
-            raise HTTPException(status_code=502, detail=f"StockGro error: {e}")
-    else:
-        raise HTTPException(status_code=400, detail="Invalid market")
-
-    pos = await crud.get_position(db, current_user, symbol, market)
-    if not pos or Decimal(pos.shares) <= 0:
-        raise HTTPException(status_code=400, detail="no long position to sell")
-    if Decimal(pos.shares) < Decimal(qty):
-        raise HTTPException(status_code=400, detail="not enough shares to sell")
-    total = price * Decimal(qty)
-    fees = Decimal(0)
-    current_user.cash_balance = Decimal(current_user.cash_balance) + (total - fees)
-    db.add(current_user)
-    # reduce position
-    await crud.upsert_position(db, current_user, symbol, market, Decimal(-qty), price)
-    await crud.create_transaction(db, current_user, symbol, market, models.TransactionType.SELL.value, Decimal(qty), price, fees, total)
-    await db.commit()
+    price = await _get_price(symbol, market)
+    await _execute(db, current_user, symbol, market, models.TransactionType.SELL, qty, price)
     return {"status": "ok", "symbol": symbol, "qty": qty, "price": float(price)}
 
 
 @router.post("/short")
-async def short(symbol: str, market: Market, qty: float, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_mock_user)):
+async def short(symbol: str, market: Market, qty: float, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     if qty <= 0:
         raise HTTPException(status_code=400, detail="quantity must be > 0")
-    if market == Market.US:
-        q = await finnhub.get_quote(symbol)
-        price = Decimal(q.get("c", 0))
-    elif market == Market.IN:
-        try:
-            q = await stockgro.get_realtime_quote(symbol)
-            price = Decimal(q.get("last_price", 0))
-        except Exception as e:
-            raise HTTPException(status_code=502, detail=f"StockGro error: {e}")
-    else:
-        raise HTTPException(status_code=400, detail="Invalid market")
-
-    # check shortable
-    s = await crud.list_shortable(db, market)
-    symbols = {x.symbol: x for x in s}
-    if symbol not in symbols or not symbols[symbol].available:
-        raise HTTPException(status_code=404, detail="symbol not shortable")
-    borrow_rate = symbols[symbol].borrow_rate_annual
-    notional = price * Decimal(qty)
-    initial_margin = initial_short_margin_required(notional)
-    # ensure sufficient cash
-    if Decimal(current_user.cash_balance) < initial_margin:
-        raise HTTPException(status_code=400, detail="insufficient cash for initial short margin")
-    # credit proceeds to cash, but reserve margin conceptually
-    current_user.cash_balance = Decimal(current_user.cash_balance) + notional
-    db.add(current_user)
-    # create negative position
-    pos = await crud.upsert_position(db, current_user, symbol, market, -Decimal(qty), price, borrow_rate)
-    await crud.create_transaction(db, current_user, symbol, market, models.TransactionType.SHORT.value, Decimal(qty), price, Decimal(0), notional)
-    return {"status": "ok", "symbol": symbol, "qty": qty, "price": float(price), "borrow_rate_annual": borrow_rate}
+    price = await _get_price(symbol, market)
+    _, pos = await _execute(db, current_user, symbol, market, models.TransactionType.SHORT, qty, price)
+    return {"status": "ok", "symbol": symbol, "qty": qty, "price": float(price), "borrow_rate_annual": pos.borrow_rate_annual}
 
 
 @router.post("/cover")
-async def cover(symbol: str, market: Market, qty: float, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_mock_user)):
+async def cover(symbol: str, market: Market, qty: float, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     if qty <= 0:
         raise HTTPException(status_code=400, detail="quantity must be > 0")
-    if market == Market.US:
-        q = await finnhub.get_quote(symbol)
-        price = Decimal(q.get("c", 0))
-    elif market == Market.IN:
-        try:
-            q = await stockgro.get_realtime_quote(symbol)
-            price = Decimal(q.get("last_price", 0))
-        except Exception as e:
-            raise HTTPException(status_code=502, detail=f"StockGro error: {e}")
-    else:
-        raise HTTPException(status_code=400, detail="Invalid market")
-
-    pos = await crud.get_position(db, current_user, symbol, market)
-    if not pos or Decimal(pos.shares) >= 0:
-        raise HTTPException(status_code=400, detail="no short position to cover")
-    if -Decimal(pos.shares) < Decimal(qty):
-        raise HTTPException(status_code=400, detail="cover qty exceeds shorted shares")
-
-    notional = price * Decimal(qty)
-    # debit cash to buy back
-    if Decimal(current_user.cash_balance) < notional:
-        raise HTTPException(status_code=400, detail="insufficient cash to cover")
-    current_user.cash_balance = Decimal(current_user.cash_balance) - notional
-    db.add(current_user)
-    # reduce negative shares towards zero
-    await crud.upsert_position(db, current_user, symbol, market, Decimal(qty), price)
-    await crud.create_transaction(db, current_user, symbol, market, models.TransactionType.COVER.value, Decimal(qty), price, Decimal(0), notional)
-    await db.commit()
+    price = await _get_price(symbol, market)
+    await _execute(db, current_user, symbol, market, models.TransactionType.COVER, qty, price)
     return {"status": "ok", "symbol": symbol, "qty": qty, "price": float(price)}
 
 
+@router.post("/batch", response_model=BatchTradeResponse)
+async def batch(body: BatchTradeRequest, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Submit many BUY/SELL/SHORT/COVER orders at once.
+
+    All symbols are priced in one concurrent fetch, orders are validated in
+    submission order against cash and positions, and every fill is written
+    in one transaction. Orders that fail validation or pricing are reported
+    as rejected without affecting the others.
+    """
+    if not body.orders:
+        raise HTTPException(status_code=400, detail="no orders")
+    if len(body.orders) > settings.TRADE_BATCH_MAX_ORDERS:
+        raise HTTPException(status_code=400, detail=f"at most {settings.TRADE_BATCH_MAX_ORDERS} orders per batch")
+    prices, _ = await quotes.fetch_prices((o.symbol, o.market) for o in body.orders)
+    orders = [
+        execution.BatchOrder(o.symbol, o.market, models.TransactionType(o.side.value), Decimal(str(o.qty)))
+        for o in body.orders
+    ]
+    try:
+        errors = await execution.execute_batch(db, current_user, orders, prices)
+    except execution.TradeRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    results = []
+    for i, (o, error) in enumerate(zip(body.orders, errors)):
+        price = prices.get((o.symbol, o.market))
+        results.append(BatchOrderResult(
+            index=i, symbol=o.symbol, market=o.market, side=o.side, qty=o.qty,
+            status="rejected" if error else "filled",
+            price=float(price) if price is not None else None,
+            error=error,
+        ))
+    filled = sum(1 for e in errors if e is None)
+    return BatchTradeResponse(filled=filled, rejected=len(errors) - filled, cash_balance=float(current_user.cash_balance), results=results)
+
+
 @router.get("/shortable")
 async def shortable_list(db: AsyncSession = Depends(get_db), market: Optional[Market] = None):
     m = None
@@ -196,3 +140,66 @@ async def shortable_list(db: AsyncSession = Depends(get_db), market: Optional[Ma
         m = market
     items = await crud.list_shortable(db, m)
     return items
+
+
+@router.post("/orders", response_model=OrderOut)
+async def place_order(body: OrderCreate, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """Place a resting LIMIT, STOP or STOP_LIMIT order; it fills when the price board crosses it."""
+    if body.order_type in (OrderType.LIMIT, OrderType.STOP_LIMIT) and body.limit_price is None:
+        raise HTTPException(status_code=400, detail="limit_price is required for LIMIT and STOP_LIMIT orders")
+    if body.order_type in (OrderType.STOP, OrderType.STOP_LIMIT) and body.stop_price is None:
+        raise HTTPException(status_code=400, detail="stop_price is required for STOP and STOP_LIMIT orders")
+    qty = Decimal(str(body.quantity))
+    if body.side == OrderSide.BUY:
+        reserve = Decimal(str(body.limit_price or body.stop_price)) * qty
+        if Decimal(current_user.cash_balance) < reserve:
+            raise HTTPException(status_code=400, detail="insufficient cash")
+    else:
+        pos = await crud.get_position(db, current_user, body.symbol, body.market)
+        if not pos or Decimal(pos.shares) < qty:
+            raise HTTPException(status_code=400, detail="not enough shares to sell")
+    order = await crud.create_order(
+        db, current_user, body.symbol, body.market, body.side.value, body.order_type.value, qty,
+        Decimal(str(body.limit_price)) if body.limit_price is not None else None,
+        Decimal(str(body.stop_price)) if body.stop_price is not None else None,
+    )
+    order_engine.add(order)
+    # Marketable on arrival: fill from the board's current quote without waiting for the next refresh
+    order_engine.check(body.symbol, body.market)
+    return order
+
+
+@router.get("/orders", response_model=List[OrderOut])
+async def list_orders(status: Optional[OrderStatus] = None, limit: int = 100, offset: int = 0, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    return await crud.list_orders(db, current_user, status, limit, offset)
+
+
+@router.delete("/orders/{order_id}", response_model=OrderOut)
+async def cancel_order(order_id: int, db: AsyncSession = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    order = await crud.get_order(db, current_user, order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="order not found")
+    if order.status != models.OrderStatus.OPEN:
+        raise HTTPException(status_code=400, detail=f"order is {order.status.value}")
+    if order_engine.is_filling(order_id):
+        # Already pulled from the index by a crossing tick
+        raise HTTPException(status_code=409, detail="order is being filled")
+    # None when the order is not indexed; it is still cancelled in the database
+    resting = order_engine.cancel(order_id)
+    try:
+        cancelled = await crud.cancel_open_order(db, order_id)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        if resting is not None:
+            order_engine.restore(resting)
+        raise
+    await db.refresh(order)
+    if not cancelled:
+        raise HTTPException(status_code=400, detail=f"order is {order.status.value}")
+    return order
+
+
+@router.get("/orders/engine/stats")
+async def order_engine_stats():
+    return order_engine.stats()
@@ -2,12 +2,16 @@
 import asyncio
 import json
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import Set, Dict, Any
+from typing import Set, Dict, Any, List
 import logging
 from decimal import Decimal
-import random
 
-from ..services import finnhub
+from ..services import quotes
+from ..services.orderbook import OrderBookFeed
+from ..services.price_board import board as price_board
+from ..services.simulator import MarketSimulator
+from ..services.ws_hub import Broadcaster, SymbolBroadcaster, Subscriber
+from ..schemas import Market
 from ..config import settings
 
 logger = logging.getLogger(__name__)
@@ -34,39 +38,22 @@ DEMO_TICKERS = {
 }
 
 
-def generate_live_price(symbol: str, prev_price: float = None) -> Dict[str, Any]:
+# One simulator shared by every demo feed; SIM_SEED makes runs reproducible and
+# SIM_SYNTHETIC_SYMBOLS adds SIM00001... symbols for load tests
+simulator = MarketSimulator(DEMO_TICKERS, seed=settings.SIM_SEED, synthetic=settings.SIM_SYNTHETIC_SYMBOLS)
+
+
+def _simulate(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Latest simulated ticks, advancing the whole universe at most once per interval."""
+    simulator.step_if_stale(settings.WS_TICKER_INTERVAL_SECONDS, asyncio.get_event_loop().time())
+    return simulator.ticks(symbols)
+
+
+def generate_live_price(symbol: str) -> Dict[str, Any]:
     """Generate realistic live price data."""
-    if symbol in DEMO_TICKERS:
-        config = DEMO_TICKERS[symbol]
-        base = prev_price if prev_price else config["base"]
-        
-        # Random walk with mean reversion
-        change_pct = random.gauss(0, config["volatility"])
-        mean_reversion = (config["base"] - base) * 0.01
-        
-        new_price = base * (1 + change_pct + mean_reversion)
-        change = new_price - base
-        change_percent = (change / base) * 100
-        
-        # Generate bid/ask spread
-        spread = new_price * 0.0001
-        bid = new_price - spread / 2
-        ask = new_price + spread / 2
-        
-        # Volume simulation
-        volume = random.randint(100000, 5000000)
-        
-        return {
-            "symbol": symbol,
-            "price": round(new_price, 2),
-            "change": round(change, 2),
-            "change_percent": round(change_percent, 3),
-            "bid": round(bid, 2),
-            "ask": round(ask, 2),
-            "volume": volume,
-            "timestamp": asyncio.get_event_loop().time()
-        }
-    
+    data = _simulate([symbol]).get(symbol)
+    if data is not None:
+        return data
     return {
         "symbol": symbol,
         "price": 0,
@@ -76,50 +63,160 @@ def generate_live_price(symbol: str, prev_price: float = None) -> Dict[str, Any]
     }
 
 
+def _produce_tickers() -> Dict[str, Any]:
+    """Compute one tick for all demo symbols."""
+    return {
+        "type": "tickers",
+        "data": list(_simulate(list(DEMO_TICKERS)).values()),
+        "timestamp": asyncio.get_event_loop().time()
+    }
+
+
+tickers_feed = Broadcaster("tickers", _produce_tickers, settings.WS_TICKER_INTERVAL_SECONDS)
+
+
 @router.websocket("/ws/tickers")
 async def websocket_tickers(websocket: WebSocket):
     """
     WebSocket endpoint for streaming live ticker data.
     Streams price updates for multiple symbols in real-time.
+    One producer computes and encodes each tick; every client receives the same frame.
+
+    ?mode=compact sends {"type": "snapshot"} on connect and then {"type": "delta"}
+    frames with only the changed fields per symbol, conflated if the client falls
+    behind. ?encoding=msgpack switches data frames to binary msgpack.
     """
     await websocket.accept()
     active_connections.add(websocket)
     
     logger.info(f"WebSocket client connected. Active connections: {len(active_connections)}")
     
-    # Track last prices for each symbol
-    last_prices: Dict[str, float] = {}
-    
     try:
-        # Main streaming loop
-        while True:
-            # Generate updates for all symbols
-            ticker_data = []
-            for symbol in DEMO_TICKERS.keys():
-                data = generate_live_price(symbol, last_prices.get(symbol))
-                last_prices[symbol] = data.get("price", 0)
-                ticker_data.append(data)
-            
-            # Send batch update
-            await websocket.send_json({
-                "type": "tickers",
-                "data": ticker_data,
-                "timestamp": asyncio.get_event_loop().time()
-            })
-            
-            # Update frequency: 1 second (configurable)
-            await asyncio.sleep(1)
-            
-    except WebSocketDisconnect:
-        logger.info("WebSocket client disconnected")
+        if websocket.query_params.get("mode") == "compact":
+            # Snapshot + per-field deltas for all demo symbols, via the multiplexed feed
+            await stream_feed.serve(
+                websocket,
+                on_subscribe=lambda sub: _stream_subscribe(sub, list(DEMO_TICKERS)),
+                compact=True,
+                encoding=websocket.query_params.get("encoding", "json"),
+            )
+        else:
+            await tickers_feed.serve(websocket)
+    finally:
         active_connections.discard(websocket)
-    except Exception as e:
-        logger.error(f"WebSocket error: {e}")
-        active_connections.discard(websocket)
-        try:
-            await websocket.close()
-        except:
-            pass
+        logger.info("WebSocket client disconnected")
+
+
+def _produce_symbols(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Compute one tick for each subscribed symbol.
+
+    Simulated symbols come from the shared simulator; any other symbol is read
+    from the price board, which keeps it refreshed while it has subscribers.
+    """
+    simulated = _simulate([s for s in symbols if s in simulator])
+    ticks = {}
+    for symbol in symbols:
+        data = simulated.get(symbol)
+        if data is None:
+            quote = price_board.get_quote(symbol, Market.US)
+            if quote is None:
+                continue
+            data = {
+                "symbol": symbol,
+                "price": quote.get("c", 0),
+                "change": quote.get("d", 0),
+                "change_percent": quote.get("dp", 0),
+                "high": quote.get("h", 0),
+                "low": quote.get("l", 0),
+                "timestamp": quote.get("t", 0),
+                "source": "finnhub"
+            }
+        ticks[symbol] = data
+    return ticks
+
+
+def _pin_symbol(symbol: str) -> None:
+    if symbol not in simulator:
+        price_board.pin(symbol, Market.US)
+
+
+def _unpin_symbol(symbol: str) -> None:
+    if symbol not in simulator:
+        price_board.unpin(symbol, Market.US)
+
+
+stream_feed = SymbolBroadcaster(
+    "stream",
+    _produce_symbols,
+    settings.WS_TICKER_INTERVAL_SECONDS,
+    on_symbol_added=_pin_symbol,
+    on_symbol_removed=_unpin_symbol,
+)
+
+
+def _parse_symbols(raw) -> List[str]:
+    if isinstance(raw, str):
+        raw = raw.split(",")
+    if not isinstance(raw, list):
+        return []
+    return [str(s).strip().upper() for s in raw if str(s).strip()]
+
+
+def _stream_subscribe(sub: Subscriber, symbols: List[str]) -> None:
+    added = stream_feed.add_symbols(sub, symbols)
+    sub.offer(json.dumps({"type": "subscribed", "symbols": sorted(sub.symbols)}))
+    snapshot = stream_feed.snapshot(added, compact=sub.compact, encoding=sub.encoding)
+    if snapshot:
+        sub.offer_snapshot(snapshot, added)
+
+
+async def _handle_stream_message(sub: Subscriber, message: str) -> None:
+    try:
+        msg = json.loads(message)
+        action = msg.get("action")
+    except (ValueError, AttributeError):
+        sub.offer(json.dumps({"type": "error", "message": "invalid JSON message"}))
+        return
+    symbols = _parse_symbols(msg.get("symbols", []))
+    if action == "subscribe":
+        _stream_subscribe(sub, symbols)
+    elif action == "unsubscribe":
+        stream_feed.remove_symbols(sub, symbols)
+        sub.offer(json.dumps({"type": "subscribed", "symbols": sorted(sub.symbols)}))
+    elif action == "list":
+        sub.offer(json.dumps({"type": "subscribed", "symbols": sorted(sub.symbols)}))
+    else:
+        sub.offer(json.dumps({"type": "error", "message": f"unknown action: {action}"}))
+
+
+@router.websocket("/ws/stream")
+async def websocket_stream(websocket: WebSocket):
+    """
+    Multiplexed WebSocket endpoint: one socket, any set of symbols.
+
+    Client messages:
+        {"action": "subscribe", "symbols": ["AAPL", "TSLA"]}
+        {"action": "unsubscribe", "symbols": ["TSLA"]}
+        {"action": "list"}
+    Initial symbols may also be passed as ?symbols=AAPL,TSLA.
+
+    Server frames: {"type": "subscribed", "symbols": [...]} after each change,
+    and {"type": "tickers", "data": [...]} carrying only symbols whose data changed.
+    ?mode=compact and ?encoding=msgpack behave as on /ws/tickers.
+    """
+    await websocket.accept()
+    initial = _parse_symbols(websocket.query_params.get("symbols", ""))
+    logger.info(f"Stream client connected with {len(initial)} initial symbols")
+    try:
+        await stream_feed.serve(
+            websocket,
+            on_message=_handle_stream_message,
+            on_subscribe=(lambda sub: _stream_subscribe(sub, initial)) if initial else None,
+            compact=websocket.query_params.get("mode") == "compact",
+            encoding=websocket.query_params.get("encoding", "json"),
+        )
+    finally:
+        logger.info("Stream client disconnected")
 
 
 @router.websocket("/ws/quote/{symbol}")
@@ -131,14 +228,15 @@ async def websocket_quote(websocket: WebSocket, symbol: str):
     await websocket.accept()
     logger.info(f"WebSocket client connected for symbol: {symbol}")
     
-    last_price = None
+    # Keep the symbol on the price board for as long as the stream is open
+    price_board.pin(symbol, Market.US)
     
     try:
         while True:
             # Try to get real data from Finnhub first
             try:
                 if settings.FINNHUB_API_KEY and settings.FINNHUB_API_KEY != "dummy":
-                    quote = await finnhub.get_quote(symbol)
+                    quote = await quotes.fetch_quote(symbol, Market.US)
                     data = {
                         "symbol": symbol,
                         "price": quote.get("c", 0),
@@ -153,16 +251,13 @@ async def websocket_quote(websocket: WebSocket, symbol: str):
                     }
                 else:
                     # Use simulated data
-                    data = generate_live_price(symbol, last_price)
+                    data = generate_live_price(symbol)
                     data["source"] = "simulation"
-                    
-                last_price = data.get("price")
                 
             except Exception as e:
                 logger.warning(f"Failed to get quote for {symbol}: {e}, using simulation")
-                data = generate_live_price(symbol, last_price)
+                data = generate_live_price(symbol)
                 data["source"] = "simulation"
-                last_price = data.get("price")
             
             await websocket.send_json({
                 "type": "quote",
@@ -180,6 +275,22 @@ async def websocket_quote(websocket: WebSocket, symbol: str):
             await websocket.close()
         except:
             pass
+    finally:
+        price_board.unpin(symbol, Market.US)
+
+
+def _orderbook_mids(symbols: List[str]) -> Dict[str, float]:
+    """Mid price per symbol: simulated symbols first, then the price board."""
+    mids = {s: t["price"] for s, t in _simulate([s for s in symbols if s in simulator]).items()}
+    for symbol in symbols:
+        if symbol not in mids:
+            quote = price_board.get_quote(symbol, Market.US)
+            if quote and quote.get("c"):
+                mids[symbol] = float(quote["c"])
+    return mids
+
+
+orderbook_feed = OrderBookFeed("orderbook", _orderbook_mids, settings.ORDERBOOK_INTERVAL_SECONDS)
 
 
 @router.websocket("/ws/orderbook/{symbol}")
@@ -187,56 +298,28 @@ async def websocket_orderbook(websocket: WebSocket, symbol: str):
     """
     WebSocket endpoint for streaming order book depth data.
     Bloomberg-style level 2 market data.
+
+    Every client of a symbol watches the same evolving book. By default each
+    tick sends {"type": "orderbook"} with the top ?depth= levels (default
+    ORDERBOOK_DEFAULT_DEPTH, at most ORDERBOOK_DEPTH). ?mode=incremental sends
+    one full snapshot and then {"type": "orderbook_update"} frames carrying
+    only changed levels as [price, size, orders]; size 0 removes the level.
+    A client too slow to keep up gets another full snapshot after a drop.
     """
     await websocket.accept()
     logger.info(f"Order book stream started for: {symbol}")
-    
     try:
-        while True:
-            # Generate simulated order book
-            base_price = DEMO_TICKERS.get(symbol, {"base": 100})["base"]
-            
-            # Generate bid levels
-            bids = []
-            for i in range(10):
-                price = base_price * (1 - 0.0001 * (i + 1))
-                size = random.randint(100, 5000)
-                bids.append({
-                    "price": round(price, 2),
-                    "size": size,
-                    "orders": random.randint(1, 10)
-                })
-            
-            # Generate ask levels
-            asks = []
-            for i in range(10):
-                price = base_price * (1 + 0.0001 * (i + 1))
-                size = random.randint(100, 5000)
-                asks.append({
-                    "price": round(price, 2),
-                    "size": size,
-                    "orders": random.randint(1, 10)
-                })
-            
-            await websocket.send_json({
-                "type": "orderbook",
-                "symbol": symbol,
-                "bids": bids,
-                "asks": asks,
-                "timestamp": asyncio.get_event_loop().time()
-            })
-            
-            # Update every 500ms for order book
-            await asyncio.sleep(0.5)
-            
-    except WebSocketDisconnect:
+        depth = int(websocket.query_params.get("depth", settings.ORDERBOOK_DEFAULT_DEPTH))
+    except ValueError:
+        depth = settings.ORDERBOOK_DEFAULT_DEPTH
+    try:
+        await orderbook_feed.serve(
+            websocket,
+            on_subscribe=lambda sub: orderbook_feed.add_subscriber(sub, symbol, depth),
+            compact=websocket.query_params.get("mode") == "incremental",
+        )
+    finally:
         logger.info(f"Order book stream closed for {symbol}")
-    except Exception as e:
-        logger.error(f"Order book stream error for {symbol}: {e}")
-        try:
-            await websocket.close()
-        except:
-            pass
 
 
 @router.get("/ws/connections")
@@ -244,9 +327,12 @@ async def get_websocket_status():
     """Get WebSocket connection statistics."""
     return {
         "active_connections": len(active_connections),
+        "feeds": {"tickers": tickers_feed.stats(), "stream": stream_feed.stats(), "orderbook": orderbook_feed.stats()},
         "supported_symbols": list(DEMO_TICKERS.keys()),
+        "simulated_symbols": len(simulator),
         "endpoints": [
             "/ws/tickers - Stream all tickers",
+            "/ws/stream - Subscribe/unsubscribe to any symbols on one socket",
             "/ws/quote/{symbol} - Stream single symbol",
             "/ws/orderbook/{symbol} - Stream order book"
         ]
@@ -16,6 +16,24 @@ class Market(str, Enum):
     IN = "IN"
 
 
+class OrderSide(str, Enum):
+    BUY = "BUY"
+    SELL = "SELL"
+
+
+class OrderType(str, Enum):
+    LIMIT = "LIMIT"
+    STOP = "STOP"
+    STOP_LIMIT = "STOP_LIMIT"
+
+
+class OrderStatus(str, Enum):
+    OPEN = "OPEN"
+    FILLED = "FILLED"
+    CANCELLED = "CANCELLED"
+    REJECTED = "REJECTED"
+
+
 class UserCreate(BaseModel):
     username: str
     email: EmailStr
@@ -53,7 +71,7 @@ class PositionOut(BaseModel):
         from_attributes = True
 
 class TransactionOut(BaseModel):
-    id: str
+    id: int
     symbol: str
     market: Market
     type: str
@@ -67,6 +85,12 @@ class TransactionOut(BaseModel):
         from_attributes = True
 
 
+class TransactionPage(BaseModel):
+    items: List[TransactionOut]
+    # Pass back as ?cursor= for the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+
 class PortfolioSummary(BaseModel):
     cash_balance: float
     equity: float
@@ -74,6 +98,11 @@ class PortfolioSummary(BaseModel):
     maintenance_rate: float = 0.3
     margin_headroom: float
     in_margin_call: bool
+    # From the portfolio aggregate row
+    long_cost_basis: float = 0.0
+    short_cost_basis: float = 0.0
+    position_count: int = 0
+    realized_pnl: float = 0.0
     positions: List[PositionOut] = []
 
 
@@ -85,3 +114,69 @@ class ShortableOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class OrderCreate(BaseModel):
+    symbol: str
+    market: Market
+    side: OrderSide
+    order_type: OrderType
+    quantity: float = Field(gt=0)
+    limit_price: Optional[float] = Field(None, gt=0)
+    stop_price: Optional[float] = Field(None, gt=0)
+
+
+class OrderOut(BaseModel):
+    id: int
+    symbol: str
+    market: Market
+    side: OrderSide
+    order_type: OrderType
+    quantity: float
+    limit_price: Optional[float]
+    stop_price: Optional[float]
+    status: OrderStatus
+    triggered_at: Optional[datetime]
+    fill_price: Optional[float]
+    filled_at: Optional[datetime]
+    reject_reason: Optional[str]
+    created_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
+class TradeSide(str, Enum):
+    BUY = "BUY"
+    SELL = "SELL"
+    SHORT = "SHORT"
+    COVER = "COVER"
+
+
+class BatchOrderIn(BaseModel):
+    symbol: str
+    market: Market
+    side: TradeSide
+    qty: float = Field(gt=0)
+
+
+class BatchTradeRequest(BaseModel):
+    orders: List[BatchOrderIn]
+
+
+class BatchOrderResult(BaseModel):
+    index: int
+    symbol: str
+    market: Market
+    side: TradeSide
+    qty: float
+    status: str  # "filled" or "rejected"
+    price: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BatchTradeResponse(BaseModel):
+    filled: int
+    rejected: int
+    cash_balance: float
+    results: List[BatchOrderResult]
@@ -1,9 +1,11 @@
 """Security helpers: Mock authentication for development (Auth Disabled)."""
 from fastapi import Depends, HTTPException, status, Request
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from .. import crud, models
 from ..database import get_db
 from ..config import settings
+from . import identity
 from typing import Literal
 
 # Mock authentication - no password hashing needed
@@ -22,22 +24,39 @@ def create_access_token(data: dict, expires_minutes: int = None) -> str:
     return "mock-token-auth-disabled"
 
 
-async def get_current_user(db: AsyncSession = Depends(get_db)) -> models.User:
-    """Returns mock user - authentication disabled."""
-    # Return a mock user for development
-    user = await crud.get_user_by_email(db, "demo@tradesphere.com")
-    if not user:
-        # Create mock user if doesn't exist
-        from .. import schemas
-        user_create = schemas.UserCreate(
-            username="demo",
-            email="demo@tradesphere.com",
-            password="demo123"
-        )
-        user = await crud.create_user(db, user_create)
+DEMO_EMAIL = "demo@tradesphere.com"
+
+
+async def _get_or_create_demo_user(db: AsyncSession, email: str) -> models.User:
+    user = await crud.get_user_by_email(db, email)
+    if user:
+        return user
+    user = models.User(
+        email=email,
+        password_hash="demo",
+        cash_balance=100000.0,
+        tier=models.TierEnum.INTERMEDIATE  # Give intermediate tier for shorting
+    )
+    db.add(user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Another request created it first
+        await db.rollback()
+        return await crud.get_user_by_email(db, email)
+    await db.refresh(user)
     return user
 
 
+async def get_current_user(db: AsyncSession = Depends(get_db)) -> models.User:
+    """Returns mock user - authentication disabled.
+
+    Every caller resolves to the demo user; the row is cached briefly (see
+    security/identity.py) so most requests do not query for it.
+    """
+    return await identity.resolve(db, DEMO_EMAIL, _get_or_create_demo_user)
+
+
 async def get_current_active_user(current_user: models.User = Depends(get_current_user)) -> models.User:
     """Returns the current active user."""
     return current_user
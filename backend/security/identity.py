@@ -0,0 +1,91 @@
+"""Short-lived cache of resolved callers, so requests skip the user lookup.
+
+``resolve`` maps a subject (the token's subject; the demo account while
+auth is disabled) to a user row once and keeps a detached copy of its
+columns for IDENTITY_CACHE_TTL_SECONDS. Later requests attach that copy to
+their own session with ``merge(load=False)``, which emits no SQL.
+
+Invalidation:
+- Any ORM flush of a changed User (tier upgrades, profile edits) and any
+  ``mark_changed`` call (``services.execution`` and ``services.interest``,
+  after updating cash in SQL) queue the user id on the session. The cached
+  entry is dropped when that session commits, so the next request reads
+  the committed row.
+- Other processes only notice once the TTL runs out. Nothing authoritative
+  reads the cached balance: cash checks run in SQL against the stored value.
+"""
+from typing import Awaitable, Callable, Dict, Set
+
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from .. import models
+from ..config import settings
+from ..utils.cache import TTLCache
+
+_PENDING = "identity_changed_users"
+
+cache = TTLCache(settings.IDENTITY_CACHE_MAX_ENTRIES, settings.IDENTITY_CACHE_TTL_SECONDS, name="identity")
+# user id -> subjects cached for it, so a change can drop every entry
+_subjects: Dict[int, Set[str]] = {}
+
+
+def _detached_copy(user: models.User) -> models.User:
+    columns = {attr.key: getattr(user, attr.key) for attr in inspect(models.User).column_attrs}
+    copy = models.User(**columns)
+    make_transient_to_detached(copy)
+    return copy
+
+
+def remember(subject: str, user: models.User) -> None:
+    cache.set(subject, _detached_copy(user))
+    _subjects.setdefault(user.id, set()).add(subject)
+
+
+def invalidate_user(user_id: int) -> None:
+    for subject in _subjects.pop(user_id, ()):
+        cache.invalidate(subject)
+
+
+def clear() -> None:
+    cache.clear()
+    _subjects.clear()
+
+
+async def resolve(
+    db: AsyncSession,
+    subject: str,
+    loader: Callable[[AsyncSession, str], Awaitable[models.User]],
+) -> models.User:
+    """Return the user for ``subject`` attached to ``db``; ``loader`` runs on a miss."""
+    cached = cache.get(subject)
+    if cached is not None:
+        cache.hits += 1
+        return await db.merge(cached, load=False)
+    cache.misses += 1
+    user = await loader(db, subject)
+    remember(subject, user)
+    return user
+
+
+def mark_changed(db: AsyncSession, user_id: int) -> None:
+    """Drop ``user_id`` from the cache once ``db`` commits."""
+    db.info.setdefault(_PENDING, set()).add(user_id)
+
+
+@event.listens_for(Session, "before_flush")
+def _track_user_changes(session: Session, flush_context, instances) -> None:
+    for obj in session.dirty:
+        if isinstance(obj, models.User) and session.is_modified(obj):
+            session.info.setdefault(_PENDING, set()).add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    for user_id in session.info.pop(_PENDING, ()):
+        invalidate_user(user_id)
+
+
+def stats() -> dict:
+    return {**cache.stats(), "users": len(_subjects)}
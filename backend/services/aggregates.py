@@ -0,0 +1,160 @@
+"""Materialized per-user portfolio aggregates and their reconciliation.
+
+One ``portfolio_aggregates`` row per user holds what the dashboards would
+otherwise recompute by walking every position and transaction:
+
+- cost basis of the long and short book (shares * avg_price) and the
+  number of open long and short positions
+- realized P&L, fees, fill and close counts from the P&L ledger
+
+``services.execution`` collects an ``AggregateDelta`` for each trade (the
+position's contribution before and after every fill, plus the ledger's
+realized figures) and applies it with a single upsert that increments the
+row in SQL, inside the trade transaction. Concurrent trades therefore
+never overwrite each other's totals.
+
+``reconcile`` recomputes every row from ``positions``, ``realized_pnl`` and
+``transactions`` with grouped queries and reports users whose row has
+drifted; with ``fix=True`` it overwrites them.
+"""
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import crud
+from ..models import PortfolioAggregate, Position, RealizedPnl, Transaction, User
+
+# Columns holding money; the rest are counts
+MONEY_COLUMNS = ("long_cost", "short_cost", "realized_pnl", "fees")
+COUNT_COLUMNS = ("long_positions", "short_positions", "fills", "closes", "winning", "losing")
+COLUMNS = MONEY_COLUMNS + COUNT_COLUMNS
+# Money differences below this are storage rounding, not drift
+_TOLERANCE = Decimal("0.0001")
+
+
+class AggregateDelta:
+    """Changes to one user's aggregate row, accumulated over a trade."""
+    __slots__ = COLUMNS
+
+    def __init__(self):
+        for name in MONEY_COLUMNS:
+            setattr(self, name, Decimal(0))
+        for name in COUNT_COLUMNS:
+            setattr(self, name, 0)
+
+    def _position(self, shares: Decimal, avg_price: Decimal, sign: int) -> None:
+        if shares > 0:
+            self.long_cost += sign * shares * avg_price
+            self.long_positions += sign
+        elif shares < 0:
+            self.short_cost += sign * -shares * avg_price
+            self.short_positions += sign
+
+    def position(self, before_shares: Decimal, before_avg: Decimal, after_shares: Decimal, after_avg: Decimal) -> None:
+        """Replace a position's old contribution with its new one."""
+        self._position(Decimal(before_shares), Decimal(before_avg), -1)
+        self._position(Decimal(after_shares), Decimal(after_avg), 1)
+
+    def as_dict(self) -> Dict[str, object]:
+        return {name: getattr(self, name) for name in COLUMNS}
+
+    def __bool__(self) -> bool:
+        return any(getattr(self, name) for name in COLUMNS)
+
+
+async def apply(db: AsyncSession, user_id: int, delta: AggregateDelta) -> None:
+    """Add ``delta`` to the user's row in one statement; the caller commits."""
+    if delta:
+        await crud.add_portfolio_aggregate(db, user_id, delta.as_dict())
+
+
+async def get(db: AsyncSession, user: User) -> PortfolioAggregate:
+    """The user's aggregate row, or an unsaved all-zero one if they never traded."""
+    row = await crud.get_portfolio_aggregate(db, user)
+    return row if row is not None else PortfolioAggregate(user_id=user.id, **AggregateDelta().as_dict())
+
+
+async def _expected(db: AsyncSession, user_ids: Optional[List[int]]) -> Dict[int, dict]:
+    """Aggregate values recomputed from the source tables, per user."""
+    def scoped(q, column):
+        return q.where(column.in_(user_ids)) if user_ids is not None else q
+
+    users = scoped(select(User.id), User.id)
+    expected = {user_id: {name: 0 for name in COLUMNS} for user_id in (await db.execute(users)).scalars()}
+
+    cost = Position.shares * Position.avg_price
+    positions = scoped(select(
+        Position.user_id,
+        func.sum(case((Position.shares > 0, cost), else_=0)),
+        func.sum(case((Position.shares < 0, -cost), else_=0)),
+        func.sum(case((Position.shares > 0, 1), else_=0)),
+        func.sum(case((Position.shares < 0, 1), else_=0)),
+    ).group_by(Position.user_id), Position.user_id)
+    for user_id, long_cost, short_cost, longs, shorts in await db.execute(positions):
+        expected.setdefault(user_id, {name: 0 for name in COLUMNS}).update(
+            long_cost=long_cost, short_cost=short_cost, long_positions=longs, short_positions=shorts,
+        )
+
+    realized = scoped(select(
+        RealizedPnl.user_id,
+        func.sum(RealizedPnl.pnl),
+        func.count(),
+        func.sum(case((RealizedPnl.pnl > 0, 1), else_=0)),
+        func.sum(case((RealizedPnl.pnl < 0, 1), else_=0)),
+    ).group_by(RealizedPnl.user_id), RealizedPnl.user_id)
+    for user_id, pnl, closes, winning, losing in await db.execute(realized):
+        expected.setdefault(user_id, {name: 0 for name in COLUMNS}).update(
+            realized_pnl=pnl, closes=closes, winning=winning, losing=losing,
+        )
+
+    fills = scoped(select(
+        Transaction.user_id, func.count(), func.sum(Transaction.fees),
+    ).group_by(Transaction.user_id), Transaction.user_id)
+    for user_id, count, fees in await db.execute(fills):
+        expected.setdefault(user_id, {name: 0 for name in COLUMNS}).update(fills=count, fees=fees)
+
+    for values in expected.values():
+        for name in MONEY_COLUMNS:
+            values[name] = Decimal(str(values[name] or 0))
+        for name in COUNT_COLUMNS:
+            values[name] = int(values[name] or 0)
+    return expected
+
+
+def _drift(stored: Optional[PortfolioAggregate], expected: dict) -> Dict[str, dict]:
+    out = {}
+    for name in COLUMNS:
+        have = getattr(stored, name) if stored is not None else 0
+        want = expected[name]
+        if name in MONEY_COLUMNS:
+            diverged = abs(Decimal(str(have or 0)) - want) > _TOLERANCE
+        else:
+            diverged = int(have or 0) != want
+        if diverged:
+            out[name] = {"stored": float(have or 0), "expected": float(want)}
+    return out
+
+
+async def reconcile(db: AsyncSession, user_ids: Optional[List[int]] = None, fix: bool = False) -> dict:
+    """Compare aggregate rows with the source tables; ``fix`` overwrites the rows that drifted.
+
+    Fills and fees are counted from ``transactions``, so a repair also
+    brings in trades made before the ledger existed.
+    """
+    expected = await _expected(db, user_ids)
+    stored_q = select(PortfolioAggregate)
+    if user_ids is not None:
+        stored_q = stored_q.where(PortfolioAggregate.user_id.in_(user_ids))
+    stored = {row.user_id: row for row in (await db.execute(stored_q)).scalars()}
+
+    mismatches = []
+    for user_id, values in expected.items():
+        drift = _drift(stored.get(user_id), values)
+        if drift:
+            mismatches.append({"user_id": user_id, "columns": drift})
+    if fix and mismatches:
+        await crud.set_portfolio_aggregates(db, [{"user_id": m["user_id"], **expected[m["user_id"]]} for m in mismatches])
+        await db.commit()
+    return {"checked": len(expected), "mismatched": len(mismatches), "fixed": fix and bool(mismatches), "mismatches": mismatches}
@@ -1,14 +1,34 @@
 """
 Alpaca Paper Trading Service
 Integrates with Alpaca's paper trading API for order simulation and portfolio management.
+
+The alpaca-py ``TradingClient`` is synchronous. Async callers should use
+``get_portfolio_async``/``place_order_async``, which run the SDK in a small
+bounded thread pool so a slow Alpaca never stalls the event loop. Reads time
+out after ALPACA_TIMEOUT_SECONDS; order submission is never abandoned.
+The pool lives from ``start`` to ``shutdown`` (the app lifespan) and is
+created on first use otherwise, so each lifespan gets a fresh one.
+Positions are cached for ALPACA_POSITIONS_CACHE_TTL_SECONDS.
 """
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from alpaca.trading.client import TradingClient
 from alpaca.trading.requests import MarketOrderRequest
 from alpaca.trading.enums import OrderSide, TimeInForce
 from alpaca.trading.models import Order
 from ..config import settings
+from ..utils.cache import TTLCache
 
 _trading_client = None
+_executor: Optional[ThreadPoolExecutor] = None
+_positions_cache = TTLCache(1, settings.ALPACA_POSITIONS_CACHE_TTL_SECONDS, name="alpaca_positions")
+
+
+def is_configured() -> bool:
+    """True when Alpaca credentials are present."""
+    return bool(settings.ALPACA_API_KEY and settings.ALPACA_API_SECRET)
 
 def get_trading_client():
     """Get or create the Alpaca trading client."""
@@ -39,6 +59,50 @@ def get_portfolio():
     positions = trading_client.get_all_positions()
     return positions
 
+
+async def _run_in_pool(fn, *args, timeout: Optional[float] = None):
+    loop = asyncio.get_running_loop()
+    call = loop.run_in_executor(start(), functools.partial(fn, *args))
+    if timeout is None:
+        return await call
+    return await asyncio.wait_for(call, timeout)
+
+
+async def get_portfolio_async():
+    """Non-blocking get_portfolio with a timeout, served from a short-TTL cache."""
+    return await _positions_cache.get_or_fetch(
+        "positions", lambda: _run_in_pool(get_portfolio, timeout=settings.ALPACA_TIMEOUT_SECONDS)
+    )
+
+
+async def place_order_async(symbol: str, qty: int, side: str):
+    """Non-blocking place_order. Drops cached positions so the fill shows up.
+
+    No timeout: submission is not idempotent and the SDK call keeps running
+    in its thread anyway, so giving up early would only invite a duplicate
+    retry of an order Alpaca may still accept.
+    """
+    try:
+        return await _run_in_pool(place_order, symbol, qty, side)
+    finally:
+        _positions_cache.invalidate("positions")
+
+
+def start() -> ThreadPoolExecutor:
+    """Create the SDK thread pool if there is none. Called from the app lifespan on startup."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.ALPACA_MAX_WORKERS, thread_name_prefix="alpaca")
+    return _executor
+
+
+def shutdown() -> None:
+    """Release the SDK thread pool. Called from the app lifespan on shutdown."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
 # Example usage:
 # order = place_order("AAPL", 1, "buy")
 # positions = get_portfolio()
@@ -0,0 +1,157 @@
+"""Periodic equity snapshots of every user's book, for the equity curve.
+
+Every EQUITY_SNAPSHOT_INTERVAL_SECONDS the writer values all users and
+bulk-inserts one ``equity_snapshots`` row each, stamped with the cycle
+time. A cycle costs, however many users there are:
+
+1. one SELECT DISTINCT of the held (symbol, market) pairs and one
+   concurrent pricing pass over them (``quotes.fetch_prices``, served from
+   the price board when fresh), so a symbol held by 10k users is priced once
+2. per batch of EQUITY_SNAPSHOT_BATCH_USERS users (keyset on users.id): one
+   SELECT of their cash, one SELECT of their open positions by user id
+   range, valuation in memory and one executemany INSERT, then COMMIT
+
+Positions without a price are marked at cost, like ``/portfolio`` does.
+Committing per batch keeps transactions short; an interrupted cycle leaves
+the batches it finished, all with the same ``created_at``. Every app
+process that starts the writer snapshots everyone, so with several workers
+set EQUITY_SNAPSHOT_ENABLED=false on all but one.
+"""
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+from time import perf_counter
+from typing import Dict, Optional, Tuple
+import logging
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..models import EquitySnapshot, Position, User
+from ..schemas import Market
+from ..utils.shortable import maintenance_required
+from . import quotes
+
+logger = logging.getLogger("equity_snapshots")
+
+# Scale of equity_snapshots money columns
+_QUANTUM = Decimal("0.0001")
+
+
+async def _held_prices(db: AsyncSession) -> Tuple[Dict[Tuple[str, Market], Decimal], int]:
+    res = await db.execute(select(Position.symbol, Position.market).where(Position.shares != 0).distinct())
+    pairs = [(symbol, Market(market)) for symbol, market in res.all()]
+    prices, errors = await quotes.fetch_prices(pairs)
+    return prices, len(errors)
+
+
+async def write_snapshots(db: AsyncSession, at: Optional[datetime] = None, batch_size: Optional[int] = None) -> dict:
+    """Value every user's book and insert one snapshot each, stamped ``at`` (default now, UTC)."""
+    at = at or datetime.utcnow()
+    batch_size = batch_size or settings.EQUITY_SNAPSHOT_BATCH_USERS
+    prices, unpriced_symbols = await _held_prices(db)
+
+    users = 0
+    marked_at_cost = 0
+    after = 0
+    while True:
+        res = await db.execute(
+            select(User.id, User.cash_balance).where(User.id > after).order_by(User.id).limit(batch_size)
+        )
+        batch = res.all()
+        if not batch:
+            break
+        lo, hi = batch[0][0], batch[-1][0]
+        long_value: Dict[int, Decimal] = {}
+        short_value: Dict[int, Decimal] = {}
+        res = await db.execute(
+            select(Position.user_id, Position.symbol, Position.market, Position.shares, Position.avg_price)
+            .where(Position.user_id >= lo, Position.user_id <= hi, Position.shares != 0)
+        )
+        for user_id, symbol, market, shares, avg_price in res.all():
+            price = prices.get((symbol, Market(market)))
+            if price is None:
+                price = Decimal(avg_price)
+                marked_at_cost += 1
+            value = Decimal(shares) * price
+            if value >= 0:
+                long_value[user_id] = long_value.get(user_id, Decimal(0)) + value
+            else:
+                short_value[user_id] = short_value.get(user_id, Decimal(0)) - value
+
+        rows = []
+        for user_id, cash in batch:
+            short = short_value.get(user_id, Decimal(0))
+            rows.append({
+                "user_id": user_id,
+                "total_equity": (Decimal(cash) + long_value.get(user_id, Decimal(0)) - short).quantize(_QUANTUM),
+                "maintenance_required": maintenance_required(short).quantize(_QUANTUM),
+                "created_at": at,
+            })
+        await db.execute(insert(EquitySnapshot), rows)
+        await db.commit()
+        users += len(batch)
+        after = hi
+    return {
+        "created_at": at.isoformat(),
+        "users": users,
+        "unpriced_symbols": unpriced_symbols,
+        "positions_marked_at_cost": marked_at_cost,
+    }
+
+
+class EquitySnapshotWriter:
+    """Background task running ``write_snapshots`` on a fixed interval."""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self.cycles = 0
+        self.last_cycle_ms = 0.0
+        self.last_users = 0
+
+    async def snapshot_once(self, at: Optional[datetime] = None) -> dict:
+        from ..database import AsyncSessionLocal
+        t0 = perf_counter()
+        async with AsyncSessionLocal() as db:
+            result = await write_snapshots(db, at)
+        self.cycles += 1
+        self.last_cycle_ms = (perf_counter() - t0) * 1000
+        self.last_users = result["users"]
+        logger.info("Equity snapshot of %d users in %.0f ms", result["users"], self.last_cycle_ms)
+        return result
+
+    async def _run(self) -> None:
+        while True:
+            # The first cycle waits one interval so startup is not slowed down
+            await asyncio.sleep(settings.EQUITY_SNAPSHOT_INTERVAL_SECONDS)
+            try:
+                await self.snapshot_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Equity snapshot failed: %s", e)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="equity-snapshots")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "cycles": self.cycles,
+            "last_cycle_ms": round(self.last_cycle_ms, 2),
+            "last_users": self.last_users,
+        }
+
+
+writer = EquitySnapshotWriter()
@@ -0,0 +1,282 @@
+"""Trade execution: cash, position and ledger entry in one transaction.
+
+``execute_trade`` validates a fill against the user's cash and current
+position, then applies the cash change, the position change, the
+transaction row, the realized P&L ledger (``services.ledger``) and the
+user's portfolio aggregate row (``services.aggregates``) together. The
+round-trips are one SELECT for the position, the cash UPDATE, one SELECT
+of the open lots, the aggregate upsert and the final flush + COMMIT, so
+either everything is written or nothing is. Shortable checks are
+answered by the in-memory shortable index.
+
+Concurrency:
+- Cash is never read-modify-written in Python. ``crud.adjust_cash`` runs
+  ``UPDATE users SET cash_balance = cash_balance + :delta WHERE
+  cash_balance >= :required``, so parallel trades cannot overspend; a
+  zero-row update means insufficient cash. It is the first write of the
+  trade, so a rejection leaves nothing behind.
+- The position is read ``FOR UPDATE`` (row lock on Postgres; ignored by
+  SQLite) and carries a version column, so an update based on a stale
+  read fails with StaleDataError instead of overwriting. Two first buys of
+  the same symbol collide on the unique (user, symbol, market) index.
+- Conflicts roll back and retry the whole trade up to
+  TRADE_CONFLICT_RETRIES times, then surface as a 409.
+
+Callers that need to write more in the same transaction (the order
+engine marks the order FILLED) pass ``commit=False``, commit themselves
+and handle ``is_conflict`` errors.
+"""
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+
+from .. import crud, models
+from ..config import settings
+from ..models import TransactionType
+from ..schemas import Market
+from ..security import identity
+from ..utils.shortable import initial_short_margin_required
+from . import aggregates, ledger
+from .shortable_index import index as shortable_index
+
+# Lock and serialization failures worth retrying
+_RETRYABLE_MESSAGES = ("database is locked", "deadlock detected", "could not serialize")
+# Unique keys a concurrent writer can beat us to, as named in the driver's
+# error: the index on Postgres, the indexed columns on SQLite
+_CONFLICT_KEYS = (
+    "uq_positions_user_symbol_market",
+    "positions.user_id, positions.symbol, positions.market",
+    "uq_interest_accruals_date_position",
+    "interest_accruals.accrual_date, interest_accruals.user_id, interest_accruals.symbol, interest_accruals.market",
+)
+
+
+class TradeRejected(Exception):
+    """The trade fails validation; nothing has been written."""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def is_conflict(exc: BaseException) -> bool:
+    """True for errors caused by a concurrent writer; the trade can be retried.
+
+    Other integrity errors (a missing foreign key, a NOT NULL column) fail
+    the same way on every attempt and are not conflicts.
+    """
+    if isinstance(exc, StaleDataError):
+        return True
+    if isinstance(exc, IntegrityError):
+        return any(key in str(exc) for key in _CONFLICT_KEYS)
+    return isinstance(exc, DBAPIError) and any(m in str(exc).lower() for m in _RETRYABLE_MESSAGES)
+
+
+class _Plan:
+    """Cash and share effects of one validated fill."""
+    __slots__ = ("total", "fees", "cash_change", "required", "share_change", "borrow_rate", "no_cash")
+
+    def __init__(self, total, fees, cash_change, required, share_change, borrow_rate=None, no_cash=None):
+        self.total = total
+        self.fees = fees
+        self.cash_change = cash_change
+        self.required = required
+        self.share_change = share_change
+        self.borrow_rate = borrow_rate
+        self.no_cash = no_cash
+
+
+def _plan(side: TransactionType, qty: Decimal, price: Decimal, fees: Decimal, shares: Decimal,
+          shortable: Optional[models.ShortableStock] = None) -> _Plan:
+    """Validate a fill against the current share count; cash is checked by the caller."""
+    notional = price * qty
+    if side == TransactionType.BUY:
+        return _Plan(notional, fees, -(notional + fees), notional + fees, qty, no_cash="insufficient cash")
+    if side == TransactionType.SELL:
+        if shares <= 0:
+            raise TradeRejected("no long position to sell")
+        if shares < qty:
+            raise TradeRejected("not enough shares to sell")
+        return _Plan(notional, fees, notional - fees, None, -qty)
+    if side == TransactionType.SHORT:
+        if not shortable or not shortable.available:
+            raise TradeRejected("symbol not shortable", status_code=404)
+        # credit proceeds to cash, but reserve margin conceptually
+        return _Plan(notional, Decimal(0), notional, initial_short_margin_required(notional), -qty,
+                     borrow_rate=shortable.borrow_rate_annual, no_cash="insufficient cash for initial short margin")
+    if shares >= 0:
+        raise TradeRejected("no short position to cover")
+    if -shares < qty:
+        raise TradeRejected("cover qty exceeds shorted shares")
+    return _Plan(notional, Decimal(0), -notional, notional, qty, no_cash="insufficient cash to cover")
+
+
+async def _apply(
+    db: AsyncSession,
+    user: models.User,
+    symbol: str,
+    market: Market,
+    side: TransactionType,
+    qty: Decimal,
+    price: Decimal,
+    fees: Decimal,
+) -> Tuple[models.Transaction, models.Position]:
+    pos = await crud.get_position(db, user, symbol, market, for_update=True)
+    shortable = await shortable_index.find(db, symbol, market) if side == TransactionType.SHORT else None
+    plan = _plan(side, qty, price, fees, Decimal(pos.shares) if pos else Decimal(0), shortable)
+    if await crud.adjust_cash(db, user, plan.cash_change, require=plan.required) is None:
+        raise TradeRejected(plan.no_cash)
+    identity.mark_changed(db, user.id)
+    delta = aggregates.AggregateDelta()
+    before = (Decimal(pos.shares), Decimal(pos.avg_price)) if pos else (Decimal(0), Decimal(0))
+    pos = crud.apply_position_change(db, user, pos, symbol, market, plan.share_change, price, plan.borrow_rate)
+    delta.position(*before, pos.shares, pos.avg_price)
+    await ledger.record_fills(db, user.id, [ledger.LedgerFill(symbol, market, plan.share_change, price, plan.fees)], delta=delta)
+    await aggregates.apply(db, user.id, delta)
+    tx = await crud.create_transaction(db, user, symbol, market, side.value, qty, price, plan.fees, plan.total, commit=False)
+    return tx, pos
+
+
+async def execute_trade(
+    db: AsyncSession,
+    user: models.User,
+    symbol: str,
+    market: Market,
+    side: TransactionType,
+    qty: Decimal,
+    price: Decimal,
+    fees: Decimal = Decimal(0),
+    commit: bool = True,
+) -> Tuple[models.Transaction, models.Position]:
+    """Apply one BUY/SELL/SHORT/COVER fill at ``price``; raises TradeRejected if invalid.
+
+    Returns the new transaction and the updated position.
+    """
+    side = TransactionType(side)
+    if qty <= 0:
+        raise TradeRejected("quantity must be > 0")
+    if not commit:
+        return await _apply(db, user, symbol, market, side, qty, price, fees)
+
+    attempts = max(1, settings.TRADE_CONFLICT_RETRIES)
+    for attempt in range(attempts):
+        try:
+            result = await _apply(db, user, symbol, market, side, qty, price, fees)
+            await db.commit()
+            return result
+        except Exception as e:
+            if not is_conflict(e):
+                raise
+            await db.rollback()
+            if attempt == attempts - 1:
+                raise TradeRejected("concurrent update, please retry", status_code=409)
+            await db.refresh(user)
+
+
+class BatchOrder:
+    __slots__ = ("symbol", "market", "side", "qty")
+
+    def __init__(self, symbol: str, market: Market, side: TransactionType, qty: Decimal):
+        self.symbol = symbol
+        self.market = Market(market)
+        self.side = TransactionType(side)
+        self.qty = qty
+
+
+async def _apply_batch(
+    db: AsyncSession,
+    user: models.User,
+    orders: List[BatchOrder],
+    prices: Dict[Tuple[str, Market], Decimal],
+) -> List[Optional[str]]:
+    pairs = list(dict.fromkeys((o.symbol, o.market) for o in orders))
+    positions = await crud.get_positions_for(db, user, pairs, for_update=True)
+    short_symbols = {o.symbol for o in orders if o.side == TransactionType.SHORT}
+    shortable = await shortable_index.find_many(db, short_symbols) if short_symbols else {}
+
+    # Validate in submission order against running in-memory cash and shares
+    start_cash = Decimal(user.cash_balance)
+    cash = start_cash
+    headroom: Optional[Decimal] = None
+    errors: List[Optional[str]] = []
+    fills = []
+    ledger_fills = []
+    delta = aggregates.AggregateDelta()
+    for o in orders:
+        key = (o.symbol, o.market)
+        price = prices.get(key)
+        if price is None or price <= 0:
+            errors.append("quote unavailable")
+            continue
+        pos = positions.get(key)
+        try:
+            if o.qty <= 0:
+                raise TradeRejected("quantity must be > 0")
+            sh = shortable.get(o.symbol)
+            plan = _plan(o.side, o.qty, price, Decimal(0), Decimal(pos.shares) if pos else Decimal(0),
+                         sh if sh is not None and Market(sh.market) == o.market else None)
+            if plan.required is not None and cash < plan.required:
+                raise TradeRejected(plan.no_cash)
+        except TradeRejected as e:
+            errors.append(e.detail)
+            continue
+        if plan.required is not None:
+            spare = cash - plan.required
+            headroom = spare if headroom is None else min(headroom, spare)
+        cash += plan.cash_change
+        before = (Decimal(pos.shares), Decimal(pos.avg_price)) if pos else (Decimal(0), Decimal(0))
+        pos = positions[key] = crud.apply_position_change(db, user, pos, o.symbol, o.market, plan.share_change, price, plan.borrow_rate)
+        delta.position(*before, pos.shares, pos.avg_price)
+        fills.append({
+            "user_id": user.id, "symbol": o.symbol, "market": o.market, "type": o.side.value,
+            "quantity": o.qty, "price": price, "fees": plan.fees, "total_amount": plan.total,
+        })
+        ledger_fills.append(ledger.LedgerFill(o.symbol, o.market, plan.share_change, price, plan.fees))
+        errors.append(None)
+
+    if fills:
+        # Every check above still holds as long as the stored balance has not
+        # dropped by more than the smallest headroom since it was read
+        require = start_cash - headroom if headroom is not None else None
+        if await crud.adjust_cash(db, user, cash - start_cash, require=require) is None:
+            raise StaleDataError("cash balance changed during batch")
+        identity.mark_changed(db, user.id)
+        await crud.bulk_create_transactions(db, fills)
+        await ledger.record_fills(db, user.id, ledger_fills, delta=delta)
+        await aggregates.apply(db, user.id, delta)
+    return errors
+
+
+async def execute_batch(
+    db: AsyncSession,
+    user: models.User,
+    orders: List[BatchOrder],
+    prices: Dict[Tuple[str, Market], Decimal],
+) -> List[Optional[str]]:
+    """Fill many orders in one transaction; returns None per filled order or the rejection reason.
+
+    Orders are validated in submission order against in-memory cash and
+    positions, so a later order sees the effect of earlier ones. The cash
+    change is a single atomic UPDATE, positions are flushed once, the
+    ledger rows go in as one bulk INSERT, and the realized P&L ledger and
+    the aggregate row are updated once for all fills. Rejected orders are
+    skipped; the rest commit together or, after conflict retries, not at
+    all.
+    """
+    attempts = max(1, settings.TRADE_CONFLICT_RETRIES)
+    for attempt in range(attempts):
+        try:
+            errors = await _apply_batch(db, user, orders, prices)
+            await db.commit()
+            return errors
+        except Exception as e:
+            if not is_conflict(e):
+                raise
+            await db.rollback()
+            if attempt == attempts - 1:
+                raise TradeRejected("concurrent update, please retry", status_code=409)
+            await db.refresh(user)
@@ -1,39 +1,85 @@
-"""Async Finnhub client with simple in-memory caching and retries."""
+"""Async Finnhub client with bounded in-memory quote caching and retries.
+
+All requests go through one process-wide ``httpx.AsyncClient`` so TCP/TLS
+connections are pooled and kept alive between calls. The FastAPI lifespan in
+``backend.main`` calls ``start_client``/``close_client``; ``get_client`` lazily
+creates the client for scripts that run outside the app.
+"""
 import httpx
 import asyncio
 from typing import Dict, Any, Optional
-from time import time
 from ..config import settings
+from ..utils.cache import TTLCache
 from functools import wraps
 import logging
 
-_quote_cache: Dict[str, Dict[str, Any]] = {}
-_cache_lock = asyncio.Lock()
+_quote_cache = TTLCache(settings.QUOTE_CACHE_MAX_ENTRIES, settings.QUOTE_CACHE_TTL_SECONDS, name="finnhub_quotes")
+
+_client: Optional[httpx.AsyncClient] = None
 
 logger = logging.getLogger("finnhub")
 
 
-async def _cached_get(key: str, ttl: int, fetcher):
-    async with _cache_lock:
-        entry = _quote_cache.get(key)
-        if entry and time() - entry["ts"] < ttl:
-            return entry["val"]
-    # fetch outside lock
-    val = await fetcher()
-    async with _cache_lock:
-        _quote_cache[key] = {"val": val, "ts": time()}
-    return val
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    )
+    http2 = settings.HTTP2_ENABLED and _http2_available()
+    if settings.HTTP2_ENABLED and not http2:
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is missing; falling back to HTTP/1.1")
+    return httpx.AsyncClient(
+        base_url=settings.FINNHUB_BASE_URL,
+        timeout=settings.HTTP_TIMEOUT_SECONDS,
+        limits=limits,
+        http2=http2,
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared pooled client, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
 
+async def start_client() -> httpx.AsyncClient:
+    """Create the shared client. Called from the app lifespan on startup."""
+    return get_client()
 
-async def _get(url: str, params: dict) -> dict:
+
+async def close_client() -> None:
+    """Close the shared client and release pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Return quote cache and request-coalescing counters."""
+    return _quote_cache.stats()
+
+
+async def _get(path: str, params: dict) -> dict:
     # Simple retry with backoff
     backoff = 0.5
+    client = get_client()
     for attempt in range(4):
         try:
-            async with httpx.AsyncClient(timeout=10) as client:
-                r = await client.get(url, params=params)
-                r.raise_for_status()
-                return r.json()
+            r = await client.get(path, params=params)
+            r.raise_for_status()
+            return r.json()
         except Exception as e:
             logger.warning("Finnhub request failed attempt %s: %s", attempt + 1, e)
             await asyncio.sleep(backoff)
@@ -46,20 +92,22 @@ async def get_quote(symbol: str) -> dict:
     key = f"quote:{symbol}"
 
     async def fetch():
-        url = "https://finnhub.io/api/v1/quote"
         params = {"symbol": symbol, "token": settings.FINNHUB_API_KEY}
-        return await _get(url, params)
+        return await _get("/quote", params)
+
+    return await _quote_cache.get_or_fetch(key, fetch)
+
 
-    return await _cached_get(key, settings.QUOTE_CACHE_TTL_SECONDS, fetch)
+def quote_age(symbol: str) -> Optional[float]:
+    """Seconds since the cached quote for ``symbol`` was fetched; None if not cached."""
+    return _quote_cache.age(f"quote:{symbol}")
 
 
 async def get_candles(symbol: str, resolution: str, frm: int, to: int) -> dict:
-    url = "https://finnhub.io/api/v1/stock/candle"
     params = {"symbol": symbol, "resolution": resolution, "from": frm, "to": to, "token": settings.FINNHUB_API_KEY}
-    return await _get(url, params)
+    return await _get("/stock/candle", params)
 
 
 async def list_symbols(exchange: str = "US") -> list:
-    url = "https://finnhub.io/api/v1/stock/symbol"
     params = {"exchange": exchange, "token": settings.FINNHUB_API_KEY}
-    return await _get(url, params)
+    return await _get("/stock/symbol", params)
@@ -0,0 +1,122 @@
+"""Daily borrow interest on short positions, charged set-based and once per date.
+
+``accrue_daily_interest`` charges one day of interest on every short
+position in a fixed number of statements, however many positions exist:
+
+1. one SELECT of the short positions not yet charged for the date
+2. one concurrent pricing pass over the distinct (symbol, market) pairs
+   (``quotes.fetch_prices``, served from the price board when fresh)
+3. interest per position in memory (``daily_interest_for_short``)
+4. one bulk INSERT of ``interest_accruals`` rows tagged with a run id
+5. one UPDATE debiting every affected user the sum of this run's rows
+
+all in a single transaction. The unique (date, user, symbol, market) index
+on the accrual rows makes the job idempotent per date: a second run skips
+what is already charged, and a concurrent run that loses the race retries
+and finds nothing left to charge. Positions that cannot be priced are left
+for a later run the same day.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+from uuid import uuid4
+import logging
+
+from sqlalchemy import and_, exists, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..models import InterestAccrual, Position, User
+from ..schemas import Market
+from ..security import identity
+from ..utils.shortable import daily_interest_for_short
+from . import quotes
+from .execution import is_conflict
+
+logger = logging.getLogger("interest")
+
+# Scale of interest_accruals.interest and users.cash_balance
+_INTEREST_QUANTUM = Decimal("0.0001")
+
+
+async def _accrue(db: AsyncSession, accrual_date: date) -> dict:
+    already = exists().where(and_(
+        InterestAccrual.accrual_date == accrual_date,
+        InterestAccrual.user_id == Position.user_id,
+        InterestAccrual.symbol == Position.symbol,
+        InterestAccrual.market == Position.market,
+    ))
+    res = await db.execute(select(Position).where(Position.shares < 0, ~already))
+    positions = res.scalars().all()
+    prices, errors = await quotes.fetch_prices((p.symbol, Market(p.market)) for p in positions)
+
+    run_id = uuid4().hex
+    rows = []
+    unpriced = []
+    for p in positions:
+        key = (p.symbol, Market(p.market))
+        price = prices.get(key)
+        if price is None or price <= 0:
+            unpriced.append({"user_id": p.user_id, "symbol": p.symbol, "market": key[1], "error": errors.get(key, "no price")})
+            continue
+        shares = Decimal(p.shares)
+        rate = p.borrow_rate_annual or 0.0
+        rows.append({
+            "accrual_date": accrual_date,
+            "run_id": run_id,
+            "user_id": p.user_id,
+            "symbol": p.symbol,
+            "market": key[1],
+            "shares": shares,
+            "price": price,
+            "borrow_rate_annual": rate,
+            "interest": daily_interest_for_short(-shares * price, rate).quantize(_INTEREST_QUANTUM),
+        })
+
+    users = {r["user_id"] for r in rows}
+    if rows:
+        await db.execute(insert(InterestAccrual), rows)
+        charged = (
+            select(func.sum(InterestAccrual.interest))
+            .where(InterestAccrual.run_id == run_id, InterestAccrual.user_id == User.id)
+            .scalar_subquery()
+        )
+        await db.execute(
+            update(User)
+            .where(User.id.in_(select(InterestAccrual.user_id).where(InterestAccrual.run_id == run_id)))
+            .values(cash_balance=User.cash_balance - charged)
+            .execution_options(synchronize_session=False)
+        )
+        for user_id in users:
+            identity.mark_changed(db, user_id)
+    await db.commit()
+    return {
+        "accrual_date": accrual_date.isoformat(),
+        "applied": len(rows),
+        "users": len(users),
+        "total_interest": float(sum((r["interest"] for r in rows), Decimal(0))),
+        "unpriced": unpriced,
+        "details": [
+            {"user_id": r["user_id"], "symbol": r["symbol"], "market": r["market"], "interest": float(r["interest"])}
+            for r in rows
+        ],
+    }
+
+
+async def accrue_daily_interest(db: AsyncSession, accrual_date: Optional[date] = None) -> dict:
+    """Charge one day's borrow interest on every short position not yet charged for ``accrual_date``.
+
+    Defaults to today (UTC). Returns a summary with one detail entry per
+    charged position; positions without a price are listed under ``unpriced``.
+    """
+    accrual_date = accrual_date or datetime.utcnow().date()
+    attempts = max(1, settings.TRADE_CONFLICT_RETRIES)
+    for attempt in range(attempts):
+        try:
+            return await _accrue(db, accrual_date)
+        except Exception as e:
+            if not is_conflict(e) or attempt == attempts - 1:
+                raise
+            # Another run charged some of the same positions first
+            await db.rollback()
+            logger.info("Interest accrual for %s conflicted with a concurrent run, retrying", accrual_date)
@@ -0,0 +1,165 @@
+"""Realized P&L ledger: open lots matched against closing fills as trades happen.
+
+``record_fills`` runs inside the trade transaction (``services.execution``)
+and keeps three tables current, so performance figures never need a replay
+of the transaction history:
+
+- ``position_lots``: the open shares per (user, symbol, market), one lot per
+  opening fill under FIFO or a single merged lot under AVERAGE. A lot's
+  price is its cost per share with the opening fees folded in (proceeds net
+  of fees for shorts).
+- ``realized_pnl``: one row per closing fill and matched lot side, with the
+  open and close values, closing fees and the resulting gain or loss.
+- the realized columns of ``portfolio_aggregates`` (realized P&L, fees,
+  fills, closes, winning and losing closes), added to the caller's
+  ``AggregateDelta`` or, without one, incremented here by one upsert.
+
+A fill that closes more than the open quantity closes everything and opens
+the remainder on the other side; its fees are split pro rata between the
+closing and the opening part. The matching method comes from PNL_METHOD
+(FIFO or AVERAGE) unless the caller passes one; switching methods only
+affects lots opened or closed afterwards.
+"""
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import crud
+from ..config import settings
+from ..models import LotSide, PnlMethod, PositionLot, RealizedPnl
+from ..schemas import Market
+from . import aggregates
+
+
+class LedgerFill:
+    """One executed fill; ``qty`` is the signed share change (BUY/COVER > 0, SELL/SHORT < 0)."""
+    __slots__ = ("symbol", "market", "qty", "price", "fees")
+
+    def __init__(self, symbol: str, market: Market, qty: Decimal, price: Decimal, fees: Decimal = Decimal(0)):
+        self.symbol = symbol
+        self.market = Market(market)
+        self.qty = Decimal(qty)
+        self.price = Decimal(price)
+        self.fees = Decimal(fees)
+
+
+def _average(lots: List[PositionLot], now: datetime) -> List[PositionLot]:
+    """Merge several open lots into the oldest one at their weighted cost (FIFO lots read under AVERAGE)."""
+    if len(lots) < 2:
+        return lots
+    keep = lots[0]
+    qty = sum((Decimal(lot.open_quantity) for lot in lots), Decimal(0))
+    cost = sum((Decimal(lot.open_quantity) * Decimal(lot.price) for lot in lots), Decimal(0))
+    keep.price = cost / qty
+    keep.open_quantity = qty
+    keep.quantity = qty
+    for lot in lots[1:]:
+        lot.open_quantity = Decimal(0)
+        lot.closed_at = now
+    return [keep]
+
+
+def _close(lots: List[PositionLot], qty: Decimal, now: datetime) -> Tuple[Decimal, Decimal]:
+    """Take ``qty`` shares from the lots oldest first; returns (shares taken, their open value)."""
+    taken = Decimal(0)
+    value = Decimal(0)
+    while lots and taken < qty:
+        lot = lots[0]
+        open_qty = Decimal(lot.open_quantity)
+        n = min(open_qty, qty - taken)
+        taken += n
+        value += n * Decimal(lot.price)
+        lot.open_quantity = open_qty - n
+        if lot.open_quantity == 0:
+            lot.closed_at = now
+            lots.pop(0)
+    return taken, value
+
+
+async def record_fills(
+    db: AsyncSession,
+    user_id: int,
+    fills: Iterable[LedgerFill],
+    method: Optional[PnlMethod] = None,
+    delta: Optional[aggregates.AggregateDelta] = None,
+) -> List[dict]:
+    """Match ``fills`` (in execution order) against the user's open lots; the caller commits.
+
+    Realized totals go into ``delta`` when given (the caller applies it
+    with its own changes), otherwise they are written before returning.
+    Returns the realized P&L rows written (as dicts), one per fill that closed shares.
+    """
+    fills = list(fills)
+    if not fills:
+        return []
+    method = PnlMethod(method or settings.PNL_METHOD)
+    now = datetime.utcnow()
+    pairs = list(dict.fromkeys((f.symbol, f.market) for f in fills))
+    open_lots = await crud.get_open_lots(db, user_id, pairs)
+    if method == PnlMethod.AVERAGE:
+        open_lots = {key: _average(lots, now) for key, lots in open_lots.items()}
+
+    realized: List[dict] = []
+    total_pnl = Decimal(0)
+    total_fees = Decimal(0)
+    winning = losing = 0
+    for f in fills:
+        total_fees += f.fees
+        lots = open_lots.setdefault((f.symbol, f.market), [])
+        size = abs(f.qty)
+        opening = LotSide.LONG if f.qty > 0 else LotSide.SHORT
+        closing = LotSide.SHORT if opening == LotSide.LONG else LotSide.LONG
+        closed, open_value = Decimal(0), Decimal(0)
+        if lots and lots[0].side == closing:
+            closed, open_value = _close(lots, size, now)
+        if closed:
+            fees = f.fees * closed / size
+            close_value = closed * f.price
+            gross = close_value - open_value if closing == LotSide.LONG else open_value - close_value
+            pnl = gross - fees
+            realized.append({
+                "user_id": user_id, "symbol": f.symbol, "market": f.market, "side": closing, "method": method,
+                "quantity": closed, "open_value": open_value, "close_value": close_value, "fees": fees, "pnl": pnl,
+                "realized_at": now,
+            })
+            total_pnl += pnl
+            if pnl > 0:
+                winning += 1
+            elif pnl < 0:
+                losing += 1
+
+        remaining = size - closed
+        if remaining <= 0:
+            continue
+        fee_per_share = f.fees / size
+        price = f.price + fee_per_share if opening == LotSide.LONG else f.price - fee_per_share
+        if method == PnlMethod.AVERAGE and lots:
+            lot = lots[0]
+            held = Decimal(lot.open_quantity)
+            lot.price = (held * Decimal(lot.price) + remaining * price) / (held + remaining)
+            lot.open_quantity = held + remaining
+            lot.quantity = Decimal(lot.quantity) + remaining
+            continue
+        lot = PositionLot(
+            user_id=user_id, symbol=f.symbol, market=f.market, side=opening,
+            quantity=remaining, open_quantity=remaining, price=price, opened_at=now,
+        )
+        db.add(lot)
+        lots.append(lot)
+
+    if realized:
+        await db.execute(insert(RealizedPnl), realized)
+    own = delta is None
+    delta = aggregates.AggregateDelta() if own else delta
+    delta.realized_pnl += total_pnl
+    delta.fees += total_fees
+    delta.fills += len(fills)
+    delta.closes += len(realized)
+    delta.winning += winning
+    delta.losing += losing
+    if own:
+        await aggregates.apply(db, user_id, delta)
+    return realized
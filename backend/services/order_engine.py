@@ -0,0 +1,358 @@
+"""Matching engine for resting limit, stop and stop-limit orders.
+
+Orders are persisted in the ``orders`` table; OPEN ones are mirrored in an
+in-memory index keyed by (symbol, market). Each symbol keeps four heaps
+ordered so the next order to trigger is always on top:
+
+- BUY limit:  fills when price <= limit   (max-heap on limit)
+- SELL limit: fills when price >= limit   (min-heap on limit)
+- BUY stop:   triggers when price >= stop (min-heap on stop)
+- SELL stop:  triggers when price <= stop (max-heap on stop)
+
+A tick only pops the orders that cross, so evaluating a symbol costs
+O(1) when nothing fills and O(k log n) for k fills, however many orders rest.
+Cancelled orders are dropped from the heaps lazily.
+
+The engine listens to the price board: every new quote is evaluated
+synchronously on the event loop, crossing orders leave the index at once
+(so they can never fill twice) and are handed to a worker task that
+persists the fill through ``execution.execute_trade`` in the same
+transaction as the order status change. A triggered STOP
+fills at the tick price; a triggered STOP_LIMIT becomes a resting limit.
+Limit orders fill at the tick price, which is at or better than the limit.
+A fill that still fails after the conflict retries marks the order REJECTED,
+since it is no longer in the index to fill or cancel.
+
+Cancelling is refused only while the worker holds the order for a fill.
+Any other OPEN order is cancelled in the database with a conditional
+UPDATE, whether or not it is indexed (e.g. ``load`` failed at startup),
+and put back in the index if that commit fails.
+"""
+import asyncio
+import heapq
+from datetime import datetime
+from decimal import Decimal
+from itertools import count
+from time import perf_counter
+from typing import Dict, List, Optional, Set, Tuple
+import logging
+
+from .. import crud, models
+from ..config import settings
+from ..models import OrderSide, OrderStatus, OrderType, TransactionType
+from ..schemas import Market
+from .execution import TradeRejected, execute_trade, is_conflict
+from .price_board import board
+from .quotes import last_price
+
+logger = logging.getLogger("order_engine")
+
+Key = Tuple[str, Market]
+
+_seq = count()
+
+
+class RestingOrder:
+    __slots__ = ("id", "key", "side", "order_type", "limit_price", "stop_price", "triggered")
+
+    def __init__(self, id: int, key: Key, side: OrderSide, order_type: OrderType,
+                 limit_price: Optional[float], stop_price: Optional[float], triggered: bool = False):
+        self.id = id
+        self.key = key
+        self.side = side
+        self.order_type = order_type
+        self.limit_price = limit_price
+        self.stop_price = stop_price
+        self.triggered = triggered
+
+    @classmethod
+    def from_model(cls, order: models.Order) -> "RestingOrder":
+        return cls(
+            order.id,
+            (order.symbol, Market(order.market)),
+            OrderSide(order.side),
+            OrderType(order.order_type),
+            float(order.limit_price) if order.limit_price is not None else None,
+            float(order.stop_price) if order.stop_price is not None else None,
+            triggered=order.triggered_at is not None,
+        )
+
+
+class SymbolOrders:
+    """The four trigger heaps for one symbol. Entries are (sort key, seq, order id)."""
+
+    def __init__(self):
+        self.buy_limits: List[tuple] = []
+        self.sell_limits: List[tuple] = []
+        self.buy_stops: List[tuple] = []
+        self.sell_stops: List[tuple] = []
+        self.live: Dict[int, RestingOrder] = {}
+        self._stale = 0
+
+    def __len__(self) -> int:
+        return len(self.live)
+
+    def _push_limit(self, order: RestingOrder) -> None:
+        if order.side == OrderSide.BUY:
+            heapq.heappush(self.buy_limits, (-order.limit_price, next(_seq), order.id))
+        else:
+            heapq.heappush(self.sell_limits, (order.limit_price, next(_seq), order.id))
+
+    def add(self, order: RestingOrder) -> None:
+        self.live[order.id] = order
+        if order.order_type == OrderType.LIMIT or order.triggered:
+            self._push_limit(order)
+        elif order.side == OrderSide.BUY:
+            heapq.heappush(self.buy_stops, (order.stop_price, next(_seq), order.id))
+        else:
+            heapq.heappush(self.sell_stops, (-order.stop_price, next(_seq), order.id))
+
+    def remove(self, order_id: int) -> Optional[RestingOrder]:
+        order = self.live.pop(order_id, None)
+        if order is not None:
+            self._stale += 1
+            if self._stale > 1024 and self._stale > len(self.live):
+                self._compact()
+        return order
+
+    def _compact(self) -> None:
+        for name in ("buy_limits", "sell_limits", "buy_stops", "sell_stops"):
+            heap = [e for e in getattr(self, name) if e[2] in self.live]
+            heapq.heapify(heap)
+            setattr(self, name, heap)
+        self._stale = 0
+
+    def _pop_while(self, heap: List[tuple], crossed) -> List[RestingOrder]:
+        out = []
+        while heap and crossed(heap[0][0]):
+            order = self.live.get(heapq.heappop(heap)[2])
+            if order is not None:
+                out.append(order)
+        return out
+
+    def evaluate(self, price: float) -> Tuple[List[RestingOrder], List[RestingOrder]]:
+        """Return (orders to fill at ``price``, stop-limits that just triggered)."""
+        fills: List[RestingOrder] = []
+        triggered: List[RestingOrder] = []
+        stops = self._pop_while(self.buy_stops, lambda stop: stop <= price)
+        stops += self._pop_while(self.sell_stops, lambda neg_stop: -neg_stop >= price)
+        for order in stops:
+            if order.order_type == OrderType.STOP:
+                fills.append(order)
+            else:
+                order.triggered = True
+                triggered.append(order)
+                self._push_limit(order)
+        fills += self._pop_while(self.buy_limits, lambda neg_limit: -neg_limit >= price)
+        fills += self._pop_while(self.sell_limits, lambda limit: limit <= price)
+        for order in fills:
+            del self.live[order.id]
+        return fills, triggered
+
+
+class OrderEngine:
+    def __init__(self):
+        self.books: Dict[Key, SymbolOrders] = {}
+        self._keys: Dict[int, Key] = {}
+        # Orders pulled out of the index and queued for (or in) a fill
+        self._filling: Set[int] = set()
+        self._queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self.evaluations = 0
+        self.last_eval_us = 0.0
+        self.fills = 0
+        self.rejects = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    # -- index ------------------------------------------------------------
+
+    def add(self, order: models.Order) -> None:
+        """Index an OPEN order; its symbol stays on the price board while it rests."""
+        self.restore(RestingOrder.from_model(order))
+
+    def restore(self, resting: RestingOrder) -> None:
+        """Put back an order taken out by ``cancel`` whose cancellation did not commit."""
+        book = self.books.get(resting.key)
+        if book is None:
+            book = self.books[resting.key] = SymbolOrders()
+            board.pin(*resting.key)
+        book.add(resting)
+        self._keys[resting.id] = resting.key
+
+    def cancel(self, order_id: int) -> Optional[RestingOrder]:
+        """Take an order out of the index; None if it was not resting there."""
+        key = self._keys.pop(order_id, None)
+        if key is None:
+            return None
+        resting = self.books[key].remove(order_id)
+        self._drop_if_empty(key)
+        return resting
+
+    def is_filling(self, order_id: int) -> bool:
+        """True while the worker has the order queued or is filling it."""
+        return order_id in self._filling
+
+    def _drop_if_empty(self, key: Key) -> None:
+        if not self.books[key]:
+            del self.books[key]
+            board.unpin(*key)
+
+    def check(self, symbol: str, market: Market) -> None:
+        """Evaluate one symbol against the board's current quote, if fresh."""
+        quote = board.get_quote(symbol, market)
+        if quote is not None:
+            self.on_prices({(symbol, Market(market)): quote})
+
+    def on_prices(self, updates: Dict[Key, dict]) -> None:
+        """Price board listener: pull crossing orders out and queue them for the worker."""
+        t0 = perf_counter()
+        for key, quote in updates.items():
+            book = self.books.get(key)
+            if book is None:
+                continue
+            price = float(last_price(quote, key[1]))
+            if price <= 0:
+                continue
+            fills, triggered = book.evaluate(price)
+            for order in triggered:
+                self._queue.put_nowait(("trigger", order.id, None))
+            for order in fills:
+                del self._keys[order.id]
+                self._filling.add(order.id)
+                self._queue.put_nowait(("fill", order.id, price))
+            if fills:
+                self._drop_if_empty(key)
+        self.evaluations += 1
+        self.last_eval_us = (perf_counter() - t0) * 1e6
+
+    # -- persistence ------------------------------------------------------
+
+    async def load(self) -> int:
+        from ..database import AsyncSessionLocal
+        async with AsyncSessionLocal() as db:
+            orders = await crud.list_open_orders(db)
+        for order in orders:
+            self.add(order)
+        return len(orders)
+
+    async def _mark_triggered(self, db, order_id: int) -> None:
+        row = await db.get(models.Order, order_id)
+        if row is not None and row.status == OrderStatus.OPEN:
+            row.triggered_at = datetime.utcnow()
+            await db.commit()
+
+    async def _fill(self, db, order_id: int, price: float) -> None:
+        order = await db.get(models.Order, order_id)
+        if order is None or order.status != OrderStatus.OPEN:
+            return
+        user = await db.get(models.User, order.user_id)
+        side = TransactionType.BUY if order.side == OrderSide.BUY else TransactionType.SELL
+        px = Decimal(str(price))
+        try:
+            # The fill and the order status change commit together
+            await execute_trade(db, user, order.symbol, Market(order.market), side, Decimal(order.quantity), px, commit=False)
+        except TradeRejected as e:
+            order.status = OrderStatus.REJECTED
+            order.reject_reason = e.detail
+            await db.commit()
+            self.rejects += 1
+            return
+        order.status = OrderStatus.FILLED
+        order.fill_price = px
+        order.filled_at = datetime.utcnow()
+        await db.commit()
+        self.fills += 1
+
+    async def _reject(self, order_id: int, reason: str) -> None:
+        from ..database import AsyncSessionLocal
+        async with AsyncSessionLocal() as db:
+            row = await db.get(models.Order, order_id)
+            if row is not None and row.status == OrderStatus.OPEN:
+                row.status = OrderStatus.REJECTED
+                row.reject_reason = reason
+                await db.commit()
+                self.rejects += 1
+
+    async def process(self, kind: str, order_id: int, price: Optional[float]) -> None:
+        try:
+            await self._process(kind, order_id, price)
+        finally:
+            if kind == "fill":
+                self._filling.discard(order_id)
+
+    async def _process(self, kind: str, order_id: int, price: Optional[float]) -> None:
+        from ..database import AsyncSessionLocal
+        attempts = max(1, settings.TRADE_CONFLICT_RETRIES)
+        for attempt in range(attempts):
+            async with AsyncSessionLocal() as db:
+                try:
+                    if kind == "fill":
+                        await self._fill(db, order_id, price)
+                    else:
+                        await self._mark_triggered(db, order_id)
+                    return
+                except Exception as e:
+                    # Lost a race with a concurrent trade for the same user: start over
+                    if not is_conflict(e) or attempt == attempts - 1:
+                        if kind == "fill":
+                            # The order already left the index; close it out so it
+                            # does not sit OPEN with nothing left to fill or cancel it
+                            await self._reject(order_id, "fill failed, please resubmit")
+                        raise
+
+    async def drain(self) -> None:
+        """Process everything queued so far (tests and shutdown)."""
+        while not self._queue.empty():
+            await self.process(*self._queue.get_nowait())
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            try:
+                await self.process(*item)
+            except Exception as e:
+                logger.error("Order %s %s failed: %s", item[1], item[0], e)
+
+    # -- lifecycle --------------------------------------------------------
+
+    async def start(self) -> None:
+        try:
+            loaded = await self.load()
+            logger.info("Order engine loaded %s open orders", loaded)
+        except Exception as e:
+            logger.warning("Order engine could not load open orders: %s", e)
+        board.add_listener(self.on_prices)
+        if self._task is None or self._task.done():
+            # The queue binds to the running loop; keep anything queued before start
+            queue, self._queue = self._queue, asyncio.Queue()
+            while not queue.empty():
+                self._queue.put_nowait(queue.get_nowait())
+            self._task = asyncio.create_task(self._run(), name="order-engine")
+
+    async def stop(self) -> None:
+        board.remove_listener(self.on_prices)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "open_orders": len(self._keys),
+            "filling": len(self._filling),
+            "symbols": len(self.books),
+            "queued": self._queue.qsize(),
+            "evaluations": self.evaluations,
+            "last_eval_us": round(self.last_eval_us, 1),
+            "fills": self.fills,
+            "rejects": self.rejects,
+        }
+
+
+engine = OrderEngine()
@@ -0,0 +1,290 @@
+"""Stateful synthetic L2 order books for the demo order book stream.
+
+``OrderBook`` holds one symbol's aggregated price levels. Prices are integer
+ticks (cents) so levels key exactly; each side keeps a sorted list of ticks
+(``bisect``) next to a {tick: [size, orders]} dict. Books evolve through
+add/cancel/trade events around a mid price supplied by the caller (the demo
+simulator or the price board), and every level touched since the last drain
+is reported as an incremental change, with size 0 meaning the level is gone.
+
+``OrderBookFeed`` is a ``Broadcaster``: one background task steps every book
+that has subscribers, then fans out frames that are encoded once per symbol
+and shared by all subscribers:
+- full mode: {"type": "orderbook", ...} with the top ``depth`` levels each tick,
+  encoded once per (symbol, depth)
+- incremental mode: one {"type": "orderbook", ...} snapshot of the whole book
+  on subscribe, then {"type": "orderbook_update", "seq": n, ...} frames with
+  the changed levels only; if the slow-consumer policy drops one of a
+  client's frames, its next frame is a fresh whole-book snapshot
+
+A book is built on its first subscriber and dropped with its last, so idle
+symbols cost nothing and deep books (ORDERBOOK_DEPTH, hundreds of levels)
+cost the same per tick regardless of how many clients watch them.
+"""
+import asyncio
+import bisect
+import json
+import random
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import logging
+
+from ..config import settings
+from .ws_hub import Broadcaster, Subscriber
+
+logger = logging.getLogger("orderbook")
+
+TICK = 0.01
+BID = "bids"
+ASK = "asks"
+
+
+class OrderBook:
+    def __init__(self, symbol: str, mid: float, depth: int, seed: Optional[int] = None):
+        self.symbol = symbol
+        self.depth = max(1, depth)
+        self.rng = random.Random(seed)
+        # Level spacing of ~1 basis point, like the old generated books
+        self.spacing = max(1, round(mid * 0.0001 / TICK))
+        self.levels: Dict[str, Dict[int, List[int]]] = {BID: {}, ASK: {}}
+        # Ascending ticks per side: best bid is the last entry, best ask the first
+        self.ticks: Dict[str, List[int]] = {BID: [], ASK: []}
+        self.changes: Dict[Tuple[str, int], None] = {}
+        self.seq = 0
+        self.mid_tick = round(mid / TICK)
+        self._refill()
+
+    # -- level primitives -------------------------------------------------
+
+    def _set(self, side: str, tick: int, size: int, orders: int) -> None:
+        levels = self.levels[side]
+        if size <= 0 or orders <= 0:
+            if levels.pop(tick, None) is not None:
+                ticks = self.ticks[side]
+                del ticks[bisect.bisect_left(ticks, tick)]
+                self.changes[(side, tick)] = None
+            return
+        if tick not in levels:
+            bisect.insort(self.ticks[side], tick)
+        levels[tick] = [size, orders]
+        self.changes[(side, tick)] = None
+
+    def best(self, side: str) -> Optional[int]:
+        ticks = self.ticks[side]
+        if not ticks:
+            return None
+        return ticks[-1] if side == BID else ticks[0]
+
+    def add(self, side: str, tick: int, size: int) -> None:
+        """Rest a new order of ``size`` at ``tick``."""
+        level = self.levels[side].get(tick)
+        if level is None:
+            self._set(side, tick, size, 1)
+        else:
+            self._set(side, tick, level[0] + size, level[1] + 1)
+
+    def cancel(self, side: str, tick: int, size: int) -> None:
+        """Cancel ``size`` (one order) from the level at ``tick``."""
+        level = self.levels[side].get(tick)
+        if level is not None:
+            self._set(side, tick, level[0] - size, level[1] - 1)
+
+    def trade(self, side: str, size: int) -> int:
+        """Execute a marketable order of ``size`` against ``side``; returns the filled size."""
+        filled = 0
+        while size > 0:
+            tick = self.best(side)
+            if tick is None:
+                break
+            level_size, orders = self.levels[side][tick]
+            take = min(size, level_size)
+            # Fully filled resting orders leave the level
+            self._set(side, tick, level_size - take, orders - take * orders // level_size)
+            filled += take
+            size -= take
+        return filled
+
+    # -- simulation -------------------------------------------------------
+
+    def _random_size(self) -> int:
+        return self.rng.randint(1, 50) * 100
+
+    def _refill(self) -> None:
+        """Keep ``depth`` levels per side: extend the tail and trim beyond it."""
+        for side, sign in ((BID, -1), (ASK, 1)):
+            ticks = self.ticks[side]
+            while len(ticks) < self.depth:
+                if ticks:
+                    tail = ticks[0] if side == BID else ticks[-1]
+                else:
+                    tail = self.mid_tick
+                self._set(side, tail + sign * self.spacing, self._random_size(), self.rng.randint(1, 10))
+            while len(ticks) > self.depth:
+                tail = ticks[0] if side == BID else ticks[-1]
+                self._set(side, tail, 0, 0)
+
+    def step(self, mid: float, events: Optional[int] = None) -> None:
+        """Advance the book one tick towards ``mid`` with random order flow."""
+        rng = self.rng
+        self.mid_tick = mid_tick = round(mid / TICK)
+        # Price moved through resting liquidity: those levels trade away
+        while self.ticks[ASK] and self.ticks[ASK][0] <= mid_tick:
+            self.trade(ASK, self.levels[ASK][self.ticks[ASK][0]][0])
+        while self.ticks[BID] and self.ticks[BID][-1] >= mid_tick:
+            self.trade(BID, self.levels[BID][self.ticks[BID][-1]][0])
+
+        if events is None:
+            events = 3 + self.depth // 5
+        for _ in range(events):
+            side = BID if rng.random() < 0.5 else ASK
+            roll = rng.random()
+            if roll < 0.5:
+                # Most new orders rest near the touch
+                distance = 1 + min(int(rng.expovariate(0.3)), self.depth - 1)
+                sign = -1 if side == BID else 1
+                self.add(side, mid_tick + sign * distance * self.spacing, self._random_size())
+            elif roll < 0.85:
+                ticks = self.ticks[side]
+                if ticks:
+                    tick = ticks[rng.randrange(len(ticks))]
+                    level = self.levels[side][tick]
+                    self.cancel(side, tick, min(level[0], self._random_size()))
+            else:
+                self.trade(side, self._random_size())
+        self._refill()
+
+    # -- output -----------------------------------------------------------
+
+    @staticmethod
+    def _price(tick: int) -> float:
+        return round(tick * TICK, 2)
+
+    def snapshot(self, depth: Optional[int] = None) -> Dict[str, List[dict]]:
+        """Top ``depth`` levels per side, best first."""
+        depth = self.depth if depth is None else depth
+        out = {}
+        for side in (BID, ASK):
+            ticks = self.ticks[side]
+            top = reversed(ticks[-depth:]) if side == BID else ticks[:depth]
+            levels = self.levels[side]
+            out[side] = [{"price": self._price(t), "size": levels[t][0], "orders": levels[t][1]} for t in top]
+        return out
+
+    def drain_changes(self) -> Optional[Dict[str, List[list]]]:
+        """Changed levels since the last drain as [price, size, orders]; None if nothing changed."""
+        if not self.changes:
+            return None
+        out: Dict[str, List[list]] = {BID: [], ASK: []}
+        for side, tick in self.changes:
+            level = self.levels[side].get(tick)
+            size, orders = level if level is not None else (0, 0)
+            out[side].append([self._price(tick), size, orders])
+        self.changes = {}
+        self.seq += 1
+        return out
+
+
+class OrderBookFeed(Broadcaster):
+    """One producer for every order book with subscribers.
+
+    ``mids(symbols)`` returns the current mid price per symbol; symbols it
+    leaves out keep their previous mid.
+    """
+
+    def __init__(self, name: str, mids: Callable[[List[str]], Dict[str, float]], interval: float):
+        super().__init__(name, None, interval)
+        self.mids = mids
+        self.books: Dict[str, OrderBook] = {}
+        self.index: Dict[str, Set[Subscriber]] = {}
+        self._timestamp = 0.0
+
+    def add_subscriber(self, sub: Subscriber, symbol: str, depth: int) -> None:
+        """Attach ``sub`` to ``symbol`` and queue its initial snapshot."""
+        book = self.books.get(symbol)
+        if book is None:
+            mid = self.mids([symbol]).get(symbol, 100.0)
+            book = self.books[symbol] = OrderBook(symbol, mid, settings.ORDERBOOK_DEPTH, seed=settings.SIM_SEED)
+            book.drain_changes()
+        sub.symbols.add(symbol)
+        sub.state["depth"] = max(1, min(depth, book.depth))
+        self.index.setdefault(symbol, set()).add(sub)
+        # Incremental subscribers start from the whole book, as updates cover all of it
+        if sub.compact:
+            self._deliver_incremental(sub, self._frame(book, book.depth))
+        else:
+            sub.offer(self._frame(book, sub.state["depth"]))
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        for symbol in sub.symbols:
+            subs = self.index.get(symbol)
+            if subs is None:
+                continue
+            subs.discard(sub)
+            if not subs:
+                del self.index[symbol]
+                self.books.pop(symbol, None)
+        super().unsubscribe(sub)
+
+    def _frame(self, book: OrderBook, depth: int) -> str:
+        return json.dumps({
+            "type": "orderbook",
+            "symbol": book.symbol,
+            "seq": book.seq,
+            **book.snapshot(depth),
+            "timestamp": self._timestamp,
+        })
+
+    def tick(self) -> None:
+        if not self.index:
+            return
+        self._timestamp = asyncio.get_event_loop().time()
+        mids = self.mids(list(self.index))
+        for symbol, subs in list(self.index.items()):
+            book = self.books[symbol]
+            book.step(mids.get(symbol, book.mid_tick * TICK))
+            changes = book.drain_changes()
+            update = None
+            full: Dict[int, str] = {}
+            for sub in list(subs):
+                if sub.compact:
+                    resync = sub.state.get("resync")
+                    if resync and symbol in resync:
+                        # A dropped frame left the client's book behind; resend it whole
+                        resync.discard(symbol)
+                        depth = book.depth
+                    elif changes is None:
+                        continue
+                    else:
+                        if update is None:
+                            update = json.dumps({
+                                "type": "orderbook_update",
+                                "symbol": symbol,
+                                "seq": book.seq,
+                                **changes,
+                                "timestamp": self._timestamp,
+                            })
+                        self._deliver_incremental(sub, update)
+                        continue
+                else:
+                    depth = sub.state["depth"]
+                frame = full.get(depth)
+                if frame is None:
+                    frame = full[depth] = self._frame(book, depth)
+                if sub.compact:
+                    self._deliver_incremental(sub, frame)
+                else:
+                    self._deliver(sub, frame)
+
+    def _deliver_incremental(self, sub: Subscriber, frame: str) -> None:
+        # Updates only apply on top of every earlier frame, so once one is
+        # dropped each of the subscriber's books gets a snapshot next tick
+        dropped = sub.dropped
+        self._deliver(sub, frame)
+        if sub.dropped > dropped:
+            sub.state["resync"] = set(sub.symbols)
+
+    def stats(self) -> dict:
+        return {
+            **super().stats(),
+            "books": len(self.books),
+            "levels": sum(len(b.ticks[BID]) + len(b.ticks[ASK]) for b in self.books.values()),
+        }
@@ -0,0 +1,201 @@
+"""In-memory price board kept fresh by a background task.
+
+The board tracks the symbols the app is actively using:
+- held positions (reloaded from the database every PRICE_BOARD_HOLDINGS_RELOAD_SECONDS)
+- pinned symbols, e.g. open WebSocket quote streams (refcounted)
+- recently requested symbols (dropped after PRICE_BOARD_IDLE_SECONDS without a read)
+
+Quotes are stamped with the time they were fetched upstream, not stored, and
+both the quotes and the recent set are capped at PRICE_BOARD_MAX_SYMBOLS on
+write (oldest first), so memory stays bounded even without the refresher.
+
+Every PRICE_BOARD_REFRESH_SECONDS the refresher fetches all of them in one
+concurrent batch through ``quotes.fetch_upstream_many``. Request handlers go
+through ``quotes.fetch_quote``, which answers from the board when the entry
+is younger than PRICE_BOARD_MAX_AGE_SECONDS and only falls back to HTTP on a miss.
+
+Listeners registered with ``add_listener`` are called synchronously with
+{(symbol, market): quote} for every batch of new quotes; they must be quick.
+"""
+import asyncio
+from collections import OrderedDict
+from time import monotonic, perf_counter
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import logging
+
+from sqlalchemy import select
+
+from ..config import settings
+from ..schemas import Market
+
+logger = logging.getLogger("price_board")
+
+Key = Tuple[str, Market]
+Listener = Callable[[Dict[Key, dict]], None]
+
+
+class PriceBoard:
+    def __init__(self):
+        self._quotes: "OrderedDict[Key, Tuple[float, dict]]" = OrderedDict()
+        self._recent: "OrderedDict[Key, float]" = OrderedDict()
+        self._pinned: Dict[Key, int] = {}
+        self._held: Set[Key] = set()
+        self._holdings_loaded_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._listeners: List[Listener] = []
+        self.refreshes = 0
+        self.last_refresh_ms = 0.0
+        self.last_refresh_errors = 0
+
+    @staticmethod
+    def _key(symbol: str, market: Market) -> Key:
+        return (symbol, Market(market))
+
+    def get_quote(self, symbol: str, market: Market, max_age: Optional[float] = None) -> Optional[dict]:
+        """Return the board quote if younger than ``max_age`` seconds, else None."""
+        key = self._key(symbol, market)
+        self.track(symbol, market)
+        entry = self._quotes.get(key)
+        if entry is None:
+            return None
+        if max_age is None:
+            max_age = settings.PRICE_BOARD_MAX_AGE_SECONDS
+        if monotonic() - entry[0] > max_age:
+            return None
+        return entry[1]
+
+    def put(self, symbol: str, market: Market, quote: dict, age: float = 0.0) -> None:
+        """Store a quote fetched ``age`` seconds ago and notify listeners."""
+        key = self._key(symbol, market)
+        self._store(key, quote, monotonic() - age)
+        self._notify({key: quote})
+
+    def _store(self, key: Key, quote: dict, fetched_at: float) -> None:
+        self._quotes[key] = (fetched_at, quote)
+        self._quotes.move_to_end(key)
+        while len(self._quotes) > settings.PRICE_BOARD_MAX_SYMBOLS:
+            self._quotes.popitem(last=False)
+
+    def add_listener(self, listener: Listener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Listener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, updates: Dict[Key, dict]) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(updates)
+            except Exception as e:
+                logger.error("Price board listener failed: %s", e)
+
+    def track(self, symbol: str, market: Market) -> None:
+        """Mark a symbol as recently referenced so the refresher keeps it warm."""
+        key = self._key(symbol, market)
+        self._recent[key] = monotonic()
+        self._recent.move_to_end(key)
+        while len(self._recent) > settings.PRICE_BOARD_MAX_SYMBOLS:
+            self._recent.popitem(last=False)
+        self._expire_recent()
+
+    def _expire_recent(self) -> None:
+        cutoff = monotonic() - settings.PRICE_BOARD_IDLE_SECONDS
+        while self._recent:
+            key, ts = next(iter(self._recent.items()))
+            if ts >= cutoff:
+                break
+            self._recent.popitem(last=False)
+
+    def pin(self, symbol: str, market: Market) -> None:
+        key = self._key(symbol, market)
+        self._pinned[key] = self._pinned.get(key, 0) + 1
+
+    def unpin(self, symbol: str, market: Market) -> None:
+        key = self._key(symbol, market)
+        count = self._pinned.get(key, 0) - 1
+        if count > 0:
+            self._pinned[key] = count
+        else:
+            self._pinned.pop(key, None)
+
+    def active_symbols(self) -> List[Key]:
+        """Expire idle symbols and return everything the refresher should fetch."""
+        self._expire_recent()
+        active = set(self._recent) | set(self._pinned) | self._held
+        for key in list(self._quotes):
+            if key not in active:
+                del self._quotes[key]
+        return list(active)
+
+    async def _reload_holdings(self) -> None:
+        from ..database import AsyncSessionLocal
+        from ..models import Position
+        async with AsyncSessionLocal() as db:
+            res = await db.execute(
+                select(Position.symbol, Position.market).where(Position.shares != 0).distinct()
+            )
+            self._held = {self._key(symbol, market) for symbol, market in res.all()}
+        self._holdings_loaded_at = monotonic()
+
+    async def refresh_once(self) -> None:
+        from . import quotes
+        if self._holdings_loaded_at is None or monotonic() - self._holdings_loaded_at >= settings.PRICE_BOARD_HOLDINGS_RELOAD_SECONDS:
+            try:
+                await self._reload_holdings()
+            except Exception as e:
+                logger.warning("Price board could not load holdings: %s", e)
+                self._holdings_loaded_at = monotonic()
+        keys = self.active_symbols()
+        if not keys:
+            return
+        t0 = perf_counter()
+        fetched, errors = await quotes.fetch_upstream_many(keys)
+        now = monotonic()
+        for key, quote in fetched.items():
+            self._store(key, quote, now - quotes.upstream_age(*key))
+        self.refreshes += 1
+        self.last_refresh_ms = (perf_counter() - t0) * 1000
+        self.last_refresh_errors = len(errors)
+        if fetched:
+            self._notify(fetched)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Price board refresh failed: %s", e)
+            await asyncio.sleep(settings.PRICE_BOARD_REFRESH_SECONDS)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="price-board")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "symbols": len(self._quotes),
+            "recent": len(self._recent),
+            "pinned": len(self._pinned),
+            "held": len(self._held),
+            "refreshes": self.refreshes,
+            "last_refresh_ms": round(self.last_refresh_ms, 2),
+            "last_refresh_errors": self.last_refresh_errors,
+            "listeners": len(self._listeners),
+        }
+
+
+board = PriceBoard()
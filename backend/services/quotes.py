@@ -0,0 +1,130 @@
+"""Market-aware quote fetching: routes a symbol to Finnhub (US) or StockGro (IN)
+and fans out multi-symbol requests concurrently with a cap and per-symbol timeout.
+
+``fetch_quote`` answers from the in-memory price board when it holds a fresh
+quote and only goes upstream on a miss; ``fetch_upstream`` always goes upstream.
+"""
+import asyncio
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from ..config import settings
+from ..schemas import Market
+from . import finnhub, stockgro
+from .price_board import board
+
+logger = logging.getLogger("quotes")
+
+
+async def fetch_upstream(symbol: str, market: Market) -> dict:
+    """Return the raw upstream quote for one symbol."""
+    if market == Market.US:
+        return await finnhub.get_quote(symbol)
+    return await stockgro.get_realtime_quote(symbol)
+
+
+def upstream_age(symbol: str, market: Market) -> float:
+    """Seconds since the upstream client fetched its cached quote; 0 if not cached."""
+    age = finnhub.quote_age(symbol) if market == Market.US else stockgro.quote_age(symbol)
+    return age or 0.0
+
+
+async def fetch_quote(symbol: str, market: Market) -> dict:
+    """Return a raw quote for one symbol, from the price board when fresh."""
+    market = Market(market)
+    quote = board.get_quote(symbol, market)
+    if quote is not None:
+        return quote
+    quote = await fetch_upstream(symbol, market)
+    # Upstream may have answered from its own cache: the quote is as old as that entry
+    board.put(symbol, market, quote, age=upstream_age(symbol, market))
+    return quote
+
+
+def last_price(quote: dict, market: Market) -> Decimal:
+    """Extract the last traded price from a raw quote of either market."""
+    if market == Market.US:
+        return Decimal(str(quote.get("c", 0) or 0))
+    return Decimal(str(quote.get("last_price", 0) or 0))
+
+
+def dedupe_symbols(symbols: Iterable[str]) -> List[str]:
+    """Strip blanks and repeats while preserving first-seen order."""
+    return list(dict.fromkeys(s.strip() for s in symbols if s and s.strip()))
+
+
+async def _gather_quotes(
+    pairs: List[Tuple[str, Market]],
+    concurrency: Optional[int],
+    timeout: Optional[float],
+    fetch=None,
+) -> Tuple[Dict[Tuple[str, Market], dict], Dict[Tuple[str, Market], str]]:
+    if fetch is None:
+        fetch = fetch_quote
+    if concurrency is None:
+        concurrency = settings.QUOTE_BATCH_CONCURRENCY
+    if timeout is None:
+        timeout = settings.QUOTE_BATCH_TIMEOUT_SECONDS
+    sem = asyncio.Semaphore(max(1, concurrency))
+    quotes: Dict[Tuple[str, Market], dict] = {}
+    errors: Dict[Tuple[str, Market], str] = {}
+
+    async def one(pair: Tuple[str, Market]):
+        async with sem:
+            try:
+                quotes[pair] = await asyncio.wait_for(fetch(*pair), timeout)
+            except asyncio.TimeoutError:
+                errors[pair] = f"timed out after {timeout}s"
+            except Exception as e:
+                errors[pair] = str(e)
+
+    await asyncio.gather(*(one(p) for p in pairs))
+    if errors:
+        logger.warning("Quote batch: %s of %s symbols failed", len(errors), len(pairs))
+    return quotes, errors
+
+
+async def fetch_quotes(
+    symbols: Iterable[str],
+    market: Market,
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Tuple[Dict[str, dict], Dict[str, str]]:
+    """Fetch quotes for many symbols of one market concurrently.
+
+    Returns (quotes, errors): quotes maps symbol -> raw quote for successes,
+    errors maps symbol -> error message for failures and timeouts.
+    """
+    pairs = [(s, market) for s in dedupe_symbols(symbols)]
+    quotes, errors = await _gather_quotes(pairs, concurrency, timeout)
+    return {s: q for (s, _), q in quotes.items()}, {s: e for (s, _), e in errors.items()}
+
+
+async def fetch_prices(
+    pairs: Iterable[Tuple[str, Market]],
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Tuple[Dict[Tuple[str, Market], Decimal], Dict[Tuple[str, Market], str]]:
+    """Price a mixed-market set of (symbol, market) pairs in one concurrent pass.
+
+    Pairs are grouped by market and de-duplicated, so a book holding the same
+    symbol in several lots costs one upstream call. All markets share the same
+    concurrency cap. Returns (prices, errors) keyed by (symbol, Market).
+    """
+    by_market: Dict[Market, List[str]] = {}
+    for symbol, market in pairs:
+        by_market.setdefault(Market(market), []).append(symbol)
+    unique = [(s, m) for m, symbols in by_market.items() for s in dedupe_symbols(symbols)]
+    quotes, errors = await _gather_quotes(unique, concurrency, timeout)
+    prices = {pair: last_price(q, pair[1]) for pair, q in quotes.items()}
+    return prices, errors
+
+
+async def fetch_upstream_many(
+    pairs: Iterable[Tuple[str, Market]],
+    concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> Tuple[Dict[Tuple[str, Market], dict], Dict[Tuple[str, Market], str]]:
+    """Fetch raw quotes for (symbol, market) pairs, bypassing the price board."""
+    return await _gather_quotes([(s, Market(m)) for s, m in pairs], concurrency, timeout, fetch=fetch_upstream)
@@ -0,0 +1,124 @@
+"""In-memory index of the shortable_stocks table.
+
+Short validation needs one row (is the symbol shortable, at what borrow
+rate) on every SHORT. The table is small and changes only when the
+shortable list is refreshed, so the whole table is kept in a dict keyed by
+symbol: loaded at startup, reloaded by ``admin.refresh_shortable`` and
+again every SHORTABLE_INDEX_RELOAD_SECONDS so other processes pick up
+refreshes they did not run. ``find``/``find_many`` serve lookups from it
+and only query the database (``crud.get_shortable``) while the index has
+never been loaded. Writers to the table ``put`` what they wrote.
+"""
+from time import monotonic
+from typing import Dict, Iterable, Optional
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import crud, models
+from ..config import settings
+from ..schemas import Market
+
+logger = logging.getLogger("shortable_index")
+
+
+class ShortableEntry:
+    __slots__ = ("symbol", "market", "borrow_rate_annual", "available")
+
+    def __init__(self, symbol: str, market: Market, borrow_rate_annual: float, available: bool = True):
+        self.symbol = symbol
+        self.market = Market(market)
+        self.borrow_rate_annual = borrow_rate_annual
+        self.available = bool(available)
+
+    @classmethod
+    def from_model(cls, row: models.ShortableStock) -> "ShortableEntry":
+        return cls(row.symbol, row.market, row.borrow_rate_annual, row.available)
+
+
+class ShortableIndex:
+    def __init__(self):
+        self.entries: Dict[str, ShortableEntry] = {}
+        self.loaded_at: Optional[float] = None
+        self.lookups = 0
+        self.reloads = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    @property
+    def stale(self) -> bool:
+        return self.loaded_at is not None and monotonic() - self.loaded_at > settings.SHORTABLE_INDEX_RELOAD_SECONDS
+
+    async def load(self, db: AsyncSession) -> int:
+        """Replace the index with the current table contents."""
+        res = await db.execute(select(models.ShortableStock))
+        self.entries = {row.symbol: ShortableEntry.from_model(row) for row in res.scalars().all()}
+        self.loaded_at = monotonic()
+        self.reloads += 1
+        return len(self.entries)
+
+    async def start(self) -> None:
+        from ..database import AsyncSessionLocal
+        try:
+            async with AsyncSessionLocal() as db:
+                loaded = await self.load(db)
+            logger.info("Shortable index loaded %s symbols", loaded)
+        except Exception as e:
+            logger.warning("Shortable index could not load, lookups will query the database: %s", e)
+
+    def put(self, entries: Iterable[ShortableEntry]) -> None:
+        """Apply rows just written to the table; no-op until the index is loaded."""
+        if self.loaded:
+            for entry in entries:
+                self.entries[entry.symbol] = entry
+
+    def get(self, symbol: str, market: Optional[Market] = None) -> Optional[ShortableEntry]:
+        self.lookups += 1
+        entry = self.entries.get(symbol)
+        if entry is None or (market is not None and entry.market != Market(market)):
+            return None
+        return entry
+
+    async def find(self, db: AsyncSession, symbol: str, market: Optional[Market] = None) -> Optional[ShortableEntry]:
+        """Point lookup, served from the index once it is loaded."""
+        if not self.loaded:
+            row = await crud.get_shortable(db, symbol, market)
+            return ShortableEntry.from_model(row) if row else None
+        if self.stale:
+            await self.load(db)
+        return self.get(symbol, market)
+
+    async def find_many(self, db: AsyncSession, symbols: Iterable[str]) -> Dict[str, ShortableEntry]:
+        if not self.loaded:
+            rows = await crud.get_shortable_many(db, symbols)
+            return {symbol: ShortableEntry.from_model(row) for symbol, row in rows.items()}
+        if self.stale:
+            await self.load(db)
+        found = {}
+        for symbol in symbols:
+            entry = self.get(symbol)
+            if entry is not None:
+                found[symbol] = entry
+        return found
+
+    def clear(self) -> None:
+        self.entries = {}
+        self.loaded_at = None
+
+    def stats(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "symbols": len(self.entries),
+            "age_seconds": round(monotonic() - self.loaded_at, 1) if self.loaded_at is not None else None,
+            "lookups": self.lookups,
+            "reloads": self.reloads,
+        }
+
+
+index = ShortableIndex()
@@ -0,0 +1,139 @@
+"""Vectorized market simulator for the demo WebSocket feeds.
+
+All symbols' state lives in NumPy arrays and ``step()`` advances the whole
+universe at once: a Gaussian random walk with mean reversion towards each
+symbol's base price, a fixed relative bid/ask spread and a random volume.
+Thousands of synthetic symbols cost one array operation per field, not a
+Python loop per symbol.
+
+Pass ``seed`` for reproducible runs (load tests, benchmarks); the same seed
+and the same sequence of calls yields the same prices.
+
+Several feeds share one simulator. They call ``step_if_stale(interval)``
+each tick, so the universe advances once per interval no matter how many
+producers read it.
+"""
+from time import monotonic
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# Mean reversion strength per step and relative bid/ask spread
+MEAN_REVERSION = 0.01
+SPREAD = 0.0001
+VOLUME_RANGE = (100_000, 5_000_000)
+
+# Producers calling step_if_stale on the same interval should not double-step
+# because their timers jitter by a few milliseconds
+_STALE_FRACTION = 0.9
+
+
+class MarketSimulator:
+    def __init__(self, tickers: Optional[Dict[str, dict]] = None, seed: Optional[int] = None, synthetic: int = 0):
+        self.rng = np.random.default_rng(seed)
+        self.symbols: List[str] = []
+        self.index: Dict[str, int] = {}
+        self._base = np.empty(0)
+        self._volatility = np.empty(0)
+        self._price = np.empty(0)
+        self._prev = np.empty(0)
+        self._volume = np.empty(0, dtype=np.int64)
+        self.steps = 0
+        self.stepped_at: Optional[float] = None
+        self.timestamp = 0.0
+        if tickers:
+            self.add_symbols(tickers)
+        if synthetic:
+            self.add_synthetic(synthetic)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.index
+
+    def add_symbols(self, tickers: Dict[str, dict]) -> None:
+        """Register symbols as {symbol: {"base": price, "volatility": sigma}}."""
+        new = [(s, c) for s, c in tickers.items() if s not in self.index]
+        if not new:
+            return
+        for symbol, _ in new:
+            self.index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        base = np.array([float(c["base"]) for _, c in new])
+        self._base = np.concatenate([self._base, base])
+        self._volatility = np.concatenate([self._volatility, [float(c["volatility"]) for _, c in new]])
+        self._price = np.concatenate([self._price, base])
+        self._prev = np.concatenate([self._prev, base])
+        self._volume = np.concatenate([self._volume, np.zeros(len(new), dtype=np.int64)])
+
+    def add_synthetic(self, count: int, prefix: str = "SIM") -> List[str]:
+        """Add ``count`` synthetic symbols (SIM00001, ...) with random base and volatility."""
+        start = sum(1 for s in self.symbols if s.startswith(prefix))
+        names = [f"{prefix}{i:05d}" for i in range(start + 1, start + count + 1)]
+        base = self.rng.uniform(5.0, 1000.0, count)
+        vol = self.rng.uniform(0.001, 0.01, count)
+        self.add_symbols({n: {"base": b, "volatility": v} for n, b, v in zip(names, base, vol)})
+        return names
+
+    def step(self, timestamp: Optional[float] = None) -> None:
+        """Advance every symbol by one tick."""
+        n = len(self.symbols)
+        if not n:
+            return
+        self._prev = self._price
+        shock = self.rng.standard_normal(n) * self._volatility
+        reversion = (self._base - self._prev) / self._prev * MEAN_REVERSION
+        self._price = self._prev * (1 + shock + reversion)
+        self._volume = self.rng.integers(VOLUME_RANGE[0], VOLUME_RANGE[1], n, endpoint=True)
+        self.steps += 1
+        self.stepped_at = monotonic()
+        self.timestamp = self.stepped_at if timestamp is None else timestamp
+
+    def step_if_stale(self, interval: float, timestamp: Optional[float] = None) -> bool:
+        """Step unless another caller already did within this interval."""
+        if self.stepped_at is not None and monotonic() - self.stepped_at < interval * _STALE_FRACTION:
+            return False
+        self.step(timestamp)
+        return True
+
+    def ticks(self, symbols: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+        """Latest tick per symbol (all symbols by default); unknown symbols are skipped."""
+        if symbols is None:
+            names = self.symbols
+            idx = np.arange(len(names))
+        else:
+            names = [s for s in symbols if s in self.index]
+            idx = np.fromiter((self.index[s] for s in names), dtype=np.intp, count=len(names))
+        if not names:
+            return {}
+        price = self._price[idx]
+        prev = self._prev[idx]
+        change = price - prev
+        half_spread = price * SPREAD / 2
+        # Round in bulk and convert to Python floats once per column
+        columns = zip(
+            np.round(price, 2).tolist(),
+            np.round(change, 2).tolist(),
+            np.round(change / prev * 100, 3).tolist(),
+            np.round(price - half_spread, 2).tolist(),
+            np.round(price + half_spread, 2).tolist(),
+            self._volume[idx].tolist(),
+        )
+        ts = self.timestamp
+        return {
+            symbol: {
+                "symbol": symbol,
+                "price": p,
+                "change": c,
+                "change_percent": cp,
+                "bid": b,
+                "ask": a,
+                "volume": v,
+                "timestamp": ts,
+            }
+            for symbol, (p, c, cp, b, a, v) in zip(names, columns)
+        }
+
+    def tick(self, symbol: str) -> Optional[dict]:
+        return self.ticks([symbol]).get(symbol)
@@ -1,5 +1,9 @@
 import functools
+from typing import Optional
+from ..config import settings
+from ..utils.cache import TTLCache
 _symbol_id_cache = {}
+_quote_cache = TTLCache(settings.QUOTE_CACHE_MAX_ENTRIES, settings.QUOTE_CACHE_TTL_SECONDS, name="stockgro_quotes")
 
 async def list_symbols() -> list:
     """Return tradable symbols for IN market."""
@@ -13,7 +17,21 @@ async def list_symbols() -> list:
     return symbols
 
 async def get_realtime_quote(symbol: str) -> dict:
-    """Get last traded price for a symbol (IN market)."""
+    """Get last traded price for a symbol (IN market). Cached for QUOTE_CACHE_TTL_SECONDS."""
+    return await _quote_cache.get_or_fetch(f"quote:{symbol}", lambda: _fetch_realtime_quote(symbol))
+
+
+def quote_age(symbol: str) -> Optional[float]:
+    """Seconds since the cached quote for ``symbol`` was fetched; None if not cached."""
+    return _quote_cache.age(f"quote:{symbol}")
+
+
+def get_metrics() -> dict:
+    """Return quote cache counters."""
+    return _quote_cache.stats()
+
+
+async def _fetch_realtime_quote(symbol: str) -> dict:
     # Lookup id if needed
     stock_id = _symbol_id_cache.get(symbol)
     if not stock_id:
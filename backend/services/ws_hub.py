@@ -0,0 +1,432 @@
+"""Pub/sub fan-out for WebSocket feeds.
+
+A ``Broadcaster`` runs one producer task per feed. Each tick is computed and
+JSON-encoded once, then handed to every subscriber's bounded send queue; a
+per-socket sender drains the queue. The producer starts with the first
+subscriber and stops when the last one leaves.
+
+``SymbolBroadcaster`` multiplexes many symbols over one socket: clients
+subscribe to symbol sets, the hub keeps a symbol -> subscribers index, and
+each tick only the symbols that changed are encoded (once per symbol) and
+pushed to the sockets subscribed to them.
+
+Compact mode (``SymbolBroadcaster`` only) sends a snapshot of every
+subscribed symbol on subscribe and afterwards only the fields that changed
+per symbol. Compact subscribers are conflated rather than queued: if a client
+falls behind, pending deltas are merged so the latest value of each field
+wins and nothing is dropped. Frames may be JSON text or msgpack binary
+(``encoding="msgpack"``, needs the optional ``msgpack`` package). Control
+frames (acks, errors) are always JSON text. permessage-deflate is negotiated
+by the ASGI server (uvicorn enables it by default) and needs nothing here.
+
+Slow consumers never block the producer. When a full-mode subscriber's queue is full:
+- ``drop_oldest``: discard the oldest queued frame (latest data wins) and
+  disconnect the client after WS_SLOW_CONSUMER_MAX_DROPS consecutive drops
+- ``disconnect``: close the socket straight away
+"""
+import asyncio
+import contextvars
+import json
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+import logging
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from ..config import settings
+
+try:
+    import msgpack
+except ImportError:  # optional binary encoding
+    msgpack = None
+
+logger = logging.getLogger("ws_hub")
+
+# Close code for clients that cannot keep up (RFC 6455 "try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+Frame = Union[str, bytes]
+
+
+def supported_encodings() -> List[str]:
+    return ["json", "msgpack"] if msgpack is not None else ["json"]
+
+
+def encode(payload: Any, encoding: str = "json") -> Frame:
+    """Encode a payload as compact JSON text or msgpack bytes."""
+    if encoding == "msgpack" and msgpack is not None:
+        return msgpack.packb(payload, use_bin_type=True)
+    return json.dumps(payload, separators=(",", ":"))
+
+
+class Subscriber:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        queue_size: int,
+        policy: str,
+        max_drops: int,
+        compact: bool = False,
+        encoding: str = "json",
+    ):
+        self.websocket = websocket
+        self.queue: Deque[Optional[Frame]] = deque()
+        self.queue_size = max(1, queue_size)
+        self.policy = policy
+        self.max_drops = max_drops
+        self.compact = compact
+        self.encoding = encoding if encoding in supported_encodings() else "json"
+        self.dropped = 0
+        self.consecutive_drops = 0
+        self.conflated = 0
+        self.closed = False
+        self.symbols: Set[str] = set()
+        self.state: Dict[str, Any] = {}
+        # Compact mode: conflated per-symbol field deltas not yet sent, and the
+        # shared pre-encoded frame for them while they equal a single tick's delta
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.pending_frame: Optional[Frame] = None
+        self._wakeup = asyncio.Event()
+
+    def offer(self, message: Frame) -> None:
+        """Queue a pre-encoded frame without blocking the producer."""
+        if self.closed:
+            return
+        if len(self.queue) >= self.queue_size:
+            self.dropped += 1
+            self.consecutive_drops += 1
+            if self.policy == "disconnect" or self.consecutive_drops > self.max_drops:
+                self.close()
+                return
+            self.queue.popleft()
+        else:
+            self.consecutive_drops = 0
+        self.queue.append(message)
+        self._wakeup.set()
+
+    def offer_delta(self, delta: Dict[str, Dict[str, Any]], frame: Frame) -> None:
+        """Hand over one tick's field deltas; merge into pending if the client is behind.
+
+        ``delta`` and ``frame`` may be shared with other subscribers and are
+        never mutated.
+        """
+        if self.closed:
+            return
+        if not self.pending:
+            self.pending = delta
+            self.pending_frame = frame
+        else:
+            if self.pending_frame is not None:
+                # Still the shared dict from an earlier tick: copy before merging
+                self.pending = {s: dict(f) for s, f in self.pending.items()}
+                self.pending_frame = None
+            for symbol, fields in delta.items():
+                current = self.pending.get(symbol)
+                if current is None:
+                    self.pending[symbol] = dict(fields)
+                else:
+                    current.update(fields)
+            self.conflated += 1
+        self._wakeup.set()
+
+    def offer_snapshot(self, message: Frame, symbols: Iterable[str]) -> None:
+        """Queue a snapshot of ``symbols``, dropping their pending deltas.
+
+        Queued frames are sent before pending deltas, so a delta left pending
+        would reach the client after the newer snapshot and roll it back.
+        """
+        self.forget(symbols)
+        self.offer(message)
+
+    def forget(self, symbols: Iterable[str]) -> None:
+        """Drop the pending deltas and per-symbol state of ``symbols``."""
+        stale = set()
+        for symbol in symbols:
+            self.state.pop(symbol, None)
+            if symbol in self.pending:
+                stale.add(symbol)
+        if stale:
+            # Copy even when unshared: offer_delta merges into these dicts in place
+            self.pending = {s: dict(f) for s, f in self.pending.items() if s not in stale}
+            self.pending_frame = None
+
+    def close(self) -> None:
+        """Stop the sender; the serving coroutine closes the socket."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.queue.append(None)
+        self.pending = {}
+        self.pending_frame = None
+        self._wakeup.set()
+
+    async def _send(self, frame: Frame) -> None:
+        if isinstance(frame, bytes):
+            await self.websocket.send_bytes(frame)
+        else:
+            await self.websocket.send_text(frame)
+
+    async def run_sender(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self.queue:
+                message = self.queue.popleft()
+                if message is None:
+                    return
+                await self._send(message)
+            if self.pending:
+                frame = self.pending_frame
+                if frame is None:
+                    frame = encode({"type": "delta", "data": self.pending}, self.encoding)
+                self.pending = {}
+                self.pending_frame = None
+                await self._send(frame)
+
+
+class Broadcaster:
+    def __init__(self, name: str, produce: Callable[[], Optional[Dict[str, Any]]], interval: float):
+        self.name = name
+        self.produce = produce
+        self.interval = interval
+        self.subscribers: Set[Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.ticks = 0
+        self.slow_disconnects = 0
+
+    def _ensure_producer(self) -> None:
+        if self._task is None or self._task.done():
+            # Fresh context: the feed outlives the connection that started it
+            self._task = asyncio.create_task(self._run(), name=f"ws-feed-{self.name}", context=contextvars.Context())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self.subscribers:
+            started = loop.time()
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error("Feed %s producer error: %s", self.name, e)
+            self.ticks += 1
+            await asyncio.sleep(max(0.0, self.interval - (loop.time() - started)))
+
+    def tick(self) -> None:
+        payload = self.produce()
+        if payload is not None:
+            self.publish(json.dumps(payload))
+
+    def publish(self, message: Frame) -> None:
+        """Fan one encoded frame out to every subscriber."""
+        for sub in list(self.subscribers):
+            self._deliver(sub, message)
+
+    def _deliver(self, sub: Subscriber, message: Frame) -> None:
+        sub.offer(message)
+        if sub.closed:
+            self.slow_disconnects += 1
+            self.unsubscribe(sub)
+
+    def subscribe(self, websocket: WebSocket, compact: bool = False, encoding: str = "json") -> Subscriber:
+        sub = Subscriber(
+            websocket,
+            settings.WS_SEND_QUEUE_SIZE,
+            settings.WS_SLOW_CONSUMER_POLICY,
+            settings.WS_SLOW_CONSUMER_MAX_DROPS,
+            compact=compact,
+            encoding=encoding,
+        )
+        self.subscribers.add(sub)
+        self._ensure_producer()
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self.subscribers.discard(sub)
+        sub.close()
+
+    async def serve(
+        self,
+        websocket: WebSocket,
+        on_message: Optional[Callable[[Subscriber, str], Awaitable[None]]] = None,
+        on_subscribe: Optional[Callable[[Subscriber], None]] = None,
+        compact: bool = False,
+        encoding: str = "json",
+    ) -> None:
+        """Stream this feed to an accepted socket until either side goes away.
+
+        Incoming text frames are passed to ``on_message``; without a handler
+        they are ignored but still read so disconnects are noticed promptly.
+        """
+        sub = self.subscribe(websocket, compact=compact, encoding=encoding)
+        if on_subscribe is not None:
+            on_subscribe(sub)
+        sender = asyncio.create_task(sub.run_sender())
+        receiver = asyncio.create_task(self._receive(sub, on_message))
+        for task in (sender, receiver):
+            task.add_done_callback(self._log_task_error)
+        try:
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if sub.closed and not receiver.done():
+                # Dropped as a slow consumer
+                try:
+                    await websocket.close(code=SLOW_CONSUMER_CLOSE_CODE)
+                except Exception:
+                    pass
+        finally:
+            # Cancel without awaiting so the handler returns promptly on disconnect
+            self.unsubscribe(sub)
+            sender.cancel()
+            receiver.cancel()
+
+    def _log_task_error(self, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None and not isinstance(exc, WebSocketDisconnect):
+            logger.warning("Feed %s socket error: %s", self.name, exc)
+
+    @staticmethod
+    async def _receive(sub: Subscriber, on_message) -> None:
+        while True:
+            message = await sub.websocket.receive_text()
+            if on_message is not None:
+                await on_message(sub, message)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "running": self._task is not None and not self._task.done(),
+            "ticks": self.ticks,
+            "slow_disconnects": self.slow_disconnects,
+            "dropped_frames": sum(s.dropped for s in self.subscribers),
+            "conflated_frames": sum(s.conflated for s in self.subscribers),
+        }
+
+
+class SymbolBroadcaster(Broadcaster):
+    """Multiplexed per-symbol feed.
+
+    ``produce(symbols)`` returns {symbol: tick dict} for the currently
+    subscribed symbols. A symbol is pushed only when its tick differs from the
+    last one sent (ignoring ``timestamp``). ``on_symbol_added``/``on_symbol_removed``
+    fire when a symbol gains its first or loses its last subscriber.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        produce: Callable[[List[str]], Dict[str, Dict[str, Any]]],
+        interval: float,
+        frame_type: str = "tickers",
+        on_symbol_added: Optional[Callable[[str], None]] = None,
+        on_symbol_removed: Optional[Callable[[str], None]] = None,
+    ):
+        super().__init__(name, produce, interval)
+        self.frame_type = frame_type
+        self.on_symbol_added = on_symbol_added
+        self.on_symbol_removed = on_symbol_removed
+        self.index: Dict[str, Set[Subscriber]] = {}
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._encoded: Dict[str, str] = {}
+
+    def add_symbols(self, sub: Subscriber, symbols: Iterable[str]) -> List[str]:
+        """Subscribe ``sub`` to symbols; returns the ones that were newly added."""
+        added = []
+        for symbol in symbols:
+            if symbol in sub.symbols:
+                continue
+            if len(sub.symbols) >= settings.WS_MAX_SYMBOLS_PER_CONNECTION:
+                break
+            sub.symbols.add(symbol)
+            subs = self.index.get(symbol)
+            if subs is None:
+                subs = self.index[symbol] = set()
+                if self.on_symbol_added is not None:
+                    self.on_symbol_added(symbol)
+            subs.add(sub)
+            added.append(symbol)
+        return added
+
+    def remove_symbols(self, sub: Subscriber, symbols: Iterable[str]) -> List[str]:
+        removed = []
+        for symbol in list(symbols):
+            if symbol not in sub.symbols:
+                continue
+            sub.symbols.discard(symbol)
+            subs = self.index.get(symbol)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self.index[symbol]
+                    self._last.pop(symbol, None)
+                    self._encoded.pop(symbol, None)
+                    if self.on_symbol_removed is not None:
+                        self.on_symbol_removed(symbol)
+            removed.append(symbol)
+        # Nothing about a symbol may reach the client after it unsubscribed
+        sub.forget(removed)
+        return removed
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self.remove_symbols(sub, sub.symbols)
+        super().unsubscribe(sub)
+
+    def _frame(self, fragments: List[str]) -> str:
+        return '{"type":%s,"data":[%s]}' % (json.dumps(self.frame_type), ",".join(fragments))
+
+    def snapshot(self, symbols: Iterable[str], compact: bool = False, encoding: str = "json") -> Optional[Frame]:
+        """Frame with the last known tick of each symbol, if any.
+
+        Full mode repeats the regular frame format; compact mode sends
+        ``{"type": "snapshot", "data": {symbol: fields}}``.
+        """
+        known = [s for s in symbols if s in self._encoded]
+        if not known:
+            return None
+        if compact:
+            return encode({"type": "snapshot", "data": {s: self._last[s] for s in known}}, encoding)
+        if encoding == "msgpack" and msgpack is not None:
+            return encode({"type": self.frame_type, "data": [json.loads(self._encoded[s]) for s in known]}, encoding)
+        return self._frame([self._encoded[s] for s in known])
+
+    def tick(self) -> None:
+        if not self.index:
+            return
+        ticks = self.produce(list(self.index))
+        deltas: Dict[str, Dict[str, Any]] = {}
+        per_sub: Dict[Subscriber, List[str]] = {}
+        for symbol, data in ticks.items():
+            subs = self.index.get(symbol)
+            if not subs:
+                continue
+            comparable = {k: v for k, v in data.items() if k != "timestamp"}
+            last = self._last.get(symbol)
+            if last == comparable:
+                continue
+            deltas[symbol] = comparable if last is None else {k: v for k, v in comparable.items() if last.get(k) != v}
+            self._last[symbol] = comparable
+            self._encoded[symbol] = json.dumps(data)
+            for sub in subs:
+                per_sub.setdefault(sub, []).append(symbol)
+
+        # Subscribers with the same mode, encoding and changed symbols share one frame
+        shared: Dict[Tuple[bool, str, Tuple[str, ...]], Any] = {}
+        for sub, symbols in per_sub.items():
+            key = (sub.compact, sub.encoding, tuple(symbols))
+            frame = shared.get(key)
+            if sub.compact:
+                if frame is None:
+                    delta = {s: deltas[s] for s in symbols}
+                    frame = shared[key] = (delta, encode({"type": "delta", "data": delta}, sub.encoding))
+                sub.offer_delta(*frame)
+            else:
+                if frame is None:
+                    if sub.encoding == "msgpack":
+                        frame = encode({"type": self.frame_type, "data": [ticks[s] for s in symbols]}, sub.encoding)
+                    else:
+                        frame = self._frame([self._encoded[s] for s in symbols])
+                    shared[key] = frame
+                self._deliver(sub, frame)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "symbols": len(self.index)}
@@ -0,0 +1,121 @@
+"""Bounded in-memory TTL cache with LRU eviction and single-flight fetches.
+
+Used by the market data services (Finnhub, StockGro) to cache quotes.
+
+Notes:
+- All reads and writes are synchronous dict operations on the event loop
+  thread, so they need no lock; only the upstream fetch is awaited.
+- Concurrent misses for the same key share one fetch task. Errors are
+  propagated to every waiter and never cached.
+- Size is capped at ``maxsize``; the least recently used entry is evicted
+  first, so memory stays flat regardless of how many keys are requested.
+"""
+import asyncio
+from collections import OrderedDict
+from time import monotonic
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        # key -> (expires_at, value, stored_at)
+        self._data: "OrderedDict[Hashable, Tuple[float, Any, float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.errors = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not None
+
+    def _lookup(self, key: Hashable) -> Optional[Tuple[float, Any, float]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a fresh cached value, or ``default`` on miss/expiry."""
+        entry = self._lookup(key)
+        if entry is None:
+            return default
+        return entry[1]
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since the fresh value for ``key`` was stored; None on miss/expiry."""
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= monotonic():
+            return None
+        return monotonic() - entry[2]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        now = monotonic()
+        self._data[key] = (now + (self.ttl if ttl is None else ttl), value, now)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    async def get_or_fetch(self, key: Hashable, fetcher: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """Return the cached value for ``key`` or fetch it once for all concurrent callers."""
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._fetch_and_store(key, fetcher, ttl))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._fetch_done(key, t))
+        else:
+            self.coalesced += 1
+        # shield so a cancelled caller does not cancel the fetch for other waiters
+        return await asyncio.shield(task)
+
+    async def _fetch_and_store(self, key: Hashable, fetcher, ttl: Optional[float]):
+        val = await fetcher()
+        self.set(key, val, ttl)
+        return val
+
+    def _fetch_done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "errors": self.errors,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,24 @@
+"""Opaque cursors for keyset pagination.
+
+A cursor is the last row's id, JSON-encoded and base64url'd so clients treat
+it as a token and never build one themselves.
+"""
+import base64
+import json
+
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Return the row id a cursor points after; raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_id = json.loads(raw)["id"]
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(last_id, int):
+        raise ValueError("invalid cursor")
+    return last_id
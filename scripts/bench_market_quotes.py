@@ -0,0 +1,95 @@
+"""Benchmark /market/quotes latency versus watchlist size.
+
+Starts a local stub Finnhub server that answers /quote after a fixed delay,
+points the Finnhub client at it and compares a serial per-symbol loop (the
+old endpoint behaviour) with the concurrent batch endpoint.
+
+Usage (from the repo root):
+    python scripts/bench_market_quotes.py --latency-ms 50 --sizes 1,10,50,100
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import uvicorn
+from fastapi import FastAPI
+
+from backend.config import settings
+from backend.routes import market
+from backend.schemas import Market
+from backend.services import finnhub
+
+
+def build_stub(latency: float) -> FastAPI:
+    stub = FastAPI()
+
+    @stub.get("/api/v1/quote")
+    async def quote(symbol: str):
+        await asyncio.sleep(latency)
+        return {"c": 100.0, "d": 0.5, "dp": 0.5, "h": 101.0, "l": 99.0, "o": 99.5, "pc": 99.5, "t": int(time.time())}
+
+    return stub
+
+
+def start_stub(latency: float, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(build_stub(latency), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def serial(symbols):
+    for s in symbols:
+        await finnhub.get_quote(s)
+
+
+async def batch(symbols):
+    await market.get_multiple_quotes(symbols=",".join(symbols), market=Market.US)
+
+
+async def run(sizes, repeats):
+    print(f"{'symbols':>8} {'serial ms':>10} {'batch ms':>10} {'speedup':>8}")
+    for n in sizes:
+        symbols = [f"SYM{i}" for i in range(n)]
+        timings = {}
+        for name, fn in (("serial", serial), ("batch", batch)):
+            best = float("inf")
+            for _ in range(repeats):
+                finnhub._quote_cache.clear()
+                t0 = time.perf_counter()
+                await fn(symbols)
+                best = min(best, time.perf_counter() - t0)
+            timings[name] = best * 1000
+        print(f"{n:>8} {timings['serial']:>10.1f} {timings['batch']:>10.1f} {timings['serial'] / timings['batch']:>7.1f}x")
+    await finnhub.close_client()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--sizes", default="1,10,50,100")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    server = start_stub(args.latency_ms / 1000, args.port)
+    settings.FINNHUB_BASE_URL = f"http://127.0.0.1:{args.port}/api/v1"
+    settings.HTTP2_ENABLED = False
+    print(f"stub latency {args.latency_ms:.0f} ms, concurrency cap {settings.QUOTE_BATCH_CONCURRENCY}")
+    try:
+        asyncio.run(run([int(s) for s in args.sizes.split(",")], args.repeats))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark order engine evaluation time per price tick.
+
+Rests N random limit/stop/stop-limit orders across S symbols in the
+in-memory index (no database) and replays random-walk price ticks through
+``OrderEngine.on_prices``, the price board listener. Crossing orders are
+queued for the fill worker, which is not run here.
+
+Usage (from the repo root):
+    python scripts/bench_order_engine.py --orders 50000 --symbols 200 --ticks 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend import models
+from backend.models import OrderSide, OrderType
+from backend.schemas import Market
+from backend.services.order_engine import OrderEngine
+
+
+def build(engine: OrderEngine, orders: int, symbols: list, prices: dict, rng: random.Random) -> None:
+    for i in range(orders):
+        symbol = rng.choice(symbols)
+        mid = prices[symbol]
+        side = rng.choice((OrderSide.BUY, OrderSide.SELL))
+        order_type = rng.choice((OrderType.LIMIT, OrderType.STOP, OrderType.STOP_LIMIT))
+        # Rest 1-10% away from the mid on the side that does not cross yet
+        away = mid * rng.uniform(0.01, 0.10)
+        passive = mid - away if side == OrderSide.BUY else mid + away
+        stop = mid + away if side == OrderSide.BUY else mid - away
+        engine.add(models.Order(
+            id=i + 1, symbol=symbol, market=Market.US, side=side, order_type=order_type, quantity=1,
+            limit_price=passive if order_type == OrderType.LIMIT else (stop if order_type == OrderType.STOP_LIMIT else None),
+            stop_price=stop if order_type != OrderType.LIMIT else None,
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--volatility", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    symbols = [f"SYM{i}" for i in range(args.symbols)]
+    prices = {s: rng.uniform(10, 500) for s in symbols}
+    engine = OrderEngine()
+    t0 = time.perf_counter()
+    build(engine, args.orders, symbols, prices, rng)
+    print(f"indexed {len(engine)} orders on {len(engine.books)} symbols in {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+    per_tick = []
+    per_symbol = []
+    for _ in range(args.ticks):
+        for s in symbols:
+            prices[s] *= 1 + rng.gauss(0, args.volatility)
+        # One board refresh delivers every symbol at once
+        updates = {(s, Market.US): {"c": prices[s]} for s in symbols}
+        t0 = time.perf_counter()
+        engine.on_prices(updates)
+        elapsed = time.perf_counter() - t0
+        per_tick.append(elapsed * 1e6)
+        per_symbol.append(elapsed * 1e6 / len(symbols))
+
+    print(f"resting after {args.ticks} ticks: {len(engine)} (queued for fill/trigger: {engine._queue.qsize()})")
+    print(f"per refresh ({len(symbols)} symbols): median {statistics.median(per_tick):.0f} us, max {max(per_tick):.0f} us")
+    print(f"per symbol tick: median {statistics.median(per_symbol):.2f} us")
+
+
+if __name__ == "__main__":
+    main()
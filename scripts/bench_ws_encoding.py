@@ -0,0 +1,134 @@
+"""Benchmark ticker WebSocket frame formats: bytes/sec and server CPU per connection.
+
+Drives the real hub (``ws_hub``) and demo producers from ``routes.websocket``
+with N in-process subscribers and no sockets. After every tick each
+subscriber is drained the way its sender would drain it, and the bytes that
+would hit the wire are counted. ``+deflate`` variants push every frame
+through a per-connection raw-deflate stream with context takeover, which is
+what permessage-deflate does on the server.
+
+Formats:
+- full:            current /ws/tickers frame, every field of every symbol
+- compact-json:    snapshot on connect, then per-field deltas (JSON text)
+- compact-msgpack: same as compact-json, msgpack binary
+
+Usage (from the repo root):
+    python scripts/bench_ws_encoding.py --clients 100 --ticks 300
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.config import settings
+from backend.routes import websocket as ws_routes
+from backend.services import ws_hub
+from backend.services.simulator import MarketSimulator
+from backend.services.ws_hub import Broadcaster, Subscriber, SymbolBroadcaster
+
+
+def _frame_bytes(frame) -> bytes:
+    return frame if isinstance(frame, bytes) else frame.encode()
+
+
+class Sink:
+    """Stands in for one client's socket: drains a subscriber and counts bytes."""
+
+    def __init__(self, sub: Subscriber, deflate: bool):
+        self.sub = sub
+        self.deflater = zlib.compressobj(wbits=-15) if deflate else None
+        self.bytes = 0
+        self.frames = 0
+
+    def write(self, frame) -> None:
+        data = _frame_bytes(frame)
+        if self.deflater is not None:
+            data = self.deflater.compress(data) + self.deflater.flush(zlib.Z_SYNC_FLUSH)
+        self.bytes += len(data)
+        self.frames += 1
+
+    def drain(self) -> None:
+        sub = self.sub
+        while sub.queue:
+            self.write(sub.queue.popleft())
+        if sub.pending:
+            frame = sub.pending_frame
+            if frame is None:
+                frame = ws_hub.encode({"type": "delta", "data": sub.pending}, sub.encoding)
+            sub.pending = {}
+            sub.pending_frame = None
+            self.write(frame)
+
+
+def run_format(name: str, clients: int, ticks: int, deflate: bool, seed: int):
+    ws_routes.simulator = MarketSimulator(ws_routes.DEMO_TICKERS, seed=seed)
+    symbols = list(ws_routes.DEMO_TICKERS)
+
+    if name == "full":
+        feed = Broadcaster("bench", ws_routes._produce_tickers, 1.0)
+        subs = [Subscriber(None, ticks + 1, "drop_oldest", ticks) for _ in range(clients)]
+        feed.subscribers.update(subs)
+        sinks = [Sink(s, deflate) for s in subs]
+    else:
+        encoding = "msgpack" if name == "compact-msgpack" else "json"
+        feed = SymbolBroadcaster("bench", ws_routes._produce_symbols, 1.0)
+        subs = [Subscriber(None, ticks + 1, "drop_oldest", ticks, compact=True, encoding=encoding) for _ in range(clients)]
+        sinks = [Sink(s, deflate) for s in subs]
+        # Warm the feed so new connections get a snapshot, as on a live server
+        warm = Subscriber(None, 1, "drop_oldest", 0)
+        feed.add_symbols(warm, symbols)
+        feed.tick()
+        for sub, sink in zip(subs, sinks):
+            feed.subscribers.add(sub)
+            feed.add_symbols(sub, symbols)
+            sink.write(feed.snapshot(symbols, compact=True, encoding=encoding))
+        feed.remove_symbols(warm, symbols)
+
+    cpu0 = time.process_time()
+    for _ in range(ticks):
+        feed.tick()
+        for sink in sinks:
+            sink.drain()
+    cpu = time.process_time() - cpu0
+
+    total = sum(s.bytes for s in sinks)
+    return {
+        "bytes_per_sec": total / clients / ticks,
+        "cpu_us": cpu / clients / ticks * 1e6,
+    }
+
+
+async def main_async(args):
+    formats = ["full", "compact-json"]
+    if ws_hub.msgpack is not None:
+        formats.append("compact-msgpack")
+    else:
+        print("msgpack not installed; skipping compact-msgpack")
+    print(f"{args.clients} clients, {args.ticks} ticks at 1 tick/s, {len(ws_routes.DEMO_TICKERS)} symbols")
+    print(f"{'format':<24} {'bytes/s/conn':>13} {'vs full':>8} {'cpu us/tick/conn':>17}")
+    baseline = None
+    for deflate in (False, True):
+        for name in formats:
+            label = name + ("+deflate" if deflate else "")
+            r = run_format(name, args.clients, args.ticks, deflate, args.seed)
+            if baseline is None:
+                baseline = r["bytes_per_sec"]
+            print(f"{label:<24} {r['bytes_per_sec']:>13.0f} {r['bytes_per_sec'] / baseline:>7.0%} {r['cpu_us']:>17.1f}")
+
+
+def main():
+    # Every bench tick is a new market tick
+    settings.WS_TICKER_INTERVAL_SECONDS = 0.0
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
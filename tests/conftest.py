@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from backend import database
+from backend.models import Base
+from backend.security import identity
+from backend.services.shortable_index import index as shortable_index
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    """Fresh SQLite database per test, wired in as database.AsyncSessionLocal."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}", poolclass=NullPool)
+
+    async def create():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create())
+    factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    monkeypatch.setattr(database, "AsyncSessionLocal", factory)
+    # In-memory caches belong to the previous test's database
+    identity.clear()
+    shortable_index.clear()
+    yield factory
+    asyncio.run(engine.dispose())
@@ -0,0 +1,74 @@
+import asyncio
+import time
+import pytest
+from backend.config import settings
+from backend.services import alpaca
+
+
+def test_get_portfolio_async_caches_and_does_not_block(monkeypatch):
+    calls = 0
+
+    def slow_positions():
+        nonlocal calls
+        calls += 1
+        time.sleep(0.05)
+        return ["pos"]
+
+    monkeypatch.setattr(alpaca, "get_portfolio", slow_positions)
+    alpaca._positions_cache.clear()
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            for _ in range(5):
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        first, _ = await asyncio.gather(alpaca.get_portfolio_async(), ticker())
+        second = await alpaca.get_portfolio_async()
+        return first, second, ticks
+
+    first, second, ticks = asyncio.run(run())
+    assert first == second == ["pos"]
+    assert calls == 1
+    # the event loop kept running while the SDK call slept in the pool
+    assert ticks == 5
+
+
+def test_get_portfolio_async_times_out(monkeypatch):
+    monkeypatch.setattr(alpaca, "get_portfolio", lambda: time.sleep(0.2))
+    monkeypatch.setattr(settings, "ALPACA_TIMEOUT_SECONDS", 0.01)
+    alpaca._positions_cache.clear()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(alpaca.get_portfolio_async())
+
+
+def test_pool_is_recreated_after_shutdown(monkeypatch):
+    monkeypatch.setattr(alpaca, "get_portfolio", lambda: ["pos"])
+    # Two app lifespans in one process, e.g. successive TestClient contexts
+    for _ in range(2):
+        pool = alpaca.start()
+        assert alpaca.start() is pool
+        alpaca._positions_cache.clear()
+        assert asyncio.run(alpaca.get_portfolio_async()) == ["pos"]
+        alpaca.shutdown()
+        assert alpaca._executor is None
+
+
+def test_slow_order_is_placed_once_and_drops_cached_positions(monkeypatch):
+    placed = []
+
+    def slow_order(symbol, qty, side):
+        time.sleep(0.05)
+        placed.append((symbol, qty, side))
+        return "order"
+
+    monkeypatch.setattr(alpaca, "place_order", slow_order)
+    monkeypatch.setattr(settings, "ALPACA_TIMEOUT_SECONDS", 0.01)
+    alpaca._positions_cache.set("positions", ["stale"])
+    # Slower than the read timeout, but submission waits for Alpaca's answer
+    assert asyncio.run(alpaca.place_order_async("AAPL", 1, "buy")) == "order"
+    assert placed == [("AAPL", 1, "buy")]
+    assert alpaca._positions_cache.get("positions") is None
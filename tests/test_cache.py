@@ -0,0 +1,97 @@
+import asyncio
+import httpx
+from backend.config import settings
+from backend.services import finnhub
+from backend.utils.cache import TTLCache
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache = TTLCache(maxsize=10, ttl=5)
+    calls = 0
+
+    async def fetcher():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"c": 1.0}
+
+    async def run():
+        return await asyncio.gather(*[cache.get_or_fetch("quote:AAPL", fetcher) for _ in range(50)])
+
+    results = asyncio.run(run())
+    assert calls == 1
+    assert all(r == {"c": 1.0} for r in results)
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] == 49
+    assert stats["inflight"] == 0
+
+
+def test_fetch_error_propagates_to_all_waiters():
+    cache = TTLCache(maxsize=10, ttl=5)
+
+    async def fetcher():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        return await asyncio.gather(*[cache.get_or_fetch("quote:MSFT", fetcher) for _ in range(5)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert "quote:MSFT" not in cache
+    assert cache.stats()["errors"] == 1
+
+
+def test_finnhub_quote_cache_is_bounded():
+    assert isinstance(finnhub._quote_cache, TTLCache)
+    assert finnhub.get_metrics()["maxsize"] > 0
+
+
+def test_finnhub_client_is_shared_for_the_lifespan(session_factory, monkeypatch):
+    from backend.main import app, lifespan
+
+    built = []
+    requests = []
+
+    def build():
+        def handler(request):
+            requests.append(request.url.path)
+            return httpx.Response(200, json={"c": 1.0})
+        built.append(httpx.AsyncClient(base_url=settings.FINNHUB_BASE_URL, transport=httpx.MockTransport(handler)))
+        return built[-1]
+
+    monkeypatch.setattr(finnhub, "_build_client", build)
+    monkeypatch.setattr(settings, "PRICE_BOARD_ENABLED", False)
+    monkeypatch.setattr(settings, "EQUITY_SNAPSHOT_ENABLED", False)
+
+    async def run():
+        async with lifespan(app):
+            await finnhub.get_candles("AAPL", "D", 0, 1)
+            await finnhub.get_candles("MSFT", "D", 0, 1)
+            assert finnhub.get_client() is built[0]
+
+    asyncio.run(run())
+    # Both requests went through the one client the lifespan opened, then closed
+    assert len(built) == 1 and len(requests) == 2
+    assert built[0].is_closed and finnhub._client is None
+
+
+def test_lru_eviction_keeps_size_bounded():
+    cache = TTLCache(maxsize=3, ttl=60)
+    for i in range(10):
+        cache.set(i, i)
+    assert len(cache) == 3
+    assert cache.evictions == 7
+    # touching a key protects it from the next eviction
+    cache.get(7)
+    cache.set(10, 10)
+    assert 7 in cache
+    assert 8 not in cache
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(maxsize=3, ttl=0)
+    cache.set("k", 1)
+    assert cache.get("k") is None
+    assert cache.expirations == 1
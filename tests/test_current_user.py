@@ -0,0 +1,62 @@
+import asyncio
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from backend import models
+from backend.models import TransactionType
+from backend.schemas import Market
+from backend.security import identity
+from backend.security.auth import DEMO_EMAIL, get_current_user
+from backend.services.execution import execute_trade
+
+
+def _count_selects(factory):
+    counter = {"users": 0}
+
+    def before(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM users" in statement:
+            counter["users"] += 1
+
+    event.listen(factory.kw["bind"].sync_engine, "before_cursor_execute", before)
+    return counter
+
+
+def test_demo_user_is_created_once_then_served_from_cache(session_factory):
+    counter = _count_selects(session_factory)
+
+    async def run():
+        async with session_factory() as db:
+            first = await get_current_user(db)
+            assert first.email == DEMO_EMAIL
+            assert first.tier == models.TierEnum.INTERMEDIATE
+        selects = counter["users"]
+        for _ in range(3):
+            async with session_factory() as db:
+                user = await get_current_user(db)
+                assert user.id == first.id
+                assert Decimal(user.cash_balance) == Decimal("100000")
+                assert user in db
+        assert counter["users"] == selects
+
+    asyncio.run(run())
+
+
+def test_balance_and_tier_changes_invalidate_on_commit(session_factory):
+    async def run():
+        async with session_factory() as db:
+            user = await get_current_user(db)
+            await execute_trade(db, user, "AAPL", Market.US, TransactionType.BUY, Decimal("10"), Decimal("100"))
+        async with session_factory() as db:
+            user = await get_current_user(db)
+            assert Decimal(user.cash_balance) == Decimal("99000")
+            user.tier = models.TierEnum.ADVANCED
+            await db.flush()
+            # Not committed yet: other requests keep the committed row
+            assert DEMO_EMAIL in identity.cache
+            await db.commit()
+            assert DEMO_EMAIL not in identity.cache
+        async with session_factory() as db:
+            assert (await get_current_user(db)).tier == models.TierEnum.ADVANCED
+
+    asyncio.run(run())
@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from backend import models
+from backend.database import get_db
+from backend.main import app
+from backend.schemas import Market
+from backend.security.auth import DEMO_EMAIL
+from backend.services import equity_snapshots, quotes
+
+
+def _fake_prices(prices, calls):
+    async def fetch_prices(pairs, concurrency=None, timeout=None):
+        pairs = list(pairs)
+        calls.append(pairs)
+        return {p: prices[p] for p in pairs if p in prices}, {p: "unavailable" for p in pairs if p not in prices}
+    return fetch_prices
+
+
+async def _seed(db):
+    users = [models.User(email=f"u{i}@example.com", password_hash="x", cash_balance=Decimal("1000")) for i in range(5)]
+    db.add_all(users)
+    await db.flush()
+    for u in users:
+        db.add(models.Position(user_id=u.id, symbol="AAPL", market=Market.US, shares=Decimal("2"), avg_price=Decimal("100")))
+    db.add(models.Position(user_id=users[0].id, symbol="TSLA", market=Market.US, shares=Decimal("-1"), avg_price=Decimal("200")))
+    db.add(models.Position(user_id=users[1].id, symbol="INFY", market=Market.IN, shares=Decimal("4"), avg_price=Decimal("10")))
+    db.add(models.Position(user_id=users[2].id, symbol="MSFT", market=Market.US, shares=Decimal("0"), avg_price=Decimal("50")))
+    await db.commit()
+    return [u.id for u in users]
+
+
+def test_cycle_values_every_user_in_batches(session_factory, monkeypatch):
+    calls = []
+    prices = {("AAPL", Market.US): Decimal("150"), ("TSLA", Market.US): Decimal("250")}
+    monkeypatch.setattr(quotes, "fetch_prices", _fake_prices(prices, calls))
+
+    async def run():
+        async with session_factory() as db:
+            ids = await _seed(db)
+            at = datetime(2026, 5, 1, 12)
+            result = await equity_snapshots.write_snapshots(db, at, batch_size=2)
+            assert result["users"] == 5 and result["positions_marked_at_cost"] == 1
+            # Held symbols are priced once for the whole cycle; closed positions are skipped
+            assert len(calls) == 1
+            assert sorted(calls[0]) == sorted([("AAPL", Market.US), ("TSLA", Market.US), ("INFY", Market.IN)])
+
+            rows = (await db.execute(select(models.EquitySnapshot).order_by(models.EquitySnapshot.user_id))).scalars().all()
+            assert [r.user_id for r in rows] == ids
+            assert {r.created_at for r in rows} == {at}
+            # 1000 + 300 - 250; INFY marked at cost: 1000 + 300 + 40
+            assert [Decimal(r.total_equity) for r in rows[:3]] == [Decimal("1050"), Decimal("1340"), Decimal("1300")]
+            assert Decimal(rows[0].maintenance_required) == Decimal("75")
+
+    asyncio.run(run())
+
+
+def test_equity_curve_downsamples_range(session_factory):
+    base = datetime(2026, 5, 1)
+
+    async def seed():
+        async with session_factory() as db:
+            user = models.User(email=DEMO_EMAIL, password_hash="demo", cash_balance=Decimal("1000"))
+            db.add(user)
+            await db.flush()
+            # One snapshot a minute for two hours, equity rising by 1 each time
+            db.add_all(
+                models.EquitySnapshot(user_id=user.id, total_equity=Decimal(1000 + i), maintenance_required=Decimal(0),
+                                      created_at=base + timedelta(minutes=i))
+                for i in range(120)
+            )
+            await db.commit()
+
+    asyncio.run(seed())
+
+    async def db_override():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = db_override
+    try:
+        client = TestClient(app)
+        body = client.get("/analytics/equity-curve", params={
+            "start": "2026-05-01T00:00:00", "end": "2026-05-01T01:00:00", "points": 6,
+        }).json()
+        assert body["bucket_seconds"] == 600
+        # Buckets of ten minutes, each reported by its last snapshot
+        assert [p["equity"] for p in body["points"]] == [1009, 1019, 1029, 1039, 1049, 1059]
+        assert (body["points"][0]["low"], body["points"][0]["high"]) == (1000, 1009)
+        assert body["points"][0]["timestamp"] == "2026-05-01T00:09:00"
+
+        everything = client.get("/analytics/equity-curve", params={
+            "start": "2026-05-01T00:00:00Z", "end": "2026-05-02T00:00:00", "points": 2000,
+        }).json()
+        assert len(everything["points"]) == 120
+        assert client.get("/analytics/equity-curve", params={"start": "2026-05-02T00:00:00", "end": "2026-05-01T00:00:00"}).status_code == 400
+    finally:
+        app.dependency_overrides.pop(get_db, None)
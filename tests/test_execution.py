@@ -0,0 +1,58 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+from backend import crud, models
+from backend.models import TransactionType
+from backend.schemas import Market
+from backend.services.execution import TradeRejected, execute_trade
+
+
+async def _user(db, cash="10000"):
+    user = models.User(email="e@example.com", password_hash="x", cash_balance=Decimal(cash))
+    db.add(user)
+    await db.commit()
+    return user
+
+
+def test_round_trip_updates_cash_position_and_ledger(session_factory):
+    async def run():
+        async with session_factory() as db:
+            user = await _user(db)
+            db.add(models.ShortableStock(symbol="TSLA", market=Market.US, borrow_rate_annual=0.05, available=True))
+            await db.commit()
+            await execute_trade(db, user, "AAPL", Market.US, TransactionType.BUY, Decimal("10"), Decimal("100"))
+            await execute_trade(db, user, "AAPL", Market.US, TransactionType.SELL, Decimal("4"), Decimal("110"))
+            _, short = await execute_trade(db, user, "TSLA", Market.US, TransactionType.SHORT, Decimal("5"), Decimal("200"))
+            assert short.borrow_rate_annual == 0.05
+            await execute_trade(db, user, "TSLA", Market.US, TransactionType.COVER, Decimal("5"), Decimal("190"))
+
+        async with session_factory() as db:
+            user = await db.get(models.User, user.id)
+            # -1000 + 440 + 1000 - 950
+            assert Decimal(user.cash_balance) == Decimal("9490")
+            assert Decimal((await crud.get_position(db, user, "AAPL", Market.US)).shares) == 6
+            assert Decimal((await crud.get_position(db, user, "TSLA", Market.US)).shares) == 0
+            txs = await crud.list_transactions(db, user)
+            assert sorted(t.type.value for t in txs) == ["BUY", "COVER", "SELL", "SHORT"]
+
+    asyncio.run(run())
+
+
+def test_rejected_trade_writes_nothing(session_factory):
+    async def run():
+        async with session_factory() as db:
+            user = await _user(db, cash="50")
+            with pytest.raises(TradeRejected, match="insufficient cash"):
+                await execute_trade(db, user, "AAPL", Market.US, TransactionType.BUY, Decimal("1"), Decimal("100"))
+            with pytest.raises(TradeRejected) as exc:
+                await execute_trade(db, user, "AAPL", Market.US, TransactionType.SHORT, Decimal("1"), Decimal("10"))
+            assert exc.value.status_code == 404
+        async with session_factory() as db:
+            user = await db.get(models.User, user.id)
+            assert Decimal(user.cash_balance) == Decimal("50")
+            assert await crud.list_positions(db, user) == []
+            assert await crud.list_transactions(db, user) == []
+
+    asyncio.run(run())
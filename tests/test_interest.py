@@ -0,0 +1,75 @@
+import asyncio
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import event, select
+
+from backend import models
+from backend.schemas import Market
+from backend.services import interest, quotes
+
+
+def _fake_prices(prices, calls):
+    async def fetch_prices(pairs, concurrency=None, timeout=None):
+        pairs = list(pairs)
+        calls.append(pairs)
+        found = {p: prices[p] for p in pairs if p in prices}
+        return found, {p: "unavailable" for p in pairs if p not in prices}
+    return fetch_prices
+
+
+async def _seed(db):
+    a = models.User(email="a@example.com", password_hash="x", cash_balance=Decimal("1000"))
+    b = models.User(email="b@example.com", password_hash="x", cash_balance=Decimal("1000"))
+    db.add_all([a, b])
+    await db.flush()
+    db.add_all([
+        models.Position(user_id=a.id, symbol="TSLA", market=Market.US, shares=Decimal("-10"), avg_price=Decimal("100"), borrow_rate_annual=0.365),
+        models.Position(user_id=a.id, symbol="AMD", market=Market.US, shares=Decimal("-5"), avg_price=Decimal("100"), borrow_rate_annual=0.073),
+        models.Position(user_id=b.id, symbol="TSLA", market=Market.US, shares=Decimal("-1"), avg_price=Decimal("100"), borrow_rate_annual=0.365),
+        models.Position(user_id=b.id, symbol="AAPL", market=Market.US, shares=Decimal("3"), avg_price=Decimal("100")),
+        models.Position(user_id=b.id, symbol="INFY", market=Market.IN, shares=Decimal("-2"), avg_price=Decimal("100"), borrow_rate_annual=0.365),
+    ])
+    await db.commit()
+    return a.id, b.id
+
+
+def test_accrual_charges_each_short_once_per_date(session_factory, monkeypatch):
+    calls = []
+    prices = {("TSLA", Market.US): Decimal("200"), ("AMD", Market.US): Decimal("100")}
+    monkeypatch.setattr(quotes, "fetch_prices", _fake_prices(prices, calls))
+    engine = session_factory.kw["bind"].sync_engine
+    updates = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cur, stmt, *a: updates.append(stmt) if stmt.lstrip().upper().startswith("UPDATE USERS") else None)
+
+    async def run():
+        async with session_factory() as db:
+            a, b = await _seed(db)
+            day = date(2026, 1, 5)
+            result = await interest.accrue_daily_interest(db, day)
+            # TSLA priced once for both holders; INFY has no price and waits
+            assert sorted(calls[0]) == sorted([("TSLA", Market.US), ("AMD", Market.US), ("TSLA", Market.US), ("INFY", Market.IN)])
+            assert result["applied"] == 3 and result["users"] == 2
+            assert [u["symbol"] for u in result["unpriced"]] == ["INFY"]
+            assert len(updates) == 1
+
+            # 10 * 200 * 0.365 / 365 = 2, 5 * 100 * 0.073 / 365 = 0.1, 1 * 200 * 0.365 / 365 = 0.2
+            assert result["total_interest"] == 2.3
+            again = await interest.accrue_daily_interest(db, day)
+            assert again["applied"] == 0
+
+            prices[("INFY", Market.IN)] = Decimal("50")
+            later = await interest.accrue_daily_interest(db, day)
+            assert [d["symbol"] for d in later["details"]] == ["INFY"]
+            await interest.accrue_daily_interest(db, date(2026, 1, 6))
+
+        async with session_factory() as db:
+            cash = {u.id: Decimal(u.cash_balance) for u in (await db.execute(select(models.User))).scalars()}
+            assert cash[a] == Decimal("1000") - 2 * Decimal("2.1")
+            # 0.2 + INFY 2 * 50 * 0.365 / 365 = 0.1, on both days
+            assert cash[b] == Decimal("1000") - 2 * Decimal("0.3")
+            rows = (await db.execute(select(models.InterestAccrual))).scalars().all()
+            assert len(rows) == 8
+
+    asyncio.run(run())
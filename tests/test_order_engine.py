@@ -0,0 +1,165 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+
+from backend import crud, models
+from backend.models import OrderSide, OrderStatus, OrderType
+from backend.schemas import Market
+from backend.services import order_engine as order_engine_module
+from backend.services.order_engine import OrderEngine, RestingOrder, SymbolOrders
+from backend.services.price_board import PriceBoard
+
+KEY = ("AAPL", Market.US)
+
+
+def resting(id, side, order_type, limit=None, stop=None):
+    return RestingOrder(id, KEY, side, order_type, limit, stop)
+
+
+def test_limits_and_stops_trigger_on_the_right_side():
+    book = SymbolOrders()
+    book.add(resting(1, OrderSide.BUY, OrderType.LIMIT, limit=99.0))
+    book.add(resting(2, OrderSide.SELL, OrderType.LIMIT, limit=101.0))
+    book.add(resting(3, OrderSide.BUY, OrderType.STOP, stop=102.0))
+    book.add(resting(4, OrderSide.SELL, OrderType.STOP, stop=98.0))
+    assert book.evaluate(100.0) == ([], [])
+    fills, _ = book.evaluate(101.5)
+    assert [o.id for o in fills] == [2]
+    fills, _ = book.evaluate(97.0)
+    assert sorted(o.id for o in fills) == [1, 4]
+    fills, _ = book.evaluate(103.0)
+    assert [o.id for o in fills] == [3]
+    assert len(book) == 0
+
+
+def test_stop_limit_rests_as_limit_after_trigger_and_cancel_is_lazy():
+    book = SymbolOrders()
+    book.add(resting(1, OrderSide.SELL, OrderType.STOP_LIMIT, limit=97.0, stop=98.0))
+    book.add(resting(2, OrderSide.BUY, OrderType.LIMIT, limit=95.0))
+    fills, triggered = book.evaluate(96.0)
+    # stop fired below 98 but 96 is under the 97 limit: rests as a sell limit
+    assert fills == [] and [o.id for o in triggered] == [1]
+    book.remove(2)
+    assert book.evaluate(90.0) == ([], [])
+    fills, _ = book.evaluate(97.5)
+    assert [o.id for o in fills] == [1]
+
+
+def test_price_board_tick_fills_through_the_ledger(session_factory, monkeypatch):
+    board = PriceBoard()
+    monkeypatch.setattr(order_engine_module, "board", board)
+    engine = OrderEngine()
+
+    async def run():
+        async with session_factory() as db:
+            user = models.User(email="t@example.com", password_hash="x", cash_balance=Decimal("1000"))
+            db.add(user)
+            await db.commit()
+            buy = await crud.create_order(db, user, "AAPL", Market.US, "BUY", "LIMIT", Decimal("2"), limit_price=Decimal("100"))
+            greedy = await crud.create_order(db, user, "AAPL", Market.US, "BUY", "LIMIT", Decimal("100"), limit_price=Decimal("100"))
+            sell = await crud.create_order(db, user, "MSFT", Market.US, "SELL", "STOP", Decimal("1"), stop_price=Decimal("50"))
+        assert await engine.load() == 3
+        board.add_listener(engine.on_prices)
+
+        board.put("AAPL", Market.US, {"c": 105.0})
+        assert len(engine) == 3
+        board.put("AAPL", Market.US, {"c": 99.5})
+        board.put("MSFT", Market.US, {"c": 49.0})
+        assert len(engine) == 0 and engine.books == {}
+        await engine.drain()
+
+        async with session_factory() as db:
+            user = await db.get(models.User, user.id)
+            assert Decimal(user.cash_balance) == Decimal("801")
+            assert (await db.get(models.Order, buy.id)).status == OrderStatus.FILLED
+            assert (await db.get(models.Order, greedy.id)).reject_reason == "insufficient cash"
+            assert (await db.get(models.Order, sell.id)).reject_reason == "no long position to sell"
+            pos = await crud.get_position(db, user, "AAPL", Market.US)
+            assert Decimal(pos.shares) == 2
+            txs = await crud.list_transactions(db, user)
+            assert [(t.type.value, float(t.price)) for t in txs] == [("BUY", 99.5)]
+
+    asyncio.run(run())
+
+
+def test_failed_fill_rejects_order_instead_of_stranding_it(session_factory, monkeypatch):
+    board = PriceBoard()
+    monkeypatch.setattr(order_engine_module, "board", board)
+    engine = OrderEngine()
+
+    async def broken(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(order_engine_module, "execute_trade", broken)
+
+    async def run():
+        async with session_factory() as db:
+            user = models.User(email="f@example.com", password_hash="x", cash_balance=Decimal("1000"))
+            db.add(user)
+            await db.commit()
+            order = await crud.create_order(db, user, "AAPL", Market.US, "BUY", "LIMIT", Decimal("1"), limit_price=Decimal("100"))
+        await engine.load()
+        board.add_listener(engine.on_prices)
+        board.put("AAPL", Market.US, {"c": 99.0})
+        assert len(engine) == 0
+        with pytest.raises(RuntimeError):
+            await engine.drain()
+
+        async with session_factory() as db:
+            row = await db.get(models.Order, order.id)
+            assert row.status == OrderStatus.REJECTED
+            assert row.reject_reason == "fill failed, please resubmit"
+        assert engine.stats()["rejects"] == 1
+
+    asyncio.run(run())
+
+
+def test_cancel_reaches_unindexed_orders_and_restores_on_failure(session_factory, monkeypatch):
+    from fastapi.testclient import TestClient
+    from backend.database import get_db
+    from backend.main import app
+    from backend.routes import trade
+    from backend.security.auth import DEMO_EMAIL
+
+    async def seed():
+        async with session_factory() as db:
+            user = models.User(email=DEMO_EMAIL, password_hash="demo", cash_balance=Decimal("1000"))
+            db.add(user)
+            await db.commit()
+            return [
+                (await crud.create_order(db, user, "AAPL", Market.US, "BUY", "LIMIT", Decimal("1"), limit_price=Decimal(p)))
+                for p in ("90", "91", "92")
+            ]
+
+    stranded, indexed, filling = asyncio.run(seed())
+    engine = OrderEngine()
+    monkeypatch.setattr(order_engine_module, "board", PriceBoard())
+    monkeypatch.setattr(trade, "order_engine", engine)
+    engine.add(indexed)
+    engine._filling.add(filling.id)
+
+    async def db_override():
+        async with session_factory() as db:
+            yield db
+
+    async def broken(db, order_id):
+        raise RuntimeError("commit failed")
+
+    app.dependency_overrides[get_db] = db_override
+    try:
+        client = TestClient(app)
+        # OPEN in the database but never indexed, e.g. load() failed at startup
+        res = client.delete(f"/trade/orders/{stranded.id}")
+        assert res.status_code == 200 and res.json()["status"] == "CANCELLED"
+        assert client.delete(f"/trade/orders/{filling.id}").status_code == 409
+
+        with monkeypatch.context() as m:
+            m.setattr(crud, "cancel_open_order", broken)
+            with pytest.raises(RuntimeError):
+                client.delete(f"/trade/orders/{indexed.id}")
+        assert len(engine) == 1
+        assert client.delete(f"/trade/orders/{indexed.id}").json()["status"] == "CANCELLED"
+        assert len(engine) == 0
+    finally:
+        app.dependency_overrides.pop(get_db, None)
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import random
+
+from backend.services.orderbook import ASK, BID, OrderBook, OrderBookFeed
+from backend.services.ws_hub import Subscriber
+
+
+def test_book_stays_sorted_uncrossed_and_at_depth():
+    book = OrderBook("AAA", 100.0, depth=200, seed=1)
+    mid = 100.0
+    rng = random.Random(2)
+    for _ in range(300):
+        mid *= 1 + rng.gauss(0, 0.002)
+        book.step(mid)
+        for side in (BID, ASK):
+            assert book.ticks[side] == sorted(book.levels[side])
+            assert len(book.ticks[side]) == 200
+        assert book.best(BID) < book.best(ASK)
+
+
+def test_trade_consumes_from_the_touch():
+    book = OrderBook("AAA", 100.0, depth=3, seed=1)
+    best = book.best(ASK)
+    size = book.levels[ASK][best][0]
+    assert book.trade(ASK, size + 1) == size + 1
+    assert best not in book.levels[ASK]
+
+
+def test_incremental_updates_replay_to_the_same_book():
+    book = OrderBook("AAA", 50.0, depth=20, seed=5)
+    book.drain_changes()
+    replica = {side: {lvl["price"]: (lvl["size"], lvl["orders"]) for lvl in levels} for side, levels in book.snapshot().items()}
+    mid = 50.0
+    for _ in range(100):
+        mid *= 1.001
+        book.step(mid)
+        for side, levels in book.drain_changes().items():
+            for price, size, orders in levels:
+                if size == 0:
+                    replica[side].pop(price, None)
+                else:
+                    replica[side][price] = (size, orders)
+    expected = {side: {lvl["price"]: (lvl["size"], lvl["orders"]) for lvl in levels} for side, levels in book.snapshot().items()}
+    assert replica == expected
+
+
+def test_feed_shares_frames_and_drops_idle_books():
+    async def run():
+        feed = OrderBookFeed("ob", lambda symbols: {s: 100.0 for s in symbols}, 0.5)
+        full = [Subscriber(None, 8, "drop_oldest", 10) for _ in range(2)]
+        incremental = [Subscriber(None, 8, "drop_oldest", 10, compact=True) for _ in range(2)]
+        for sub in full + incremental:
+            feed.subscribers.add(sub)
+            feed.add_subscriber(sub, "AAA", 5)
+            sub.queue.popleft()
+        feed.tick()
+        a, b = (s.queue.popleft() for s in full)
+        c, d = (s.queue.popleft() for s in incremental)
+        assert a is b and c is d
+        assert len(json.loads(a)["bids"]) == 5
+        assert json.loads(c)["type"] == "orderbook_update"
+        for sub in full + incremental:
+            feed.unsubscribe(sub)
+        assert feed.books == {} and feed.index == {}
+
+    asyncio.run(run())
+
+
+def test_incremental_client_rebuilds_book_after_overflow():
+    def apply(replica, frame):
+        msg = json.loads(frame)
+        for side in (BID, ASK):
+            if msg["type"] == "orderbook":
+                replica[side] = {lvl["price"]: (lvl["size"], lvl["orders"]) for lvl in msg[side]}
+                continue
+            for price, size, orders in msg[side]:
+                if size == 0:
+                    replica[side].pop(price, None)
+                else:
+                    replica[side][price] = (size, orders)
+
+    async def run():
+        mid = [100.0]
+        feed = OrderBookFeed("ob", lambda symbols: {s: mid[0] for s in symbols}, 0.5)
+        sub = Subscriber(None, 2, "drop_oldest", 100, compact=True)
+        feed.subscribers.add(sub)
+        feed.add_subscriber(sub, "AAA", 5)
+        replica = {}
+        apply(replica, sub.queue.popleft())
+        # The client stalls while the book moves; its queue overflows
+        for _ in range(10):
+            mid[0] *= 1.002
+            feed.tick()
+        assert sub.dropped > 0
+        for _ in range(3):
+            while sub.queue:
+                apply(replica, sub.queue.popleft())
+            mid[0] *= 1.002
+            feed.tick()
+        while sub.queue:
+            apply(replica, sub.queue.popleft())
+        book = feed.books["AAA"]
+        expected = {side: {lvl["price"]: (lvl["size"], lvl["orders"]) for lvl in levels} for side, levels in book.snapshot().items()}
+        assert replica == expected
+
+    asyncio.run(run())
@@ -0,0 +1,147 @@
+import asyncio
+from decimal import Decimal
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from backend import crud, models
+from backend.models import LotSide, PnlMethod, TransactionType
+from backend.schemas import Market
+from backend.services import ledger
+from backend.services.execution import execute_trade
+from scripts.explain_hot_queries import migrate
+
+
+async def _user(db):
+    user = models.User(email="p@example.com", password_hash="x", cash_balance=Decimal("100000"))
+    db.add(user)
+    await db.commit()
+    return user
+
+
+def _fill(qty, price, fees="0"):
+    return ledger.LedgerFill("AAPL", Market.US, Decimal(qty), Decimal(price), Decimal(fees))
+
+
+async def _open_lots(db, user_id):
+    res = await db.execute(
+        select(models.PositionLot).where(models.PositionLot.user_id == user_id, models.PositionLot.closed_at.is_(None))
+        .order_by(models.PositionLot.id)
+    )
+    return [(lot.side, Decimal(lot.open_quantity), Decimal(lot.price)) for lot in res.scalars()]
+
+
+def test_fifo_closes_oldest_lots_first(session_factory):
+    async def run():
+        async with session_factory() as db:
+            user = await _user(db)
+            await ledger.record_fills(db, user.id, [_fill("10", "100"), _fill("10", "120")], PnlMethod.FIFO)
+            realized = await ledger.record_fills(db, user.id, [_fill("-15", "130")], PnlMethod.FIFO)
+            await db.commit()
+            # 10 @ 100 and 5 @ 120 closed at 130: 10 * 30 + 5 * 10
+            assert [Decimal(r["pnl"]) for r in realized] == [Decimal("350")]
+            assert await _open_lots(db, user.id) == [(LotSide.LONG, Decimal("5"), Decimal("120"))]
+
+    asyncio.run(run())
+
+
+def test_average_cost_merges_lots(session_factory):
+    async def run():
+        async with session_factory() as db:
+            user = await _user(db)
+            await ledger.record_fills(db, user.id, [_fill("10", "100"), _fill("10", "120")], PnlMethod.AVERAGE)
+            realized = await ledger.record_fills(db, user.id, [_fill("-15", "130")], PnlMethod.AVERAGE)
+            await db.commit()
+            # 15 * (130 - 110)
+            assert [Decimal(r["pnl"]) for r in realized] == [Decimal("300")]
+            assert await _open_lots(db, user.id) == [(LotSide.LONG, Decimal("5"), Decimal("110"))]
+
+    asyncio.run(run())
+
+
+def test_fees_shorts_and_crossing_zero(session_factory):
+    async def run():
+        async with session_factory() as db:
+            user = await _user(db)
+            # Buy 10 @ 100 with 10 fees -> cost 101/share; sell 15 @ 110 with 15 fees:
+            # 10 close (10 fees), 5 open short at 110 - 1 = 109
+            realized = await ledger.record_fills(db, user.id, [_fill("10", "100", "10"), _fill("-15", "110", "15")])
+            assert [Decimal(r["pnl"]) for r in realized] == [Decimal("80")]
+            assert await _open_lots(db, user.id) == [(LotSide.SHORT, Decimal("5"), Decimal("109"))]
+            # Cover the short at a loss
+            realized = await ledger.record_fills(db, user.id, [_fill("5", "120")])
+            assert realized[0]["side"] == LotSide.SHORT and Decimal(realized[0]["pnl"]) == Decimal("-55")
+            await db.commit()
+
+            totals = await crud.get_portfolio_aggregate(db, user)
+            assert Decimal(totals.realized_pnl) == Decimal("25")
+            assert Decimal(totals.fees) == Decimal("25")
+            assert (totals.fills, totals.closes, totals.winning, totals.losing) == (3, 2, 1, 1)
+            assert await _open_lots(db, user.id) == []
+
+    asyncio.run(run())
+
+
+def test_trades_maintain_the_ledger(session_factory):
+    async def run():
+        async with session_factory() as db:
+            user = await _user(db)
+            db.add(models.ShortableStock(symbol="TSLA", market=Market.US, borrow_rate_annual=0.05, available=True))
+            await db.commit()
+            await execute_trade(db, user, "AAPL", Market.US, TransactionType.BUY, Decimal("10"), Decimal("100"), fees=Decimal("5"))
+            await execute_trade(db, user, "AAPL", Market.US, TransactionType.SELL, Decimal("4"), Decimal("110"), fees=Decimal("2"))
+            await execute_trade(db, user, "TSLA", Market.US, TransactionType.SHORT, Decimal("5"), Decimal("200"))
+            await execute_trade(db, user, "TSLA", Market.US, TransactionType.COVER, Decimal("5"), Decimal("190"))
+
+        async with session_factory() as db:
+            user = await db.get(models.User, user.id)
+            totals = await crud.get_portfolio_aggregate(db, user)
+            # AAPL: 4 * (110 - 100.5) - 2 = 36; TSLA: 5 * (200 - 190) = 50
+            assert Decimal(totals.realized_pnl) == Decimal("86")
+            assert (totals.fills, totals.closes, totals.winning) == (4, 2, 2)
+            assert await _open_lots(db, user.id) == [(LotSide.LONG, Decimal("6"), Decimal("100.5"))]
+
+    asyncio.run(run())
+
+
+def test_positions_from_before_the_ledger_get_opening_lots(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}"
+    migrate(url, "0005_hot_path_indexes")
+
+    async def seed():
+        engine = create_async_engine(url, poolclass=NullPool)
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "INSERT INTO users (id, email, password_hash, cash_balance) VALUES (1, 'old@example.com', 'x', 10000)"
+            ))
+            await conn.execute(text(
+                "INSERT INTO positions (user_id, symbol, market, shares, avg_price) VALUES "
+                "(1, 'AAPL', 'US', 10, 100), (1, 'TSLA', 'US', -2, 50), (1, 'MSFT', 'US', 0, 30)"
+            ))
+        await engine.dispose()
+
+    asyncio.run(seed())
+    migrate(url)
+
+    async def run():
+        engine = create_async_engine(url, poolclass=NullPool)
+        factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+        try:
+            async with factory() as db:
+                assert sorted(await _open_lots(db, 1)) == [
+                    (LotSide.LONG, Decimal("10"), Decimal("100")), (LotSide.SHORT, Decimal("2"), Decimal("50")),
+                ]
+                user = await db.get(models.User, 1)
+                await execute_trade(db, user, "AAPL", Market.US, TransactionType.SELL, Decimal("4"), Decimal("110"))
+                await execute_trade(db, user, "TSLA", Market.US, TransactionType.COVER, Decimal("2"), Decimal("40"))
+                totals = await crud.get_portfolio_aggregate(db, user)
+                # 4 * (110 - 100) + 2 * (50 - 40)
+                assert Decimal(totals.realized_pnl) == Decimal("60")
+                assert totals.closes == 2
+                assert await _open_lots(db, 1) == [(LotSide.LONG, Decimal("6"), Decimal("100"))]
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
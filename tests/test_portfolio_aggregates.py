@@ -0,0 +1,164 @@
+import asyncio
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from backend import crud, models
+from backend.database import get_db
+from backend.main import app
+from backend.models import TransactionType
+from backend.schemas import Market
+from backend.security.auth import DEMO_EMAIL
+from backend.services import aggregates, quotes
+from backend.services.execution import BatchOrder, execute_batch, execute_trade
+from scripts.explain_hot_queries import migrate
+
+
+async def _trade(db, email="g@example.com"):
+    user = models.User(email=email, password_hash="x", cash_balance=Decimal("100000"))
+    db.add(user)
+    db.add(models.ShortableStock(symbol="TSLA", market=Market.US, borrow_rate_annual=0.05, available=True))
+    await db.commit()
+    await execute_trade(db, user, "AAPL", Market.US, TransactionType.BUY, Decimal("10"), Decimal("100"), fees=Decimal("1"))
+    await execute_trade(db, user, "AAPL", Market.US, TransactionType.BUY, Decimal("10"), Decimal("120"))
+    await execute_trade(db, user, "AAPL", Market.US, TransactionType.SELL, Decimal("5"), Decimal("130"))
+    await execute_trade(db, user, "TSLA", Market.US, TransactionType.SHORT, Decimal("4"), Decimal("200"))
+    await execute_batch(db, user, [
+        BatchOrder("MSFT", Market.US, TransactionType.BUY, Decimal("3")),
+        BatchOrder("MSFT", Market.US, TransactionType.SELL, Decimal("3")),
+        BatchOrder("TSLA", Market.US, TransactionType.COVER, Decimal("1")),
+    ], {("MSFT", Market.US): Decimal("50"), ("TSLA", Market.US): Decimal("190")})
+    return user
+
+
+def test_fills_keep_aggregate_in_step_with_positions(session_factory):
+    async def run():
+        async with session_factory() as db:
+            user = await _trade(db)
+            agg = await aggregates.get(db, user)
+            # A reducing fill re-marks avg_price at the fill price (crud.apply_position_change):
+            # AAPL 15 @ 130, TSLA short 3 @ 190; MSFT opened and closed in the batch
+            assert Decimal(agg.long_cost) == Decimal("1950")
+            assert Decimal(agg.short_cost) == Decimal("570")
+            assert (agg.long_positions, agg.short_positions, agg.fills, agg.closes) == (1, 1, 7, 3)
+            assert Decimal(agg.fees) == Decimal("1")
+
+            report = await aggregates.reconcile(db)
+            assert report["checked"] == 1 and report["mismatches"] == []
+
+    asyncio.run(run())
+
+
+def test_reconcile_reports_and_repairs_drift(session_factory):
+    async def run():
+        async with session_factory() as db:
+            user = await _trade(db)
+            await db.execute(update(models.PortfolioAggregate).values(long_cost=0, short_positions=5))
+            await db.commit()
+            report = await aggregates.reconcile(db)
+            assert report["mismatched"] == 1 and not report["fixed"]
+            assert set(report["mismatches"][0]["columns"]) == {"long_cost", "short_positions"}
+
+            assert (await aggregates.reconcile(db, fix=True))["fixed"]
+            assert (await aggregates.reconcile(db))["mismatches"] == []
+            assert Decimal((await crud.get_portfolio_aggregate(db, user)).long_cost) == Decimal("1950")
+
+    asyncio.run(run())
+
+
+async def _run_trade(session_factory):
+    async with session_factory() as db:
+        await _trade(db, email=DEMO_EMAIL)
+
+
+def test_risk_renders_from_aggregate(session_factory, monkeypatch):
+    async def fetch_prices(pairs, concurrency=None, timeout=None):
+        return {p: Decimal("150") for p in pairs}, {}
+
+    monkeypatch.setattr(quotes, "fetch_prices", fetch_prices)
+    asyncio.run(_run_trade(session_factory))
+
+    async def db_override():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = db_override
+    try:
+        client = TestClient(app)
+        risk = client.get("/analytics/risk").json()
+        assert (risk["position_count"], risk["long_positions"], risk["short_positions"]) == (2, 1, 1)
+        assert risk["long_cost_basis"] == 1950.0
+        # MSFT was closed out; only open positions are marked
+        assert {p["symbol"] for p in risk["position_risks"]} == {"AAPL", "TSLA"}
+
+        perf = client.get("/analytics/performance").json()
+        # 15 * 150 - 1950 long, 570 - 3 * 150 short
+        assert perf["unrealized_pnl"] == 420.0
+        assert perf["total_trades"] == 7
+        # Closing fills and open positions are counted apart
+        assert (perf["winning_trades"], perf["losing_trades"]) == (2, 0)
+        assert (perf["winning_positions"], perf["losing_positions"]) == (2, 0)
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+def test_migration_backfills_from_existing_rows(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'legacy.db'}"
+    migrate(url, "0006_pnl_ledger")
+
+    async def seed():
+        engine = create_async_engine(url, poolclass=NullPool)
+        async with engine.begin() as conn:
+            await conn.execute(text(
+                "INSERT INTO users (id, email, password_hash, cash_balance) VALUES "
+                "(1, 'a@example.com', 'x', 0), (2, 'b@example.com', 'x', 0)"
+            ))
+            await conn.execute(text(
+                "INSERT INTO positions (user_id, symbol, market, shares, avg_price) VALUES (1, 'AAPL', 'US', 10, 100)"
+            ))
+            await conn.execute(text(
+                "INSERT INTO transactions (user_id, symbol, market, type, quantity, price, fees, total_amount) VALUES "
+                "(1, 'AAPL', 'US', 'BUY', 10, 100, 2, 1002), (1, 'MSFT', 'US', 'BUY', 1, 50, NULL, 50), "
+                "(1, 'MSFT', 'US', 'SELL', 1, 50, 1, 49)"
+            ))
+        await engine.dispose()
+
+    asyncio.run(seed())
+    migrate(url)
+
+    async def run():
+        engine = create_async_engine(url, poolclass=NullPool)
+        factory = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+        try:
+            async with factory() as db:
+                first = await crud.get_portfolio_aggregate(db, await db.get(models.User, 1))
+                second = await crud.get_portfolio_aggregate(db, await db.get(models.User, 2))
+                assert (first.fills, Decimal(first.fees), Decimal(first.long_cost)) == (3, Decimal("3"), Decimal("1000"))
+                assert (second.fills, Decimal(second.fees)) == (0, Decimal("0"))
+                assert (await aggregates.reconcile(db))["mismatches"] == []
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_dialects_without_upsert_lock_then_update_or_insert(session_factory, monkeypatch):
+    monkeypatch.setattr(crud, "_UPSERT_INSERTS", {})
+
+    async def run():
+        async with session_factory() as db:
+            user = await _trade(db)
+            agg = await aggregates.get(db, user)
+            assert (agg.long_positions, agg.short_positions, agg.fills, agg.closes) == (1, 1, 7, 3)
+            assert Decimal(agg.long_cost) == Decimal("1950")
+
+            await db.execute(update(models.PortfolioAggregate).values(long_cost=0))
+            await db.commit()
+            assert (await aggregates.reconcile(db, fix=True))["fixed"]
+            assert (await aggregates.reconcile(db))["mismatches"] == []
+
+    asyncio.run(run())
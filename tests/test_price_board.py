@@ -0,0 +1,62 @@
+import asyncio
+from backend.config import settings
+from backend.schemas import Market
+from backend.services import quotes
+from backend.services.price_board import PriceBoard
+
+
+def test_refresh_serves_tracked_symbols_from_memory(monkeypatch):
+    board = PriceBoard()
+    upstream_calls = []
+
+    async def fake_upstream(symbol, market):
+        upstream_calls.append(symbol)
+        return {"c": 42.0}
+
+    async def no_holdings():
+        board._holdings_loaded_at = 0.0
+
+    monkeypatch.setattr(quotes, "fetch_upstream", fake_upstream)
+    monkeypatch.setattr(quotes, "board", board)
+    monkeypatch.setattr(board, "_reload_holdings", no_holdings)
+
+    board.track("AAPL", Market.US)
+    board.pin("MSFT", "US")
+    asyncio.run(board.refresh_once())
+    assert sorted(upstream_calls) == ["AAPL", "MSFT"]
+
+    # handlers now read from the board without going upstream
+    quote = asyncio.run(quotes.fetch_quote("MSFT", Market.US))
+    assert quote == {"c": 42.0}
+    assert len(upstream_calls) == 2
+    assert board.stats()["refreshes"] == 1
+
+
+def test_unpinned_idle_symbols_are_dropped(monkeypatch):
+    board = PriceBoard()
+    board.pin("TSLA", Market.US)
+    board.put("TSLA", Market.US, {"c": 1.0})
+    board.unpin("TSLA", Market.US)
+    board._recent.clear()
+    assert board.active_symbols() == []
+    assert board.get_quote("TSLA", Market.US) is None
+
+
+def test_writes_stay_bounded_and_keep_upstream_age(monkeypatch):
+    board = PriceBoard()
+    monkeypatch.setattr(settings, "PRICE_BOARD_MAX_SYMBOLS", 3)
+    monkeypatch.setattr(quotes, "board", board)
+    monkeypatch.setattr(quotes.finnhub, "quote_age", lambda symbol: 10.0)
+
+    async def fake_upstream(symbol, market):
+        return {"c": 1.0}
+
+    monkeypatch.setattr(quotes, "fetch_upstream", fake_upstream)
+    # No refresher runs: every quoted symbol is written on the request path
+    for i in range(10):
+        asyncio.run(quotes.fetch_quote(f"S{i}", Market.US))
+    assert len(board._quotes) == 3 and len(board._recent) == 3
+    assert list(board._quotes) == [("S7", Market.US), ("S8", Market.US), ("S9", Market.US)]
+    # Served from upstream's 10s-old cache entry: only fresh for the 5s left
+    assert board.get_quote("S9", Market.US, max_age=15) is not None
+    assert board.get_quote("S9", Market.US, max_age=5) is None
@@ -0,0 +1,59 @@
+import asyncio
+from backend.schemas import Market
+from backend.services import quotes
+
+
+def test_fetch_quotes_dedupes_caps_and_reports_failures(monkeypatch):
+    calls = []
+    running = 0
+    peak = 0
+
+    async def fake_fetch_quote(symbol, market):
+        nonlocal running, peak
+        calls.append(symbol)
+        running += 1
+        peak = max(peak, running)
+        try:
+            if symbol == "SLOW":
+                await asyncio.sleep(1)
+            await asyncio.sleep(0.01)
+            if symbol == "BAD":
+                raise RuntimeError("unknown symbol")
+            return {"c": 10.0}
+        finally:
+            running -= 1
+
+    monkeypatch.setattr(quotes, "fetch_quote", fake_fetch_quote)
+    symbols = ["AAPL", "MSFT", "AAPL", " ", "BAD", "SLOW", "TSLA", "NVDA"]
+    ok, errors = asyncio.run(quotes.fetch_quotes(symbols, Market.US, concurrency=2, timeout=0.2))
+
+    assert sorted(calls) == sorted(["AAPL", "MSFT", "BAD", "SLOW", "TSLA", "NVDA"])
+    assert peak <= 2
+    assert set(ok) == {"AAPL", "MSFT", "TSLA", "NVDA"}
+    assert set(errors) == {"BAD", "SLOW"}
+    assert "timed out" in errors["SLOW"]
+
+
+def test_last_price_by_market():
+    assert quotes.last_price({"c": 12.5}, Market.US) == quotes.Decimal("12.5")
+    assert quotes.last_price({"last_price": 7}, Market.IN) == quotes.Decimal("7")
+    assert quotes.last_price({}, Market.IN) == 0
+
+
+def test_fetch_prices_groups_by_market(monkeypatch):
+    calls = []
+
+    async def fake_fetch_quote(symbol, market):
+        calls.append((symbol, market))
+        if market == Market.US:
+            return {"c": 100}
+        return {"last_price": 2500}
+
+    monkeypatch.setattr(quotes, "fetch_quote", fake_fetch_quote)
+    pairs = [("AAPL", "US"), ("RELIANCE", "IN"), ("AAPL", Market.US)]
+    prices, errors = asyncio.run(quotes.fetch_prices(pairs))
+
+    assert sorted(calls) == [("AAPL", Market.US), ("RELIANCE", Market.IN)]
+    assert prices[("AAPL", Market.US)] == 100
+    assert prices[("RELIANCE", Market.IN)] == 2500
+    assert errors == {}
@@ -0,0 +1,108 @@
+import asyncio
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from backend import crud, models
+from backend.config import settings
+from backend.models import TransactionType
+from backend.schemas import Market
+from backend.services.execution import execute_trade
+from backend.services.shortable_index import ShortableEntry, index
+
+
+def _count_shortable_selects(factory):
+    counter = {"selects": 0}
+
+    def before(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM shortable_stocks" in statement:
+            counter["selects"] += 1
+
+    event.listen(factory.kw["bind"].sync_engine, "before_cursor_execute", before)
+    return counter
+
+
+def test_lookups_are_served_from_the_loaded_index(session_factory):
+    counter = _count_shortable_selects(session_factory)
+
+    async def run():
+        async with session_factory() as db:
+            db.add(models.ShortableStock(symbol="TSLA", market=Market.US, borrow_rate_annual=0.05, available=True))
+            db.add(models.ShortableStock(symbol="INFY", market=Market.IN, borrow_rate_annual=0.08, available=False))
+            db.add(models.User(email="e@example.com", password_hash="x", cash_balance=Decimal("10000")))
+            await db.commit()
+            # Before the first load lookups still work, from the table
+            assert (await index.find(db, "TSLA", Market.US)).borrow_rate_annual == 0.05
+            assert await index.load(db) == 2
+            loaded = counter["selects"]
+
+            assert (await index.find(db, "TSLA", Market.US)).borrow_rate_annual == 0.05
+            assert await index.find(db, "TSLA", Market.IN) is None
+            assert (await index.find(db, "INFY")).available is False
+            assert await index.find(db, "NOPE") is None
+            assert set(await index.find_many(db, ["TSLA", "INFY", "NOPE"])) == {"TSLA", "INFY"}
+            user = await db.get(models.User, 1)
+            _, pos = await execute_trade(db, user, "TSLA", Market.US, TransactionType.SHORT, Decimal("2"), Decimal("100"))
+            assert pos.borrow_rate_annual == 0.05
+            assert counter["selects"] == loaded
+
+            # Writers hand what they wrote to the index
+            row = await crud.upsert_shortable(db, "AMD", Market.US, 0.03)
+            index.put([ShortableEntry.from_model(row)])
+            assert (await index.find(db, "AMD", Market.US)).borrow_rate_annual == 0.03
+
+    asyncio.run(run())
+
+
+def test_stale_index_reloads(session_factory, monkeypatch):
+    async def run():
+        async with session_factory() as db:
+            await index.load(db)
+            # Written by another process: not visible until the index reloads
+            db.add(models.ShortableStock(symbol="TSLA", market=Market.US, borrow_rate_annual=0.05, available=True))
+            await db.commit()
+            assert await index.find(db, "TSLA") is None
+            monkeypatch.setattr(settings, "SHORTABLE_INDEX_RELOAD_SECONDS", -1.0)
+            assert (await index.find(db, "TSLA")).symbol == "TSLA"
+
+    asyncio.run(run())
+
+
+def test_bulk_upsert_inserts_and_updates(session_factory):
+    async def run():
+        async with session_factory() as db:
+            await crud.upsert_shortable(db, "TSLA", Market.US, 0.05)
+            await index.load(db)
+            rows = [{"symbol": f"S{i}", "market": Market.US, "borrow_rate_annual": 0.02} for i in range(2500)]
+            rows.append({"symbol": "TSLA", "market": Market.US, "borrow_rate_annual": 0.09, "available": False})
+            rows.append({"symbol": "S7", "market": Market.IN, "borrow_rate_annual": 0.04})
+            assert await crud.bulk_upsert_shortable(db, rows) == 2501
+
+            assert (await crud.get_shortable(db, "TSLA")).available is False
+            assert (await crud.get_shortable(db, "S7", Market.IN)).borrow_rate_annual == 0.04
+
+        async with session_factory() as db:
+            stored = {s.symbol: s for s in await crud.list_shortable(db)}
+            assert len(stored) == 2501
+            assert stored["TSLA"].borrow_rate_annual == 0.09 and stored["TSLA"].available is False
+            assert Market(stored["S7"].market) == Market.IN
+
+    asyncio.run(run())
+
+
+def test_bulk_upsert_falls_back_to_per_row_writes(session_factory, monkeypatch):
+    monkeypatch.setattr(crud, "_UPSERT_INSERTS", {})
+
+    async def run():
+        async with session_factory() as db:
+            await crud.upsert_shortable(db, "TSLA", Market.US, 0.05)
+            rows = [
+                {"symbol": "TSLA", "market": Market.US, "borrow_rate_annual": 0.09, "available": False},
+                {"symbol": "AMD", "market": Market.US, "borrow_rate_annual": 0.02},
+            ]
+            assert await crud.bulk_upsert_shortable(db, rows) == 2
+            stored = {s.symbol: s for s in await crud.list_shortable(db)}
+            assert set(stored) == {"TSLA", "AMD"}
+            assert stored["TSLA"].borrow_rate_annual == 0.09 and stored["TSLA"].available is False
+
+    asyncio.run(run())
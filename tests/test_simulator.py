@@ -0,0 +1,44 @@
+from backend.services.simulator import MarketSimulator
+
+TICKERS = {"AAA": {"base": 100.0, "volatility": 0.01}, "BBB": {"base": 50000.0, "volatility": 0.02}}
+
+
+def test_same_seed_gives_same_prices():
+    a = MarketSimulator(TICKERS, seed=42, synthetic=100)
+    b = MarketSimulator(TICKERS, seed=42, synthetic=100)
+    for _ in range(5):
+        a.step(timestamp=1.0)
+        b.step(timestamp=1.0)
+    assert a.ticks() == b.ticks()
+    c = MarketSimulator(TICKERS, seed=43, synthetic=100)
+    c.step(timestamp=1.0)
+    assert c.ticks() != a.ticks()
+
+
+def test_step_produces_consistent_ticks_and_reverts_to_base():
+    sim = MarketSimulator(TICKERS, seed=1, synthetic=2000)
+    assert len(sim) == 2002 and "SIM02000" in sim
+    for _ in range(500):
+        sim.step()
+    for tick in sim.ticks().values():
+        assert tick["price"] > 0
+        assert tick["bid"] <= tick["price"] <= tick["ask"]
+        assert 100_000 <= tick["volume"] <= 5_000_000
+    # mean reversion keeps prices near their base rather than drifting away
+    assert 50 < sim.tick("AAA")["price"] < 200
+
+
+def test_ticks_subset_keeps_order_and_skips_unknown():
+    sim = MarketSimulator(TICKERS, seed=3)
+    sim.step()
+    assert list(sim.ticks(["BBB", "NOPE", "AAA"])) == ["BBB", "AAA"]
+    assert sim.tick("NOPE") is None
+
+
+def test_step_if_stale_steps_once_per_interval():
+    sim = MarketSimulator(TICKERS, seed=3)
+    assert sim.step_if_stale(60.0)
+    assert not sim.step_if_stale(60.0)
+    assert sim.steps == 1
+    assert sim.step_if_stale(0.0)
+    assert sim.steps == 2
@@ -0,0 +1,80 @@
+import asyncio
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from backend import crud, models
+from backend.database import get_db
+from backend.main import app
+from backend.models import TransactionType
+from backend.routes import trade
+from backend.schemas import Market
+from backend.services.execution import BatchOrder, execute_batch
+
+US = Market.US
+
+
+def test_batch_validates_in_order_and_writes_once(session_factory):
+    statements = []
+
+    async def run():
+        async with session_factory() as db:
+            user = models.User(email="b@example.com", password_hash="x", cash_balance=Decimal("1000"))
+            db.add(user)
+            await db.commit()
+            event.listen(db.bind.sync_engine, "before_cursor_execute", lambda conn, cur, sql, *a: statements.append(sql))
+            orders = [
+                BatchOrder("AAPL", US, TransactionType.BUY, Decimal("5")),   # 500
+                BatchOrder("AAPL", US, TransactionType.SELL, Decimal("2")),  # +200, sees the buy above
+                BatchOrder("MSFT", US, TransactionType.BUY, Decimal("10")),  # 1000 > 700 left
+                BatchOrder("NOPE", US, TransactionType.BUY, Decimal("1")),   # no quote
+                BatchOrder("TSLA", US, TransactionType.SHORT, Decimal("1")),  # not shortable
+                BatchOrder("MSFT", US, TransactionType.BUY, Decimal("7")),   # exactly 700
+            ]
+            prices = {("AAPL", US): Decimal("100"), ("MSFT", US): Decimal("100"), ("TSLA", US): Decimal("10")}
+            errors = await execute_batch(db, user, orders, prices)
+            assert errors == [None, None, "insufficient cash", "quote unavailable", "symbol not shortable", None]
+            assert Decimal(user.cash_balance) == 0
+
+        async with session_factory() as db:
+            user = await db.get(models.User, user.id)
+            assert Decimal(user.cash_balance) == 0
+            positions = {p.symbol: Decimal(p.shares) for p in await crud.list_positions(db, user)}
+            assert positions == {"AAPL": 3, "MSFT": 7}
+            assert len(await crud.list_transactions(db, user)) == 3
+
+    asyncio.run(run())
+    inserts = [s for s in statements if s.startswith("INSERT INTO transactions")]
+    assert len(inserts) == 1
+
+
+def test_batch_endpoint_prices_once_and_reports_per_order(session_factory, monkeypatch):
+    calls = []
+
+    async def fake_prices(pairs, *args, **kwargs):
+        pairs = list(pairs)
+        calls.append(pairs)
+        return {(s, Market(m)): Decimal("50") for s, m in pairs if s != "BAD"}, {("BAD", US): "boom"}
+
+    async def db_override():
+        async with session_factory() as db:
+            yield db
+
+    monkeypatch.setattr(trade.quotes, "fetch_prices", fake_prices)
+    app.dependency_overrides[get_db] = db_override
+    try:
+        resp = TestClient(app).post("/trade/batch", json={"orders": [
+            {"symbol": "AAPL", "market": "US", "side": "BUY", "qty": 2},
+            {"symbol": "BAD", "market": "US", "side": "BUY", "qty": 1},
+            {"symbol": "AAPL", "market": "US", "side": "SELL", "qty": 1},
+        ]})
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert len(calls) == 1
+    assert (body["filled"], body["rejected"]) == (2, 1)
+    assert [r["status"] for r in body["results"]] == ["filled", "rejected", "filled"]
+    assert body["results"][1]["error"] == "quote unavailable"
+    assert body["cash_balance"] == 100000.0 - 50
@@ -0,0 +1,123 @@
+"""Stress: many concurrent trades for one user, each on its own connection."""
+import asyncio
+from decimal import Decimal
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from backend import crud, models
+from backend.models import TransactionType
+from backend.schemas import Market
+from backend.services.execution import TradeRejected, execute_trade, is_conflict
+from scripts.explain_hot_queries import migrate
+
+
+def _run_concurrently(session_factory, user_id, trades):
+    async def one(side, symbol):
+        async with session_factory() as db:
+            user = await db.get(models.User, user_id)
+            try:
+                await execute_trade(db, user, symbol, Market.US, side, Decimal("1"), Decimal("100"))
+                return "ok"
+            except TradeRejected as e:
+                return e.detail
+
+    async def run():
+        return await asyncio.gather(*(one(side, symbol) for side, symbol in trades))
+
+    return asyncio.run(run())
+
+
+def _state(session_factory, user_id):
+    async def run():
+        async with session_factory() as db:
+            user = await db.get(models.User, user_id)
+            positions = {p.symbol: Decimal(p.shares) for p in await crud.list_positions(db, user)}
+            txs = await crud.list_transactions(db, user, limit=1000)
+            return Decimal(user.cash_balance), positions, txs
+
+    return asyncio.run(run())
+
+
+def _make_user(session_factory, cash):
+    async def run():
+        async with session_factory() as db:
+            user = models.User(email="c@example.com", password_hash="x", cash_balance=Decimal(cash))
+            db.add(user)
+            await db.commit()
+            return user.id
+
+    return asyncio.run(run())
+
+
+def test_parallel_buys_cannot_overspend(session_factory):
+    user_id = _make_user(session_factory, "1000")
+    # 30 buys of $100 against $1000 of cash, spread over three symbols
+    results = _run_concurrently(session_factory, user_id, [(TransactionType.BUY, f"S{i % 3}") for i in range(30)])
+    assert results.count("ok") == 10
+    assert set(results) <= {"ok", "insufficient cash"}
+    cash, positions, txs = _state(session_factory, user_id)
+    assert cash == 0
+    assert sum(positions.values()) == 10 and len(positions) <= 3
+    assert len(txs) == 10
+
+
+def test_parallel_sells_cannot_oversell(session_factory):
+    user_id = _make_user(session_factory, "500")
+    assert _run_concurrently(session_factory, user_id, [(TransactionType.BUY, "AAPL")] * 5).count("ok") == 5
+    results = _run_concurrently(session_factory, user_id, [(TransactionType.SELL, "AAPL")] * 20)
+    assert results.count("ok") == 5
+    cash, positions, txs = _state(session_factory, user_id)
+    assert cash == 500
+    assert positions == {"AAPL": 0}
+    assert len(txs) == 10
+
+
+def test_only_unique_key_races_are_conflicts(session_factory):
+    async def insert(db, **position):
+        db.add(models.Position(**position))
+        try:
+            await db.flush()
+        except IntegrityError as e:
+            await db.rollback()
+            return e
+
+    async def run():
+        async with session_factory() as db:
+            user = models.User(email="c@example.com", password_hash="x", cash_balance=Decimal("0"))
+            db.add(user)
+            await db.commit()
+            row = dict(user_id=user.id, symbol="AAPL", market=Market.US, shares=Decimal("1"), avg_price=Decimal("1"))
+            assert await insert(db, **row) is None
+            await db.commit()
+            assert is_conflict(await insert(db, **row))
+            assert not is_conflict(await insert(db, **{**row, "symbol": "MSFT", "avg_price": None}))
+
+    asyncio.run(run())
+
+
+def test_migration_merges_duplicate_positions(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'dupes.db'}"
+    migrate(url, "0002_orders")
+
+    async def execute(sql):
+        engine = create_async_engine(url, poolclass=NullPool)
+        async with engine.begin() as conn:
+            result = await conn.execute(text(sql))
+            rows = result.all() if result.returns_rows else None
+        await engine.dispose()
+        return rows
+
+    asyncio.run(execute("INSERT INTO users (id, email, password_hash, cash_balance) VALUES (1, 'd@example.com', 'x', 0)"))
+    asyncio.run(execute(
+        "INSERT INTO positions (id, user_id, symbol, market, shares, avg_price) VALUES "
+        "(1, 1, 'AAPL', 'US', 10, 100), (2, 1, 'MSFT', 'US', 1, 50), (3, 1, 'AAPL', 'US', 30, 120)"
+    ))
+    migrate(url, "0003_position_concurrency")
+    rows = asyncio.run(execute("SELECT id, symbol, shares, avg_price FROM positions ORDER BY id"))
+    # AAPL: 40 shares at (10 * 100 + 30 * 120) / 40
+    assert [(id_, symbol, Decimal(str(shares)), Decimal(str(price))) for id_, symbol, shares, price in rows] == [
+        (1, "AAPL", Decimal("40"), Decimal("115")), (2, "MSFT", Decimal("1"), Decimal("50")),
+    ]
@@ -0,0 +1,120 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.testclient import TestClient
+
+from backend import models
+from backend.database import get_db
+from backend.main import app
+from backend.schemas import Market
+from backend.security.auth import DEMO_EMAIL
+
+
+def _seed(session_factory, count=25):
+    async def run():
+        async with session_factory() as db:
+            user = models.User(email=DEMO_EMAIL, password_hash="demo", cash_balance=Decimal("100000"))
+            db.add(user)
+            await db.flush()
+            base = datetime(2026, 3, 1)
+            for i in range(count):
+                db.add(models.Transaction(
+                    user_id=user.id, symbol="AAPL" if i % 2 else "MSFT", market=Market.US,
+                    type=models.TransactionType.BUY if i % 3 else models.TransactionType.SELL,
+                    quantity=Decimal("1"), price=Decimal(100 + i), fees=Decimal(0), total_amount=Decimal(100 + i),
+                    # Pairs share a timestamp so ties are broken by id
+                    timestamp=base + timedelta(minutes=i // 2),
+                ))
+            await db.commit()
+
+    asyncio.run(run())
+
+
+def _client(session_factory):
+    async def db_override():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = db_override
+    return TestClient(app)
+
+
+def test_cursor_pages_cover_history_once_newest_first(session_factory):
+    _seed(session_factory)
+    client = _client(session_factory)
+    try:
+        ids, cursor, pages = [], None, 0
+        while True:
+            resp = client.get("/portfolio/transactions", params={"limit": 7, **({"cursor": cursor} if cursor else {})})
+            assert resp.status_code == 200
+            body = resp.json()
+            ids += [t["id"] for t in body["items"]]
+            pages += 1
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        assert pages == 4
+        assert ids == list(range(25, 0, -1))
+
+        filtered = client.get("/portfolio/transactions", params={
+            "symbol": "AAPL", "type": "BUY", "start": "2026-03-01T00:03:00", "end": "2026-03-01T00:09:00",
+        }).json()["items"]
+        assert [t["id"] for t in filtered] == [18, 14, 12, 8]
+        assert client.get("/portfolio/transactions", params={"cursor": "nope"}).status_code == 400
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+def test_cursor_must_name_one_of_the_users_transactions(session_factory):
+    from backend.utils.pagination import encode_cursor
+    _seed(session_factory, count=3)
+
+    async def other_user():
+        async with session_factory() as db:
+            user = models.User(email="other@example.com", password_hash="x", cash_balance=Decimal("0"))
+            db.add(user)
+            await db.flush()
+            tx = models.Transaction(
+                user_id=user.id, symbol="TSLA", market=Market.US, type=models.TransactionType.BUY,
+                quantity=Decimal("1"), price=Decimal(1), fees=Decimal(0), total_amount=Decimal(1),
+                timestamp=datetime(2030, 1, 1),
+            )
+            db.add(tx)
+            await db.commit()
+            return tx.id
+
+    foreign = asyncio.run(other_user())
+    client = _client(session_factory)
+    try:
+        for after_id in (foreign, 999):
+            resp = client.get("/portfolio/transactions", params={"cursor": encode_cursor(after_id)})
+            assert resp.status_code == 400 and resp.json()["detail"] == "invalid cursor"
+        page = client.get("/portfolio/transactions", params={"cursor": encode_cursor(3)}).json()
+        assert [t["id"] for t in page["items"]] == [2, 1]
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+def test_exports_stream_whole_filtered_history(session_factory, monkeypatch):
+    from backend.routes import portfolio
+    monkeypatch.setattr(portfolio, "EXPORT_CHUNK_ROWS", 4)
+    _seed(session_factory)
+    client = _client(session_factory)
+    try:
+        resp = client.get("/portfolio/transactions", params={"format": "ndjson", "symbol": "MSFT"})
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in resp.text.splitlines()]
+        assert [r["id"] for r in rows] == list(range(25, 0, -2))
+        assert rows[0]["type"] == "SELL" and rows[0]["market"] == "US"
+
+        resp = client.get("/portfolio/transactions", params={"format": "csv"})
+        assert resp.headers["content-disposition"] == 'attachment; filename="transactions.csv"'
+        table = list(csv.DictReader(io.StringIO(resp.text)))
+        assert len(table) == 25
+        assert table[-1]["id"] == "1" and float(table[-1]["price"]) == 100.0
+    finally:
+        app.dependency_overrides.pop(get_db, None)
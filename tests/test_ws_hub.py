@@ -0,0 +1,185 @@
+import asyncio
+import json
+import pytest
+from backend.services.ws_hub import Broadcaster, Subscriber
+
+
+def test_drop_oldest_keeps_latest_frames_then_disconnects():
+    async def run():
+        sub = Subscriber(websocket=None, queue_size=2, policy="drop_oldest", max_drops=3)
+        for i in range(5):
+            sub.offer(str(i))
+        assert [sub.queue.popleft(), sub.queue.popleft()] == ["3", "4"]
+        assert sub.dropped == 3 and not sub.closed
+        for i in range(6):
+            sub.offer(str(i))
+        return sub
+
+    sub = asyncio.run(run())
+    assert sub.closed
+
+
+def test_disconnect_policy_closes_on_first_overflow():
+    async def run():
+        sub = Subscriber(websocket=None, queue_size=1, policy="disconnect", max_drops=100)
+        sub.offer("a")
+        sub.offer("b")
+        return sub
+
+    assert asyncio.run(run()).closed
+
+
+def test_publish_shares_one_encoded_frame():
+    async def run():
+        feed = Broadcaster("test", lambda: {"x": 1}, interval=1.0)
+        subs = [Subscriber(None, 4, "drop_oldest", 10) for _ in range(3)]
+        feed.subscribers.update(subs)
+        feed.publish('{"x": 1}')
+        frames = [s.queue.popleft() for s in subs]
+        assert all(f is frames[0] for f in frames)
+
+    asyncio.run(run())
+
+
+def test_symbol_feed_pushes_only_changed_subscribed_symbols():
+    prices = {"AAPL": 1.0, "MSFT": 2.0, "TSLA": 3.0}
+    added, removed = [], []
+
+    def produce(symbols):
+        return {s: {"symbol": s, "price": prices[s], "timestamp": 0} for s in symbols}
+
+    async def run():
+        from backend.services.ws_hub import SymbolBroadcaster
+        import json
+        feed = SymbolBroadcaster("t", produce, 1.0, on_symbol_added=added.append, on_symbol_removed=removed.append)
+        a = Subscriber(None, 8, "drop_oldest", 10)
+        b = Subscriber(None, 8, "drop_oldest", 10)
+        feed.subscribers.update({a, b})
+        feed.add_symbols(a, ["AAPL", "MSFT"])
+        feed.add_symbols(b, ["MSFT"])
+        feed.tick()
+        first_a = json.loads(a.queue.popleft())
+        first_b = json.loads(b.queue.popleft())
+        assert [d["symbol"] for d in first_a["data"]] == ["AAPL", "MSFT"]
+        assert [d["symbol"] for d in first_b["data"]] == ["MSFT"]
+
+        prices["AAPL"] = 1.5
+        feed.tick()
+        assert [d["symbol"] for d in json.loads(a.queue.popleft())["data"]] == ["AAPL"]
+        assert not b.queue
+
+        feed.unsubscribe(a)
+        assert set(feed.index) == {"MSFT"}
+
+    asyncio.run(run())
+    assert sorted(added) == ["AAPL", "MSFT"]
+    assert removed == ["AAPL"]
+
+
+def test_compact_subscriber_conflates_deltas_when_behind():
+    async def run():
+        from backend.services.ws_hub import SymbolBroadcaster
+        prices = {"AAPL": 1.0}
+        feed = SymbolBroadcaster("c", lambda symbols: {s: {"symbol": s, "price": prices[s], "volume": 5} for s in symbols}, 1.0)
+        sub = Subscriber(None, 8, "drop_oldest", 10, compact=True)
+        feed.subscribers.add(sub)
+        feed.add_symbols(sub, ["AAPL"])
+        feed.tick()
+        first = sub.pending
+        assert first == {"AAPL": {"symbol": "AAPL", "price": 1.0, "volume": 5}}
+        # client has not drained yet: later ticks merge into pending
+        for p in (2.0, 3.0):
+            prices["AAPL"] = p
+            feed.tick()
+        assert sub.pending == {"AAPL": {"symbol": "AAPL", "price": 3.0, "volume": 5}}
+        assert sub.pending_frame is None
+        assert sub.conflated == 2
+        # the shared delta from the first tick was not mutated
+        assert first["AAPL"]["price"] == 1.0
+
+    asyncio.run(run())
+
+
+def test_compact_msgpack_snapshot_then_delta():
+    msgpack = pytest.importorskip("msgpack")
+
+    async def run():
+        from backend.services.ws_hub import SymbolBroadcaster
+        prices = {"AAPL": 1.0}
+        feed = SymbolBroadcaster("m", lambda symbols: {s: {"symbol": s, "price": prices[s], "volume": 5} for s in symbols}, 1.0)
+        feed.tick()
+        sub = Subscriber(None, 8, "drop_oldest", 10, compact=True, encoding="msgpack")
+        feed.subscribers.add(sub)
+        feed.add_symbols(sub, ["AAPL"])
+        feed.tick()
+        snap = feed.snapshot(["AAPL"], compact=True, encoding="msgpack")
+        assert msgpack.unpackb(snap) == {"type": "snapshot", "data": {"AAPL": {"symbol": "AAPL", "price": 1.0, "volume": 5}}}
+        sub.pending = {}
+        sub.pending_frame = None
+        prices["AAPL"] = 2.0
+        feed.tick()
+        assert isinstance(sub.pending_frame, bytes)
+        assert msgpack.unpackb(sub.pending_frame) == {"type": "delta", "data": {"AAPL": {"price": 2.0}}}
+
+    asyncio.run(run())
+
+
+def test_compact_snapshot_supersedes_pending_delta():
+    class Socket:
+        def __init__(self):
+            self.frames = []
+
+        async def send_text(self, frame):
+            self.frames.append(json.loads(frame))
+
+    async def run():
+        from backend.services.ws_hub import SymbolBroadcaster
+        prices = {"AAPL": 1.0, "MSFT": 5.0}
+        feed = SymbolBroadcaster("s", lambda symbols: {s: {"symbol": s, "price": prices[s]} for s in symbols}, 1.0)
+        socket = Socket()
+        sub = Subscriber(socket, 8, "drop_oldest", 10, compact=True)
+        other = Subscriber(None, 8, "drop_oldest", 10, compact=True)
+        feed.subscribers.update({sub, other})
+        feed.add_symbols(sub, ["AAPL", "MSFT"])
+        feed.add_symbols(other, ["AAPL"])
+        feed.tick()
+        # The client drops and re-adds AAPL while its first delta is still pending
+        feed.remove_symbols(sub, ["AAPL"])
+        prices["AAPL"] = 2.0
+        feed.tick()
+        added = feed.add_symbols(sub, ["AAPL"])
+        sub.offer_snapshot(feed.snapshot(added, compact=True), added)
+        assert set(sub.pending) == {"MSFT"}
+
+        sender = asyncio.create_task(sub.run_sender())
+        await asyncio.sleep(0)
+        sub.close()
+        await sender
+        book = {}
+        for frame in socket.frames:
+            for symbol, fields in frame["data"].items():
+                book.setdefault(symbol, {}).update(fields)
+        assert book == {"AAPL": {"symbol": "AAPL", "price": 2.0}, "MSFT": {"symbol": "MSFT", "price": 5.0}}
+
+    asyncio.run(run())
+
+
+def test_compact_unsubscribe_drops_pending_delta():
+    async def run():
+        from backend.services.ws_hub import SymbolBroadcaster
+        feed = SymbolBroadcaster("u", lambda symbols: {s: {"symbol": s, "price": 1.0} for s in symbols}, 1.0)
+        sub = Subscriber(None, 8, "drop_oldest", 10, compact=True)
+        other = Subscriber(None, 8, "drop_oldest", 10, compact=True)
+        feed.subscribers.update({sub, other})
+        feed.add_symbols(sub, ["AAPL", "MSFT"])
+        feed.add_symbols(other, ["AAPL", "MSFT"])
+        feed.tick()
+        shared = sub.pending
+        assert sub.pending_frame is not None
+        assert feed.remove_symbols(sub, ["AAPL"]) == ["AAPL"]
+        assert sub.pending == {"MSFT": {"symbol": "MSFT", "price": 1.0}}
+        assert sub.pending_frame is None
+        # The delta shared with the other subscriber is untouched
+        assert set(shared) == {"AAPL", "MSFT"} and other.pending is shared
+
+    asyncio.run(run())